@@ -0,0 +1,123 @@
+"""Benchmarks de las rutas de análisis y reportes.
+
+Mide tiempo de pared (mejor de N repeticiones) y memoria pico (tracemalloc, en una
+ejecución aparte para no distorsionar el tiempo) por función y tamaño de datos:
+
+    python benchmarks/bench_analysis.py --sizes 1000,10000,100000 --output bench.json
+    python benchmarks/bench_analysis.py --baseline bench.json --tolerance 0.25
+
+Con --baseline termina con código 1 si alguna medición empeora más que la tolerancia.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from utils.analysis import calculate_financial_metrics, generate_ai_recommendations
+from utils.categorizer import Categorizer
+from utils.database import transactions_frame, get_sample_goals
+from utils.forecasting import forecast_series, rollup_matrix
+from utils.reports import (
+    generate_financial_report, create_csv_export, create_excel_export, iter_csv_chunks, iter_frame_slices, spool_export
+)
+from utils.synthetic import generate_transactions_frame
+
+def _prepare(size: int, users: int, seed: int) -> dict:
+    frame = transactions_frame(generate_transactions_frame(size, n_users=users, seed=seed))
+    return {
+        'frame': frame,
+        'metrics': calculate_financial_metrics(frame),
+        'goals': get_sample_goals(),
+        # Series usuario × tipo × categoría por mes, como las del pronóstico
+        'rollups': rollup_matrix(frame)[2],
+        # Categorizador sin reglas ni aprendizaje guardados: mide solo el índice de palabras clave
+        'categorizer': Categorizer(':memory:', Config.CATEGORIZER_MIN_EVIDENCE, Config.CATEGORIZER_MIN_SHARE)
+    }
+
+CASES = {
+    'calculate_financial_metrics': lambda data: calculate_financial_metrics(data['frame']),
+    'generate_ai_recommendations': lambda data: generate_ai_recommendations(data['metrics'], data['goals']),
+    'generate_financial_report': lambda data: generate_financial_report('bench', data['frame']).output(),
+    'create_csv_export': lambda data: create_csv_export(data['frame']),
+    'stream_csv_export': lambda data: spool_export(iter_csv_chunks(iter_frame_slices(data['frame'])))[0].close(),
+    'create_excel_export': lambda data: create_excel_export(data['frame']),
+    'forecast_series': lambda data: forecast_series(data['rollups'], 6),
+    'categorize': lambda data: data['categorizer'].categorize(data['frame']['description'], data['frame']['transaction_type']),
+}
+
+def measure(case, data: dict, repeat: int) -> dict:
+    """Mejor tiempo de `repeat` ejecuciones y memoria pico de una ejecución instrumentada"""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        case(data)
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    case(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': min(timings), 'peak_mb': peak / (1024 * 1024)}
+
+def run(sizes: list, cases: list, users: int, seed: int, repeat: int) -> dict:
+    results = {}
+    for size in sizes:
+        data = _prepare(size, users, seed)
+        for name in cases:
+            result = measure(CASES[name], data, repeat)
+            results[f'{name}[{size}]'] = result
+            print(f"{name:<30} {size:>10,} filas  {result['seconds']:>9.4f} s  {result['peak_mb']:>9.1f} MB")
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Mediciones que empeoran más que la tolerancia respecto al baseline"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        for metric in ('seconds', 'peak_mb'):
+            if previous[metric] > 0 and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f'{key} {metric}: {previous[metric]:.4f} -> {current[metric]:.4f}')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de análisis y reportes')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Tamaños separados por coma')
+    parser.add_argument('--cases', default=','.join(CASES), help='Funciones a medir, separadas por coma')
+    parser.add_argument('--users', type=int, default=1, help='Usuarios distintos en los datos sintéticos')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Guardar resultados en JSON')
+    parser.add_argument('--baseline', help='JSON de una ejecución anterior para detectar regresiones')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Empeoramiento relativo permitido')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    cases = [case for case in args.cases.split(',') if case]
+    results = run(sizes, cases, args.users, args.seed, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESIÓN {regression}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
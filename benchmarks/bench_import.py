@@ -0,0 +1,140 @@
+"""Presupuesto de tiempo de importación (arranque en frío de la app y de los procesos del pool).
+
+Importa cada módulo en un intérprete nuevo con ``python -X importtime`` y se queda con
+el mejor de N arranques. Falla (código 1) si un módulo supera su presupuesto o si carga
+una librería que no le corresponde (p. ej. fpdf o plotly.express al abrir la app):
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --budget app=1.5 --repeat 5 --output importtime.json
+    python benchmarks/bench_import.py --modules views.dashboard --top 15
+
+Los presupuestos son múltiplos de ``import streamlit``, medido en la misma corrida e
+intercalado con cada módulo: el piso que ninguna página puede bajar. Así no dependen de
+la velocidad de la máquina ni de su carga (en un mismo núcleo el tiempo absoluto varía
+±300 ms entre corridas). Se ajustan con --budget o --scale.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Línea base: todo lo que se importa arrastra streamlit (también utils.database)
+BASELINE = 'streamlit'
+
+# Presupuesto por módulo como múltiplo de la línea base (medido: 1.0–1.3×; antes de separar las
+# páginas, app.py llegaba a ~2.7×): 'app' es el arranque (sin página); cada página añade lo suyo
+BUDGETS = {
+    'app': 1.35,
+    'views.dashboard': 1.45,
+    'views.transactions': 1.45,
+    'views.goals': 1.5,
+    'views.ai_analysis': 1.6,
+    'views.reports': 1.6,
+    'views.settings': 1.3,
+    # Lo que importa un proceso del pool de reportes al arrancar
+    'utils.report_jobs': 1.35,
+}
+
+# Módulos que no se deben cargar al importar cada uno (llegan con su página o exportación).
+# streamlit ya importa plotly, plotly.graph_objects y plotly.basedatatypes (~130 ms, parte de
+# la línea base); lo que añaden las páginas de gráficos es plotly.express
+HEAVY = ['plotly.express', 'fpdf', 'matplotlib', 'seaborn', 'xlsxwriter']
+FORBIDDEN = {
+    'app': HEAVY + ['httpx', 'utils.forecasting', 'utils.report_jobs'],
+    'views.transactions': HEAVY,
+    'views.goals': HEAVY,
+    'views.settings': HEAVY,
+    'views.reports': HEAVY,
+    'utils.report_jobs': HEAVY,
+}
+
+def import_profile(module: str) -> dict:
+    """Importar `module` en un proceso nuevo: total (µs), tiempo propio por paquete y módulos cargados"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                            capture_output=True, text=True, env={**os.environ, 'PYTHONPATH': ROOT})
+    if result.returncode != 0:
+        raise RuntimeError(f'No se pudo importar {module}: {result.stderr.strip().splitlines()[-1]}')
+    total, packages, modules = 0, defaultdict(int), []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append(name.strip())
+        packages[name.strip().split('.')[0]] += int(self_us)
+        # Las líneas sin sangría son las importaciones de primer nivel: su acumulado es el total
+        if not name[1:].startswith(' '):
+            total += int(cumulative_us)
+    return {'total_us': total, 'packages': dict(packages), 'modules': modules}
+
+def _loads(modules: list, name: str) -> bool:
+    return any(m == name or m.startswith(name + '.') for m in modules)
+
+def measure(module: str, repeat: int) -> dict:
+    """Mejor de `repeat` arranques en frío del módulo y de la línea base, intercalados"""
+    runs, baseline_runs = [], []
+    for _ in range(repeat):
+        baseline_runs.append(import_profile(BASELINE))
+        runs.append(import_profile(module))
+    best = min(runs, key=lambda run: run['total_us'])
+    baseline = min(baseline_runs, key=lambda run: run['total_us'])
+    return {'ms': round(best['total_us'] / 1000, 1), 'baseline_ms': round(baseline['total_us'] / 1000, 1),
+            'ratio': round(best['total_us'] / baseline['total_us'], 2),
+            'packages': best['packages'], 'modules': best['modules'], 'baseline_modules': baseline['modules']}
+
+def check(module: str, result: dict, budget: float) -> list:
+    problems = []
+    if budget is not None and result['ratio'] > budget:
+        problems.append(f'{module}: {result["ratio"]:.2f}× {BASELINE} ({result["ms"]:.0f} ms) '
+                        f'supera el presupuesto de {budget:.2f}×')
+    # Lo que ya carga la línea base no es responsabilidad del módulo (p. ej. una versión nueva de streamlit)
+    loaded = [name for name in FORBIDDEN.get(module, [])
+              if _loads(result['modules'], name) and not _loads(result['baseline_modules'], name)]
+    if loaded:
+        problems.append(f'{module}: carga {", ".join(loaded)} al importarse')
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Presupuesto de tiempo de importación')
+    parser.add_argument('--modules', default=','.join(BUDGETS), help='Módulos a medir, separados por coma')
+    parser.add_argument('--repeat', type=int, default=5, help='Arranques por módulo (se toma el mejor)')
+    parser.add_argument('--budget', action='append', default=[],
+                        help=f'Presupuesto modulo=múltiplo de import {BASELINE} (se puede repetir)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplicar todos los presupuestos')
+    parser.add_argument('--top', type=int, default=5, help='Paquetes más lentos a mostrar por módulo')
+    parser.add_argument('--output', help='Guardar las mediciones en JSON')
+    args = parser.parse_args()
+
+    budgets = {module: ratio * args.scale for module, ratio in BUDGETS.items()}
+    for item in args.budget:
+        module, _, ratio = item.partition('=')
+        budgets[module] = float(ratio)
+
+    results, problems = {}, []
+    for module in args.modules.split(','):
+        result = measure(module, args.repeat)
+        results[module] = result
+        budget = budgets.get(module)
+        heaviest = sorted(result['packages'].items(), key=lambda item: -item[1])[:args.top]
+        print(f'{module:<22} {result["ms"]:>8.1f} ms  {result["ratio"]:.2f}× {BASELINE} ({result["baseline_ms"]:.0f} ms)'
+              + (f'  (presupuesto {budget:.2f}×)' if budget else ''))
+        print('    ' + ', '.join(f'{name} {us / 1000:.0f} ms' for name, us in heaviest))
+        problems.extend(check(module, result, budget))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            summary = {module: {key: r[key] for key in ('ms', 'baseline_ms', 'ratio', 'packages')}
+                       for module, r in results.items()}
+            json.dump({'python': sys.version.split()[0], 'baseline': BASELINE, 'budgets': budgets,
+                       'results': summary}, f, indent=2)
+    if problems:
+        print('\nPresupuesto excedido:')
+        for problem in problems:
+            print(f'  - {problem}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""Prueba de carga del servicio de ingesta contra el PostgREST local.
+
+Levanta ``tools/postgrest_local.py`` y ``tools/ingest_service.py`` en este proceso (o usa
+un servicio ya en marcha con --url), envía payloads de Plaid desde varios clientes durante
+--seconds y mide el ritmo sostenido: filas aceptadas y escritas por segundo, latencia de
+las peticiones y cuántas recibieron 429. Con --duplicates una fracción de las peticiones
+reenvía un payload ya enviado (re-sincronización) y se cuenta cuántas filas se descartaron.
+
+    python benchmarks/bench_ingest.py --clients 8 --payload 50 --seconds 10
+    python benchmarks/bench_ingest.py --duplicates 0.8
+    python benchmarks/bench_ingest.py --batch-size 1000 --max-rows 5000 --output ingesta.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from tools.ingest_service import WEBHOOK_PATHS, serve
+from tools.postgrest_local import serve as serve_postgrest
+from utils.database import get_http_session
+from utils.plaid import TransactionIdIndex
+
+CATEGORIES = ['Food and Drink', 'Travel', 'Shops', 'Transfer', 'Payment', 'Recreation']
+
+def plaid_payload(size: int, rng: random.Random, accounts: int) -> dict:
+    """Respuesta de /transactions/get con `size` transacciones sintéticas"""
+    today = date.today()
+    return {'transactions': [{
+        'transaction_id': f'{rng.getrandbits(64):016x}',
+        'account_id': f'cuenta-{rng.randrange(accounts)}',
+        'amount': round(rng.uniform(-2000, 300), 2),
+        'date': (today - timedelta(days=rng.randrange(90))).isoformat(),
+        'name': f'Comercio {rng.randrange(500)}',
+        'category': [rng.choice(CATEGORIES)]
+    } for _ in range(size)]}
+
+def client_loop(url: str, payload_size: int, accounts: int, duplicates: float, deadline: float, seed: int,
+                results: dict, lock) -> None:
+    """Enviar payloads hasta el final; ante un 429 espera lo que indica Retry-After (acotado)"""
+    rng = random.Random(seed)
+    session = requests.Session()
+    latencies, sent, accepted, throttled, errors, dropped = [], 0, 0, 0, 0, 0
+    history = []
+    while time.monotonic() < deadline:
+        if history and rng.random() < duplicates:
+            body = rng.choice(history)
+        else:
+            body = plaid_payload(payload_size, rng, accounts)
+            history.append(body)
+        start = time.perf_counter()
+        try:
+            response = session.post(url, json=body, timeout=10)
+        except requests.RequestException:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        sent += payload_size
+        if response.status_code == 202:
+            accepted += payload_size
+            dropped += response.json().get('duplicadas', 0)
+        elif response.status_code == 429:
+            throttled += 1
+            time.sleep(min(float(response.headers.get('Retry-After', 1)), 0.5) * rng.random())
+        else:
+            errors += 1
+    with lock:
+        results['latencies'].extend(latencies)
+        results['sent'] += sent
+        results['accepted'] += accepted
+        results['throttled'] += throttled
+        results['errors'] += errors
+        results['duplicates'] += dropped
+
+def run(clients: int, payload_size: int, seconds: float, accounts: int, duplicates: float = 0.0,
+        url: str = None, **queue_options) -> dict:
+    server = queue = postgrest = store = None
+    if url is None:
+        postgrest, store, postgrest_url = serve_postgrest()
+        supabase_client = {'url': postgrest_url, 'key': 'local', 'session': get_http_session(),
+                           'timeout': (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT),
+                           'max_retries': Config.HTTP_MAX_RETRIES}
+        # Índice de ids propio de la prueba: no se mezcla con el del servicio real
+        index_path = os.path.join(tempfile.mkdtemp(prefix='bench_ingest_'), 'ids.db')
+        queue_options['id_index'] = TransactionIdIndex(index_path, Config.PLAID_BLOOM_CAPACITY,
+                                                       Config.PLAID_BLOOM_ERROR_RATE)
+        server, queue, url = serve(supabase_client, **queue_options)
+    target = url.rstrip('/') + WEBHOOK_PATHS[0]
+
+    results = {'latencies': [], 'sent': 0, 'accepted': 0, 'throttled': 0, 'errors': 0, 'duplicates': 0}
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=client_loop,
+                                args=(target, payload_size, accounts, duplicates, deadline, seed, results, lock))
+               for seed in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    offered_seconds = time.perf_counter() - start
+
+    summary = {'clientes': clients, 'payload': payload_size, 'segundos': round(offered_seconds, 2)}
+    if queue is not None:
+        # El ritmo de escritura cuenta hasta que la cola queda vacía
+        queue.drain()
+        total_seconds = time.perf_counter() - start
+        stats = queue.snapshot()
+        summary.update({
+            'filas_escritas': len(store.tables.get('transacciones', [])),
+            'escritas_por_segundo': round(stats['insertadas'] / total_seconds, 1),
+            'lotes': stats['lotes'],
+            'filas_por_lote': round(stats['insertadas'] / max(stats['lotes'], 1), 1),
+            'fallidas': stats['fallidas'],
+            'peticiones_postgrest': store.requests
+        })
+        server.shutdown()
+        queue.close()
+        postgrest.shutdown()
+
+    latencies = np.array(results['latencies']) * 1000
+    summary.update({
+        'filas_enviadas': results['sent'],
+        'aceptadas_por_segundo': round(results['accepted'] / offered_seconds, 1),
+        'duplicadas_descartadas': results['duplicates'],
+        'peticiones': len(latencies),
+        'respuestas_429': results['throttled'],
+        'errores': results['errors'],
+        'latencia_ms_p50': round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+        'latencia_ms_p99': round(float(np.percentile(latencies, 99)), 2) if len(latencies) else None
+    })
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga del servicio de ingesta')
+    parser.add_argument('--url', help='Servicio ya en marcha (por defecto se levanta uno con PostgREST local)')
+    parser.add_argument('--clients', type=int, default=8, help='Clientes concurrentes')
+    parser.add_argument('--payload', type=int, default=50, help='Transacciones por petición')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--accounts', type=int, default=1000, help='Cuentas (usuarios) distintas')
+    parser.add_argument('--duplicates', type=float, default=0.0, help='Fracción de peticiones que reenvían un payload ya enviado')
+    parser.add_argument('--batch-size', type=int, default=Config.INGEST_BATCH_SIZE)
+    parser.add_argument('--flush-seconds', type=float, default=Config.INGEST_FLUSH_SECONDS)
+    parser.add_argument('--max-rows', type=int, default=Config.INGEST_MAX_QUEUED_ROWS)
+    parser.add_argument('--writers', type=int, default=Config.INGEST_WRITERS)
+    parser.add_argument('--output', help='Guardar el resumen en JSON')
+    args = parser.parse_args()
+
+    queue_options = {} if args.url else {'batch_size': args.batch_size, 'flush_seconds': args.flush_seconds,
+                                         'max_rows': args.max_rows, 'writers': args.writers}
+    summary = run(args.clients, args.payload, args.seconds, args.accounts, args.duplicates, args.url, **queue_options)
+    for key, value in summary.items():
+        print(f'{key:>22}: {value}')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
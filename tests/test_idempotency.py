@@ -0,0 +1,63 @@
+import time
+
+from utils.idempotency import IdempotencyIndex, batch_idempotency_keys, idempotency_key
+
+def compra(monto=4.5, descripcion='Café Central'):
+    return {'usuario_id': 'u1', 'monto': monto, 'fecha': '2026-10-01', 'descripcion': descripcion, 'tipo': 'gasto'}
+
+def make_index(tmp_path, ttl_seconds=3600, pending_seconds=60):
+    return IdempotencyIndex(str(tmp_path / 'claves.db'), ttl_seconds, pending_seconds)
+
+def test_filas_identicas_del_lote_tienen_claves_distintas():
+    rows = [compra(), compra(), compra(monto=9)]
+    keys = batch_idempotency_keys(rows)
+    assert len(set(keys)) == 3
+    assert keys[0] == idempotency_key(compra())
+    # Reenviar el mismo lote produce las mismas claves
+    assert batch_idempotency_keys(rows) == keys
+
+def test_descripcion_normalizada_y_origen():
+    assert idempotency_key(compra(descripcion='  café   CENTRAL ')) == idempotency_key(compra())
+    assert idempotency_key(compra(), source_id='a') != idempotency_key(compra(), source_id='b')
+
+def test_filas_identicas_se_insertan_ambas(tmp_path):
+    index = make_index(tmp_path)
+    assert index.claim_many(batch_idempotency_keys([compra(), compra()])) == [None, None]
+
+def test_reenvio_se_omite(tmp_path):
+    index = make_index(tmp_path)
+    keys = batch_idempotency_keys([compra(), compra(monto=9)])
+    assert index.claim_many(keys) == [None, None]
+    index.complete(keys[:1], ['fila-1'])
+    # Escrita: devuelve su id; aún en curso: 'pendiente'
+    assert index.claim_many(keys) == ['fila-1', 'pendiente']
+
+def test_reserva_liberada_se_puede_reintentar(tmp_path):
+    index = make_index(tmp_path)
+    key = idempotency_key(compra())
+    assert index.claim(key) is None
+    index.release([key])
+    assert index.claim(key) is None
+
+def test_reserva_abandonada_se_vuelve_a_tomar(tmp_path):
+    index = make_index(tmp_path, pending_seconds=0.05)
+    pending, written = idempotency_key(compra()), idempotency_key(compra(monto=9))
+    assert index.claim_many([pending, written]) == [None, None]
+    index.complete([written], ['fila-9'])
+    time.sleep(0.1)
+    # Solo caduca la reserva 'pendiente'; la escrita sigue viva hasta el TTL
+    assert index.claim_many([pending, written]) == [None, 'fila-9']
+
+def test_clave_caducada_se_vuelve_a_tomar(tmp_path):
+    index = make_index(tmp_path, ttl_seconds=0.05)
+    key = idempotency_key(compra())
+    assert index.claim(key) is None
+    index.complete([key], ['fila-1'])
+    assert index.claim(key) == 'fila-1'
+    time.sleep(0.1)
+    assert index.claim(key) is None
+
+def test_reservas_compartidas_entre_instancias(tmp_path):
+    key = idempotency_key(compra())
+    assert make_index(tmp_path).claim(key) is None
+    assert make_index(tmp_path).claim(key) == 'pendiente'
\ No newline at end of file
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from utils.plaid import TransactionIdIndex
+
+def make_index(tmp_path, capacity=1000, error_rate=0.01):
+    return TransactionIdIndex(str(tmp_path / 'ids.db'), capacity, error_rate)
+
+def test_seen_solo_marca_ids_escritos(tmp_path):
+    index = make_index(tmp_path)
+    index.add(['a', 'b', None])
+    assert index.seen(pd.Series(['a', 'x', 'b', 'y'])).tolist() == [True, False, True, False]
+    assert index.seen(pd.Series([], dtype=object)).tolist() == []
+
+def test_filter_new_descarta_escritos_y_conserva_filas_sin_id(tmp_path):
+    index = make_index(tmp_path)
+    index.add(['t1'])
+    rows = pd.DataFrame({'plaid_id': ['t1', 't2', None], 'monto': [1.0, 2.0, 3.0]})
+    new = index.filter_new(rows, 'plaid_id')
+    assert new['monto'].tolist() == [2.0, 3.0]
+
+def test_falso_positivo_del_filtro_no_descarta_ids_nuevos(tmp_path):
+    # Filtro diminuto y saturado: todo id nuevo pasa el filtro y se confirma en disco
+    index = make_index(tmp_path, capacity=1, error_rate=0.5)
+    index.add(f'viejo-{i}' for i in range(200))
+    assert np.all(index._bits == 0xFF)
+    new_ids = pd.Series([f'nuevo-{i}' for i in range(50)])
+    assert not index.seen(new_ids).any()
+    assert index.stats['falsos_positivos'] == 50
+    rows = pd.DataFrame({'plaid_id': list(new_ids) + ['viejo-7']})
+    assert index.filter_new(rows, 'plaid_id')['plaid_id'].tolist() == list(new_ids)
+
+def test_filtro_se_reconstruye_desde_sqlite(tmp_path):
+    make_index(tmp_path).add(['a', 'b'])
+    index = make_index(tmp_path)
+    assert index.seen(pd.Series(['a', 'b', 'c'])).tolist() == [True, True, False]
+    assert index.stats['descartados_por_filtro'] + index.stats['falsos_positivos'] == 1
\ No newline at end of file
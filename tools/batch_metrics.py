@@ -0,0 +1,108 @@
+"""Cálculo nocturno de métricas para todos los usuarios en una sola pasada.
+
+Lee la tabla 'transacciones' completa (o un CSV / datos sintéticos), agrega por
+usuario en un pool de procesos y deja el resultado donde lo lee el flujo
+"Cron Diario" de n8n: la tabla ``metricas_usuarios`` y/o un archivo JSON o CSV.
+
+    python tools/batch_metrics.py --table metricas_usuarios
+    python tools/batch_metrics.py --input transacciones.csv --output data/metricas.json
+    python tools/batch_metrics.py --synthetic 5000000 --users 20000 --output data/metricas.json
+    python tools/batch_metrics.py --table metricas_usuarios --alerts-table alertas
+
+Las alertas (reglas de utils/alert_rules.py) salen también como tabla plana, una fila por
+alerta, para el paso de correo de n8n: ``--alerts`` (archivo) y/o ``--alerts-table``.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from config import Config
+from utils.batch_metrics import (
+    compute_all_user_metrics, metrics_records, write_metrics_file, upsert_metrics,
+    load_budgets, load_emergency_funds, evaluate_all_alerts, write_alerts_file, upsert_alerts
+)
+from utils.database import connect_supabase, iter_raw_transaction_pages
+
+SOURCE_COLUMNS = 'id,usuario_id,monto,descripcion,categoria,tipo,fecha'
+
+def supabase_chunks(supabase_client, chunk_rows: int):
+    """Recorrer la tabla completa por páginas keyset y agruparlas en bloques de ~chunk_rows filas"""
+    buffer, buffered = [], 0
+    for page in iter_raw_transaction_pages(supabase_client, {'select': SOURCE_COLUMNS}, max_rows=sys.maxsize):
+        buffer.append(pd.DataFrame.from_records(page))
+        buffered += len(page)
+        if buffered >= chunk_rows:
+            yield pd.concat(buffer, ignore_index=True)
+            buffer, buffered = [], 0
+    if buffer:
+        yield pd.concat(buffer, ignore_index=True)
+
+def csv_chunks(path: str, chunk_rows: int):
+    return pd.read_csv(path, chunksize=chunk_rows)
+
+def synthetic_chunks(rows: int, users: int, chunk_rows: int, seed: int = 42):
+    from utils.synthetic import generate_transactions_frame
+    for index, start in enumerate(range(0, rows, chunk_rows)):
+        yield generate_transactions_frame(min(chunk_rows, rows - start), n_users=users, seed=seed + index)
+
+def main():
+    parser = argparse.ArgumentParser(description='Métricas financieras de todos los usuarios')
+    parser.add_argument('--input', help='CSV con el esquema de la tabla transacciones (por defecto, Supabase)')
+    parser.add_argument('--synthetic', type=int, help='Usar N transacciones sintéticas')
+    parser.add_argument('--users', type=int, default=1000, help='Usuarios de los datos sintéticos')
+    parser.add_argument('--workers', type=int, default=Config.BATCH_WORKERS)
+    parser.add_argument('--chunk-rows', type=int, default=Config.BATCH_CHUNK_ROWS)
+    parser.add_argument('--output', help='Guardar las métricas en .json o .csv')
+    parser.add_argument('--table', help='Guardar las métricas en esta tabla de Supabase (upsert por usuario_id)')
+    parser.add_argument('--alerts', help='Guardar la tabla de alertas en .json o .csv')
+    parser.add_argument('--alerts-table', help='Guardar las alertas del día en esta tabla de Supabase')
+    args = parser.parse_args()
+
+    needs_supabase = not (args.input or args.synthetic) or args.table or args.alerts_table
+    supabase_client = connect_supabase() if needs_supabase else None
+    if args.synthetic:
+        chunks = synthetic_chunks(args.synthetic, args.users, args.chunk_rows)
+    elif args.input:
+        chunks = csv_chunks(args.input, args.chunk_rows)
+    else:
+        chunks = supabase_chunks(supabase_client, args.chunk_rows)
+
+    start = time.perf_counter()
+    try:
+        results = compute_all_user_metrics(chunks, workers=args.workers)
+    except ConnectionError as e:
+        # Métricas de un historial leído a medias serían incorrectas: no se escribe nada
+        print(f'Error leyendo transacciones: {e}', file=sys.stderr)
+        sys.exit(1)
+    # Presupuestos y fondo de emergencia solo existen en Supabase; sin ellos esas reglas no disparan
+    budgets = load_budgets(supabase_client) if supabase_client else None
+    emergency_funds = load_emergency_funds(supabase_client) if supabase_client else None
+    alerts = evaluate_all_alerts(results, budgets, emergency_funds)
+    records = metrics_records(results)
+    print(f'{len(records):,} usuarios y {len(alerts):,} alertas en {time.perf_counter() - start:.2f} s')
+
+    if args.output:
+        write_metrics_file(records, args.output)
+        print(f'Métricas guardadas en {args.output}')
+    if args.alerts:
+        write_alerts_file(alerts, args.alerts)
+        print(f'Alertas guardadas en {args.alerts}')
+    failed = False
+    if args.table:
+        saved = upsert_metrics(supabase_client, records, args.table)
+        print(f'{saved:,} de {len(records):,} filas guardadas en {args.table}')
+        failed |= saved < len(records)
+    if args.alerts_table:
+        saved = upsert_alerts(supabase_client, alerts, args.alerts_table)
+        print(f'{saved:,} de {len(alerts):,} alertas guardadas en {args.alerts_table}')
+        failed |= saved < len(alerts)
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""Categorizar en bloque las transacciones sin categoría útil.
+
+Recorre 'transacciones' (o un CSV con su esquema) por bloques. De las filas que ya
+tienen una categoría válida aprende comercio → categoría (utils/categorizer.py); las
+que no la tienen (vacía, 'Otros' o que no corresponde a su tipo) se categorizan por lote.
+
+    python tools/categorize_transactions.py --output data/categorias_nuevas.csv
+    python tools/categorize_transactions.py --input transacciones.csv --output nuevas.csv
+    python tools/categorize_transactions.py --apply
+
+Con --apply las categorías nuevas se escriben en Supabase con un PATCH por categoría
+y bloque de ids (``id=in.(...)``), no uno por fila. --all recategoriza todas las filas.
+Un PATCH no cambia created_at, así que las filas actualizadas se corrigen también en la
+réplica local y se descarta lo cacheado de esos usuarios en este proceso (la app, si
+corre en otro proceso, lo renueva al vencer CACHE_TTL_SECONDS y AGGREGATES_MAX_AGE_SECONDS;
+los reportes guardados dependen del contenido y se regeneran solos).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from config import Config
+from tools.batch_metrics import supabase_chunks, csv_chunks
+from utils import mirror
+from utils.aggregates import aggregate_store
+from utils.cache import data_cache
+from utils.categorizer import categorizer
+from utils.database import connect_supabase, supabase_request, to_db_user_id
+
+GENERIC_CATEGORIES = ['Otros', 'Otros Ingresos', 'Otros Gastos']
+OUTPUT_COLUMNS = ['id', 'usuario_id', 'descripcion', 'tipo', 'categoria_anterior', 'categoria']
+# Ids por PATCH: mantiene la URL por debajo de los límites habituales (~8 KB con UUIDs)
+PATCH_IDS = 150
+
+def needs_category(chunk: pd.DataFrame) -> pd.Series:
+    """Filas sin categoría, con una genérica ('Otros...') o con una que no es de su tipo"""
+    income = chunk['tipo'] == 'ingreso'
+    valid = (chunk['categoria'].isin(Config.INCOME_CATEGORIES) & income
+             | chunk['categoria'].isin(Config.EXPENSE_CATEGORIES) & ~income)
+    return ~valid | chunk['categoria'].isin(GENERIC_CATEGORIES)
+
+def categorize_chunk(chunk: pd.DataFrame, recategorize_all: bool = False, learn: bool = True) -> pd.DataFrame:
+    """Aprender de las filas ya categorizadas del bloque y devolver las filas con categoría nueva"""
+    pending = needs_category(chunk)
+    if learn:
+        labeled = chunk[~pending]
+        categorizer.learn(labeled['descripcion'].to_numpy(dtype=object), labeled['categoria'].to_numpy(dtype=object),
+                          labeled['tipo'].to_numpy(dtype=object))
+    target = chunk if recategorize_all else chunk[pending]
+    if target.empty:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+    categories = categorizer.categorize(target['descripcion'].to_numpy(dtype=object), target['tipo'].to_numpy(dtype=object),
+                                        target['usuario_id'].to_numpy(dtype=object))
+    result = pd.DataFrame({
+        'id': target['id'].to_numpy(), 'usuario_id': target['usuario_id'].to_numpy(),
+        'descripcion': target['descripcion'].to_numpy(), 'tipo': target['tipo'].to_numpy(),
+        'categoria_anterior': target['categoria'].to_numpy(), 'categoria': categories
+    })
+    return result[result['categoria'] != result['categoria_anterior']]
+
+def invalidate_users(db_user_ids) -> None:
+    """Descartar lo cacheado en este proceso de esos usuarios (las claves usan el id de la app, no el UUID)"""
+    db_user_ids = set(db_user_ids)
+
+    def touched(user_id) -> bool:
+        return to_db_user_id(user_id) in db_user_ids
+
+    data_cache.invalidate(lambda key: len(key) > 1 and touched(key[1]))
+    aggregate_store.invalidate_where(touched)
+
+def apply_categories(supabase_client, changes: pd.DataFrame, table: str = 'transacciones') -> int:
+    """Escribir las categorías nuevas agrupando ids por categoría; devuelve las filas actualizadas"""
+    updated, written = 0, []
+    for category, ids in changes.groupby('categoria', sort=False)['id']:
+        ids = ids.astype(str).tolist()
+        for start in range(0, len(ids), PATCH_IDS):
+            chunk = ids[start:start + PATCH_IDS]
+            result = supabase_request(supabase_client, 'PATCH', table, data={'categoria': category},
+                                      filters={'id': f'in.({",".join(chunk)})'}, prefer='return=minimal')
+            if result is not None:
+                updated += len(chunk)
+                written.extend(chunk)
+                mirror.update_transactions(chunk, {'categoria': category})
+    invalidate_users(changes.loc[changes['id'].astype(str).isin(written), 'usuario_id'].unique())
+    return updated
+
+def main():
+    parser = argparse.ArgumentParser(description='Categorización automática de transacciones en bloque')
+    parser.add_argument('--input', help='CSV con el esquema de la tabla transacciones (por defecto, Supabase)')
+    parser.add_argument('--chunk-rows', type=int, default=Config.BATCH_CHUNK_ROWS)
+    parser.add_argument('--all', action='store_true', help='Recategorizar también las filas que ya tienen categoría')
+    parser.add_argument('--no-learn', action='store_true', help='No aprender de las categorías existentes')
+    parser.add_argument('--output', help='Guardar los cambios propuestos en CSV')
+    parser.add_argument('--apply', action='store_true', help='Escribir las categorías nuevas en Supabase')
+    args = parser.parse_args()
+
+    supabase_client = connect_supabase() if not args.input or args.apply else None
+    chunks = csv_chunks(args.input, args.chunk_rows) if args.input else supabase_chunks(supabase_client, args.chunk_rows)
+
+    start = time.perf_counter()
+    read, changes = 0, []
+    for chunk in chunks:
+        read += len(chunk)
+        changes.append(categorize_chunk(chunk, args.all, not args.no_learn))
+    changes = pd.concat(changes, ignore_index=True) if changes else pd.DataFrame(columns=OUTPUT_COLUMNS)
+    elapsed = time.perf_counter() - start
+    print(f'{read:,} transacciones leídas, {len(changes):,} con categoría nueva en {elapsed:.2f} s')
+    if not changes.empty:
+        print(changes['categoria'].value_counts().to_string())
+
+    if args.output:
+        changes.to_csv(args.output, index=False)
+        print(f'Cambios guardados en {args.output}')
+    if args.apply and not changes.empty:
+        updated = apply_categories(supabase_client, changes)
+        print(f'{updated:,} de {len(changes):,} transacciones actualizadas')
+        if updated < len(changes):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
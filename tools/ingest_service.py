@@ -0,0 +1,139 @@
+"""Servicio de ingesta de transacciones (reemplaza "Webhook Transacciones" → "Procesar
+Transacciones" → "Supabase Transacciones" del flujo de n8n).
+
+Recibe los payloads de Plaid en la misma ruta ``webhook-transacciones``, los deja en una
+cola acotada y los escribe en ``transacciones`` con inserciones multi-fila por lotes
+(``utils/ingest.py``). Si la cola está llena responde 429 con ``Retry-After``. Las
+transacciones cuyo ``transaction_id`` ya se escribió se descartan antes de encolarlas
+(``utils/plaid.py``), así que reenviar un periodo solo escribe lo nuevo.
+
+    python tools/ingest_service.py --port 5678
+    python tools/ingest_service.py --supabase-url http://127.0.0.1:54321 --batch-size 1000
+
+Rutas: ``POST /webhook-transacciones`` (también ``/webhook/webhook-transacciones``, la URL
+de n8n; ``?usuario_id=`` fija el usuario), ``GET /salud`` (contadores de la cola) y
+``GET /metricas`` (tramos en formato Prometheus).
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from utils.database import connect_supabase
+from utils.ingest import IngestQueue, IngestQueueFull
+from utils.instrumentation import registry
+from utils.plaid import normalize_plaid_transactions, plaid_id_index
+
+WEBHOOK_PATHS = ('/webhook-transacciones', '/webhook/webhook-transacciones')
+
+def make_handler(queue: IngestQueue):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body=None, headers: dict = None, content_type: str = 'application/json'):
+            if body is None:
+                payload = b''
+            elif isinstance(body, str):
+                payload = body.encode('utf-8')
+            else:
+                payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            path = urllib.parse.urlparse(self.path).path
+            if path == '/salud':
+                index = queue.id_index.stats if queue.id_index is not None else {}
+                return self._send(200, {**queue.snapshot(), **index})
+            if path == '/metricas':
+                return self._send(200, registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+            self._send(404, {'message': 'not found'})
+
+        def do_POST(self):
+            parsed = urllib.parse.urlparse(self.path)
+            length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(length)
+            if parsed.path not in WEBHOOK_PATHS:
+                return self._send(404, {'message': 'not found'})
+            try:
+                payload = json.loads(body or b'null')
+            except ValueError:
+                return self._send(400, {'message': 'JSON inválido'})
+
+            user_id = dict(urllib.parse.parse_qsl(parsed.query)).get('usuario_id')
+            try:
+                rows = normalize_plaid_transactions(payload, user_id)
+            except (ValueError, TypeError) as e:
+                return self._send(400, {'message': str(e)})
+            received = len(rows)
+            if queue.id_index is not None:
+                rows = queue.id_index.filter_new(rows, queue.id_column)
+            try:
+                accepted, queued = queue.offer(rows.to_dict('records'))
+            except IngestQueueFull as e:
+                return self._send(429, {'message': str(e)}, {'Retry-After': str(queue.retry_after())})
+            except ValueError as e:
+                return self._send(413, {'message': str(e)})
+            # 202: aceptadas en cola; se escriben en el próximo lote
+            self._send(202, {'aceptadas': accepted, 'duplicadas': received - accepted, 'en_cola': queued})
+
+    return Handler
+
+def serve(supabase_client, host: str = '127.0.0.1', port: int = 0, **queue_options):
+    """Arrancar el servicio en un hilo y devolver (servidor, cola, url); por defecto deduplica con plaid_id_index"""
+    queue_options.setdefault('id_index', plaid_id_index)
+    queue = IngestQueue(supabase_client, **queue_options).start()
+    server = ThreadingHTTPServer((host, port), make_handler(queue))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, queue, f'http://{host}:{server.server_port}'
+
+def main():
+    parser = argparse.ArgumentParser(description='Servicio de ingesta de transacciones por lotes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5678)
+    parser.add_argument('--supabase-url', help='URL de PostgREST (por defecto, la de Supabase)')
+    parser.add_argument('--supabase-key', help='Clave de la API (por defecto, la de la app)')
+    parser.add_argument('--batch-size', type=int, default=Config.INGEST_BATCH_SIZE)
+    parser.add_argument('--flush-seconds', type=float, default=Config.INGEST_FLUSH_SECONDS)
+    parser.add_argument('--max-rows', type=int, default=Config.INGEST_MAX_QUEUED_ROWS, help='Filas en cola antes de responder 429')
+    parser.add_argument('--writers', type=int, default=Config.INGEST_WRITERS)
+    args = parser.parse_args()
+
+    supabase_client = connect_supabase()
+    if args.supabase_url:
+        supabase_client['url'] = args.supabase_url.rstrip('/')
+    if args.supabase_key:
+        supabase_client['key'] = args.supabase_key
+
+    server, queue, url = serve(supabase_client, args.host, args.port, max_rows=args.max_rows,
+                               batch_size=args.batch_size, flush_seconds=args.flush_seconds, writers=args.writers)
+    print(f'Ingesta en {url}{WEBHOOK_PATHS[0]} → {supabase_client["url"]}')
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    # Dejar de aceptar conexiones y escribir lo que quedó en cola antes de salir
+    server.shutdown()
+    queue.close()
+    print(json.dumps(queue.snapshot(), ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
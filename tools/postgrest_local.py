@@ -0,0 +1,240 @@
+"""Servidor local que imita el subconjunto de PostgREST que usa la app.
+
+Sirve para probar de punta a punta la réplica SQLite, las inserciones en bloque
+y el servicio de ingesta sin tocar Supabase:
+
+    python tools/postgrest_local.py --port 54321 --seed datos.json
+
+y apuntar el cliente a ``{'url': 'http://127.0.0.1:54321', 'key': 'local'}``.
+Soporta filtros eq/neq/gt/gte/lt/lte/in, ``or``/``and`` anidados, ``select``,
+``order``, ``limit``/``offset``, cabecera ``Range``, POST de una o varias filas
+con ``Prefer: return=minimal`` y ``on_conflict`` + ``resolution`` y PATCH con filtros.
+"""
+import argparse
+import json
+import re
+import threading
+import urllib.parse
+import uuid
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+OPERATORS = {
+    'eq': lambda a, b: a == b,
+    'neq': lambda a, b: a != b,
+    'gt': lambda a, b: a > b,
+    'gte': lambda a, b: a >= b,
+    'lt': lambda a, b: a < b,
+    'lte': lambda a, b: a <= b,
+}
+
+def _split_top_level(text: str) -> list:
+    """Separar por comas que no estén dentro de paréntesis ni comillas"""
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+def _as_comparable(value, literal: str):
+    """Comparar números como números y todo lo demás como texto"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            return value, float(literal)
+        except ValueError:
+            pass
+    return ('' if value is None else str(value)), literal
+
+def _matches(row: dict, column: str, expression: str) -> bool:
+    operator, _, literal = expression.partition('.')
+    negate = operator == 'not'
+    if negate:
+        operator, _, literal = literal.partition('.')
+    if operator == 'in':
+        values = [v.strip('"') for v in _split_top_level(literal.strip('()'))]
+        result = ('' if row.get(column) is None else str(row.get(column))) in values
+    elif operator == 'is':
+        result = row.get(column) is None if literal == 'null' else str(row.get(column)).lower() == literal
+    else:
+        result = OPERATORS[operator](*_as_comparable(row.get(column), literal.strip('"')))
+    return not result if negate else result
+
+def _logic(row: dict, expression: str) -> bool:
+    """Evaluar una expresión or(...)/and(...) de PostgREST"""
+    match = re.match(r'^(and|or)\((.*)\)$', expression.strip())
+    if match:
+        combine = all if match.group(1) == 'and' else any
+        return combine(_logic(row, part) for part in _split_top_level(match.group(2)))
+    column, _, rest = expression.strip().partition('.')
+    return _matches(row, column, rest)
+
+class LocalPostgrest:
+    """Tablas en memoria protegidas por un lock"""
+
+    def __init__(self, seed: dict = None):
+        self.tables = {name: list(rows) for name, rows in (seed or {}).items()}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @staticmethod
+    def _filter(rows: list, query: list) -> list:
+        for key, value in query:
+            if key in ('or', 'and'):
+                rows = [row for row in rows if _logic(row, f'{key}{value}')]
+            elif key not in ('select', 'order', 'limit', 'offset', 'on_conflict'):
+                rows = [row for row in rows if _matches(row, key, value)]
+        return rows
+
+    def select(self, table: str, query: list, range_header: str = None):
+        with self.lock:
+            rows = list(self.tables.get(table, []))
+        select, order, limit, offset = '*', None, None, 0
+        for key, value in query:
+            if key == 'select':
+                select = value
+            elif key == 'order':
+                order = value
+            elif key == 'limit':
+                limit = int(value)
+            elif key == 'offset':
+                offset = int(value)
+        rows = self._filter(rows, query)
+        if order:
+            for part in reversed(order.split(',')):
+                column, *direction = part.split('.')
+                rows.sort(key=lambda row: (row.get(column) is None, _as_comparable(row.get(column), '')[0]),
+                          reverse=bool(direction) and direction[0] == 'desc')
+        total = len(rows)
+        if range_header:
+            start, _, end = range_header.partition('-')
+            offset, limit = int(start), int(end) - int(start) + 1
+        rows = rows[offset:offset + limit if limit is not None else None]
+        if select != '*':
+            columns = select.split(',')
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        return rows, offset, total
+
+    def insert(self, table: str, items: list, on_conflict: str = None, ignore_duplicates: bool = False):
+        now = datetime.now(timezone.utc).isoformat()
+        stored = []
+        with self.lock:
+            rows = self.tables.setdefault(table, [])
+            index = {tuple(row.get(c) for c in on_conflict.split(',')): row for row in rows} if on_conflict else {}
+            for item in items:
+                row = {'id': str(uuid.uuid4()), 'created_at': now, **item}
+                key = tuple(row.get(c) for c in on_conflict.split(',')) if on_conflict else None
+                # Como en Postgres, NULL no choca con nada en una restricción única
+                if key is not None and None in key:
+                    key = None
+                if key is not None and key in index:
+                    if not ignore_duplicates:
+                        index[key].update(item)
+                        stored.append(index[key])
+                    continue
+                rows.append(row)
+                if key is not None:
+                    index[key] = row
+                stored.append(row)
+        return stored
+
+    def update(self, table: str, query: list, values: dict):
+        with self.lock:
+            rows = self._filter(self.tables.get(table, []), query)
+            for row in rows:
+                row.update(values)
+        return rows
+
+def make_handler(store: LocalPostgrest):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body=None, headers: dict = None):
+            payload = json.dumps(body, default=str).encode('utf-8') if body is not None else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _route(self):
+            parsed = urllib.parse.urlparse(self.path)
+            if not parsed.path.startswith('/rest/v1/'):
+                return None, []
+            return parsed.path[len('/rest/v1/'):], urllib.parse.parse_qsl(parsed.query)
+
+        def do_GET(self):
+            store.requests += 1
+            table, query = self._route()
+            if table is None:
+                return self._send(404, {'message': 'not found'})
+            rows, offset, total = store.select(table, query, self.headers.get('Range'))
+            end = offset + len(rows) - 1 if rows else offset
+            self._send(200, rows, {'Content-Range': f'{offset}-{end}/{total}'})
+
+        def do_POST(self):
+            store.requests += 1
+            table, query = self._route()
+            if table is None:
+                return self._send(404, {'message': 'not found'})
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'null')
+            items = body if isinstance(body, list) else [body]
+            prefer = self.headers.get('Prefer', '')
+            stored = store.insert(table, items, dict(query).get('on_conflict'),
+                                  ignore_duplicates='resolution=ignore-duplicates' in prefer)
+            if 'return=minimal' in prefer:
+                return self._send(201)
+            self._send(201, stored)
+
+        def do_PATCH(self):
+            store.requests += 1
+            table, query = self._route()
+            if table is None:
+                return self._send(404, {'message': 'not found'})
+            length = int(self.headers.get('Content-Length', 0))
+            rows = store.update(table, query, json.loads(self.rfile.read(length) or b'{}'))
+            if 'return=minimal' in self.headers.get('Prefer', ''):
+                return self._send(204)
+            self._send(200, rows)
+
+    return Handler
+
+def serve(host: str = '127.0.0.1', port: int = 0, seed: dict = None):
+    """Arrancar el servidor en un hilo y devolver (servidor, store, url)"""
+    store = LocalPostgrest(seed)
+    server = ThreadingHTTPServer((host, port), make_handler(store))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, store, f'http://{host}:{server.server_port}'
+
+def main():
+    parser = argparse.ArgumentParser(description='PostgREST local en memoria para pruebas')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--seed', help='JSON con {"tabla": [filas, ...]}')
+    args = parser.parse_args()
+
+    seed = None
+    if args.seed:
+        with open(args.seed, encoding='utf-8') as f:
+            seed = json.load(f)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(LocalPostgrest(seed)))
+    print(f'PostgREST local en http://{args.host}:{server.server_port}/rest/v1/')
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,63 @@
+"""Pregeneración mensual de reportes para todos los usuarios.
+
+Recorre los usuarios con transacciones en el mes y deja sus reportes en la caché
+de artefactos (``Config.ARTIFACT_CACHE_DIR``), de modo que la descarga desde
+"Reportes" es inmediata. Pensado para el flujo "Cron Diario" de n8n el día 1.
+
+    python tools/pregenerate_reports.py --period 2024-03
+    python tools/pregenerate_reports.py --period 2024-03 --formats PDF,Excel --workers 4
+    python tools/pregenerate_reports.py --period 2024-03 --users user_demo_123
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from utils.database import connect_supabase, build_transaction_filters, iter_raw_transaction_pages
+from utils.report_jobs import REPORT_FORMATS, pregenerate_monthly_reports, recent_periods
+
+def period_user_ids(supabase_client, period: str):
+    """Usuarios con transacciones en el mes (solo se descargan id, fecha y usuario_id)"""
+    filters = {**build_transaction_filters(period=period), 'select': 'id,fecha,usuario_id'}
+    seen = set()
+    for page in iter_raw_transaction_pages(supabase_client, filters, max_rows=sys.maxsize):
+        for row in page:
+            user_id = row.get('usuario_id')
+            if user_id and user_id not in seen:
+                seen.add(user_id)
+                yield user_id
+
+def main():
+    parser = argparse.ArgumentParser(description='Reportes mensuales de todos los usuarios')
+    parser.add_argument('--period', default=recent_periods(2)[1], help='Mes YYYY-MM (por defecto, el anterior)')
+    parser.add_argument('--formats', default='PDF', help=f'Formatos separados por coma ({",".join(REPORT_FORMATS)})')
+    parser.add_argument('--users', help='Ids de usuario separados por coma (por defecto, todos los del mes)')
+    parser.add_argument('--workers', type=int, default=Config.REPORT_WORKERS)
+    args = parser.parse_args()
+
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+    unknown = set(formats) - set(REPORT_FORMATS)
+    if unknown:
+        parser.error(f'Formatos no soportados: {", ".join(sorted(unknown))}')
+
+    if args.users:
+        user_ids = [u.strip() for u in args.users.split(',') if u.strip()]
+    else:
+        user_ids = period_user_ids(connect_supabase(), args.period)
+
+    start = time.perf_counter()
+    counts = {}
+    for user_id, report_format, status in pregenerate_monthly_reports(user_ids, args.period, formats, args.workers):
+        counts[status] = counts.get(status, 0) + 1
+        if status.startswith('error'):
+            print(f'{user_id} {report_format}: {status}')
+    summary = ', '.join(f'{count:,} {status}' for status, count in sorted(counts.items())) or 'sin usuarios'
+    print(f'{args.period}: {summary} en {time.perf_counter() - start:.2f} s')
+    if any(status.startswith('error') for status in counts):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
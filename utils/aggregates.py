@@ -0,0 +1,250 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Union
+
+import pandas as pd
+
+from config import Config
+from utils.instrumentation import instrumented
+
+def _normalize(transaction: dict) -> tuple:
+    """(monto, tipo, categoría, fecha, descripción) de una transacción en formato app o crudo de la BD"""
+    amount = float(transaction.get('amount', transaction.get('monto', 0)) or 0)
+    transaction_type = transaction.get('transaction_type')
+    if transaction_type is None:
+        transaction_type = 'income' if transaction.get('tipo') == 'ingreso' else 'expense'
+    # Igual que transactions_frame: una categoría vacía se agrupa como ''
+    category = transaction.get('category', transaction.get('categoria')) or ''
+    date = transaction.get('date') or transaction.get('fecha') or datetime.now().date().isoformat()
+    date = pd.Timestamp(date)
+    description = transaction.get('description', transaction.get('descripcion'))
+    return amount, transaction_type, category, date, description
+
+class UserAggregates:
+    """Totales acumulados de un usuario: mes × categoría × tipo, más lo que necesitan los patrones.
+
+    Cada celda guarda [suma, cantidad] y cada descripción [cantidad, suma, suma de cuadrados],
+    así que sumar o restar una transacción es O(1) y la desviación estándar se puede recalcular.
+    Las celdas por día y las descripciones por día permiten recortar una ventana (window()).
+    """
+
+    def __init__(self):
+        self.cells = {}          # (mes 'YYYY-MM', categoría, tipo) -> [suma, cantidad]
+        self.days = {}           # (día 'YYYY-MM-DD', categoría, tipo) -> [suma, cantidad]
+        self.weekday = {}        # día (0 = lunes) -> [gasto, cantidad]
+        self.descriptions = {}   # (día 'YYYY-MM-DD', descripción de gasto) -> [cantidad, suma, suma de cuadrados]
+        self.built_at = time.monotonic()
+        self._version = 0        # Cambia con cada apply(): invalida la última ventana calculada
+        self._window = None
+
+    def apply(self, transaction: dict, sign: int = 1) -> None:
+        """Sumar (sign=1) o restar (sign=-1) una transacción"""
+        amount, transaction_type, category, when, description = _normalize(transaction)
+        day = when.strftime('%Y-%m-%d')
+        self._version += 1
+        self._bump(self.cells, (day[:7], category, transaction_type), [amount, 1], sign, 1)
+        self._bump(self.days, (day, category, transaction_type), [amount, 1], sign, 1)
+        if transaction_type == 'expense':
+            self._bump(self.weekday, when.dayofweek, [amount, 1], sign, 1)
+            if description is not None:
+                self._bump(self.descriptions, (day, description), [1, amount, amount * amount], sign, 0)
+
+    @staticmethod
+    def _bump(table: dict, key, values: list, sign: int, count_index: int) -> None:
+        current = table.setdefault(key, [0.0] * len(values))
+        for i, value in enumerate(values):
+            current[i] += sign * value
+        # Una celda sin transacciones desaparece, igual que en un groupby sobre las filas
+        if current[count_index] <= 0:
+            del table[key]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'UserAggregates':
+        """Reconstruir los totales de forma vectorizada desde el DataFrame tipado de transacciones"""
+        aggregates = cls()
+        if df is None or len(df) == 0:
+            return aggregates
+        # Las filas sin fecha no pertenecen a ningún mes
+        df = df[pd.to_datetime(df['date']).notna()]
+        dates = pd.to_datetime(df['date'])
+        frame = pd.DataFrame({
+            'day': dates.dt.strftime('%Y-%m-%d'),
+            'month': dates.dt.strftime('%Y-%m'),
+            'weekday': dates.dt.dayofweek,
+            'category': df['category'].astype(object).fillna(''),
+            'transaction_type': df['transaction_type'].astype(object),
+            'description': df['description'].astype(object) if 'description' in df.columns else None,
+            'amount': df['amount'].astype('float64')
+        })
+        cells = frame.groupby(['month', 'category', 'transaction_type'])['amount'].agg(['sum', 'count'])
+        aggregates.cells = {key: [row['sum'], row['count']] for key, row in cells.iterrows()}
+        days = frame.groupby(['day', 'category', 'transaction_type'])['amount'].agg(['sum', 'count'])
+        aggregates.days = {key: [row['sum'], row['count']] for key, row in days.iterrows()}
+
+        expenses = frame[frame['transaction_type'] == 'expense']
+        weekday = expenses.groupby('weekday')['amount'].agg(['sum', 'count'])
+        aggregates.weekday = {int(day): [row['sum'], row['count']] for day, row in weekday.iterrows()}
+        descriptions = expenses.assign(square=expenses['amount'] ** 2)\
+            .groupby(['day', 'description'])[['amount', 'square']].agg(['count', 'sum'])
+        aggregates.descriptions = {
+            key: [row[('amount', 'count')], row[('amount', 'sum')], row[('square', 'sum')]]
+            for key, row in descriptions.iterrows()
+        }
+        return aggregates
+
+    def window(self, days: int, today: date = None) -> 'UserAggregates':
+        """Agregados de los últimos `days` días (como build_transaction_filters), a partir de las celdas por día"""
+        today = today or datetime.now().date()
+        # En cada rerun el tablero pide la misma ventana: se recalcula solo si hubo cambios
+        cached = self._window
+        if cached is not None and cached[0] == (days, today, self._version):
+            return cached[1]
+        version = self._version
+        start, end = (today - timedelta(days=days)).isoformat(), today.isoformat()
+        window = UserAggregates()
+        window.built_at = self.built_at
+        # list(): una inserción concurrente puede tocar los diccionarios mientras se recorren
+        for (day, category, transaction_type), (total, count) in list(self.days.items()):
+            if start <= day <= end:
+                window.days[(day, category, transaction_type)] = [total, count]
+                self._bump(window.cells, (day[:7], category, transaction_type), [total, count], 1, 1)
+                if transaction_type == 'expense':
+                    self._bump(window.weekday, date.fromisoformat(day).weekday(), [total, count], 1, 1)
+        window.descriptions = {key: list(values) for key, values in list(self.descriptions.items())
+                               if start <= key[0] <= end}
+        self._window = ((days, today, version), window)
+        return window
+
+    def months(self) -> List[str]:
+        return sorted({month for month, _, _ in self.cells})
+
+    def month_total(self, month: str, transaction_type: str) -> float:
+        return sum(total for (m, _, t), (total, _) in self.cells.items() if m == month and t == transaction_type)
+
+    def month_net(self, month: str) -> float:
+        return self.month_total(month, 'income') - self.month_total(month, 'expense')
+
+    def expenses_by_category(self, month: str = None) -> Dict[str, float]:
+        """Gasto por categoría de un mes (o de todo el historial si month es None)"""
+        totals = {}
+        for (m, category, t), (total, _) in self.cells.items():
+            if t == 'expense' and (month is None or m == month):
+                totals[category] = totals.get(category, 0.0) + total
+        return totals
+
+    def weekday_expenses(self) -> Dict[int, float]:
+        return {day: total for day, (total, _) in sorted(self.weekday.items())}
+
+    def description_stds(self) -> List[float]:
+        """Desviación estándar muestral de cada descripción de gasto con al menos dos movimientos"""
+        merged = {}
+        for (_, description), values in self.descriptions.items():
+            current = merged.setdefault(description, [0.0, 0.0, 0.0])
+            for i, value in enumerate(values):
+                current[i] += value
+        stds = []
+        for count, total, squares in merged.values():
+            if count >= 2:
+                variance = max((squares - total * total / count) / (count - 1), 0.0)
+                stds.append(variance ** 0.5)
+        return stds
+
+    def equals(self, other: 'UserAggregates', tolerance: float = 0.01) -> List[str]:
+        """Diferencias entre dos agregados (vacía si son consistentes)"""
+        differences = []
+        for name in ('cells', 'days', 'weekday', 'descriptions'):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            for key in set(mine) | set(theirs):
+                a, b = mine.get(key), theirs.get(key)
+                if a is None or b is None or any(abs(x - y) > tolerance * max(1.0, abs(y)) for x, y in zip(a, b)):
+                    differences.append(f'{name}{key}: {a} != {b}')
+        return differences
+
+class AggregateStore:
+    """Agregados por usuario compartidos por todas las sesiones del proceso"""
+
+    def __init__(self, max_age_seconds: float):
+        self.max_age_seconds = max_age_seconds
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str):
+        """Agregados del usuario si existen y no han caducado (otras fuentes pueden escribir en la BD)"""
+        with self._lock:
+            aggregates = self._users.get(user_id)
+            if aggregates is not None and time.monotonic() - aggregates.built_at > self.max_age_seconds:
+                del self._users[user_id]
+                return None
+            return aggregates
+
+    def rebuild(self, user_id: str, transactions: Union[List[Dict], pd.DataFrame]) -> UserAggregates:
+        """Recalcular desde el historial completo"""
+        from utils.database import transactions_frame
+        aggregates = UserAggregates.from_frame(transactions_frame(transactions))
+        with self._lock:
+            self._users[user_id] = aggregates
+        return aggregates
+
+    def add(self, user_id: str, transactions: List[Dict]) -> None:
+        self._apply(user_id, transactions, 1)
+
+    def remove(self, user_id: str, transactions: List[Dict]) -> None:
+        self._apply(user_id, transactions, -1)
+
+    def correct(self, user_id: str, old: dict, new: dict) -> None:
+        """Reemplazar una transacción corregida: restar la versión anterior y sumar la nueva"""
+        with self._lock:
+            aggregates = self._users.get(user_id)
+            if aggregates is not None:
+                aggregates.apply(old, -1)
+                aggregates.apply(new, 1)
+
+    def _apply(self, user_id: str, transactions: List[Dict], sign: int) -> None:
+        with self._lock:
+            aggregates = self._users.get(user_id)
+            # Si el usuario no está cargado no hay nada que actualizar: la próxima lectura reconstruye
+            if aggregates is not None:
+                for transaction in transactions:
+                    aggregates.apply(transaction, sign)
+
+    def check_consistency(self, user_id: str, transactions: Union[List[Dict], pd.DataFrame],
+                          tolerance: float = 0.01) -> List[str]:
+        """Comparar los agregados incrementales con una reconstrucción completa"""
+        from utils.database import transactions_frame
+        current = self.get(user_id)
+        rebuilt = UserAggregates.from_frame(transactions_frame(transactions))
+        if current is None:
+            return []
+        with self._lock:
+            return current.equals(rebuilt, tolerance)
+
+    def invalidate(self, user_id: str = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def invalidate_where(self, predicate: Callable[[str], bool]) -> int:
+        """Descartar los usuarios que cumplan el predicado (p. ej. por su UUID de la BD)"""
+        with self._lock:
+            users = [user_id for user_id in self._users if predicate(user_id)]
+            for user_id in users:
+                del self._users[user_id]
+            return len(users)
+
+aggregate_store = AggregateStore(Config.AGGREGATES_MAX_AGE_SECONDS)
+
+@instrumented()
+def get_user_aggregates(supabase_client, user_id: str) -> UserAggregates:
+    """Agregados del usuario; la primera vez (o al caducar) se reconstruyen con todo el historial"""
+    aggregates = aggregate_store.get(user_id)
+    if aggregates is None:
+        from utils.database import load_transactions_frame
+        frame = load_transactions_frame(supabase_client, user_id, days=None)
+        if frame.attrs.get('sample'):
+            # Los datos de ejemplo no se guardan: la primera transacción real los reemplaza
+            return UserAggregates.from_frame(frame)
+        aggregates = aggregate_store.rebuild(user_id, frame)
+    return aggregates
\ No newline at end of file
@@ -0,0 +1,159 @@
+import operator
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+# Reglas como datos: cada una compara una columna de la tabla de usuarios ('user') o de
+# usuario × categoría ('category') contra un umbral de Config. El mensaje se formatea con
+# la fila (value, threshold, category y las columnas de la tabla). El orden es el de salida.
+ALERT_RULES = [
+    {
+        'id': 'savings_rate', 'level': 'user', 'metric': 'savings_rate', 'op': '<',
+        'threshold': Config.SAVINGS_RATE_ALERT, 'severity': 'high',
+        'message': 'Tasa de ahorro baja ({value:.1f}%). Objetivo: {target:.0f}%',
+        'target': Config.SAVINGS_RATE_TARGET
+    },
+    {
+        'id': 'category_spending', 'level': 'category', 'metric': 'share', 'op': '>',
+        'threshold': Config.HIGH_SPENDING_ALERT * 100, 'severity': 'medium',
+        'message': 'Alto gasto en {category} ({value:.1f}% del total)'
+    },
+    {
+        'id': 'deficit', 'level': 'user', 'metric': 'deficit', 'op': '>',
+        'threshold': 0, 'severity': 'high',
+        'message': 'Gastos superan ingresos este mes'
+    },
+    {
+        'id': 'budget_overrun', 'level': 'category', 'metric': 'budget_usage', 'op': '>',
+        'threshold': Config.BUDGET_ALERT_PERCENT, 'severity': 'high',
+        'message': 'Has excedido tu presupuesto de {category} ({value:.0f}% de ${budget:,.2f})'
+    },
+    {
+        'id': 'emergency_fund', 'level': 'user', 'metric': 'emergency_months', 'op': '<',
+        'threshold': Config.EMERGENCY_FUND_TARGET, 'severity': 'medium',
+        'message': 'Tu fondo de emergencia cubre {value:.1f} meses de gastos. Objetivo: {threshold:.0f} meses'
+    },
+]
+
+OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+USER_METRICS = ('income', 'expenses', 'net_savings', 'savings_rate', 'deficit', 'emergency_fund', 'emergency_months')
+CATEGORY_METRICS = ('amount', 'share', 'budget', 'budget_usage')
+# Etiquetas de la tabla de alertas (las que ya usa el flujo de n8n)
+SEVERITY_LABELS = {'high': 'alta', 'medium': 'media', 'low': 'baja'}
+ALERT_COLUMNS = ['usuario_id', 'fecha', 'tipo', 'severidad', 'categoria', 'valor', 'umbral', 'mensaje']
+
+def compile_rules(rules: List[Dict[str, Any]] = None) -> List[Tuple[Dict[str, Any], Callable[[pd.DataFrame], np.ndarray]]]:
+    """Validar las reglas y convertirlas en predicados vectorizados (una máscara booleana por tabla)"""
+    compiled = []
+    for rule in ALERT_RULES if rules is None else rules:
+        metrics = USER_METRICS if rule['level'] == 'user' else CATEGORY_METRICS if rule['level'] == 'category' else None
+        if metrics is None:
+            raise ValueError(f"Regla {rule['id']}: nivel desconocido {rule['level']!r}")
+        if rule['metric'] not in metrics:
+            raise ValueError(f"Regla {rule['id']}: métrica desconocida {rule['metric']!r}")
+        if rule['op'] not in OPERATORS:
+            raise ValueError(f"Regla {rule['id']}: operador desconocido {rule['op']!r}")
+
+        def predicate(frame, metric=rule['metric'], compare=OPERATORS[rule['op']], threshold=float(rule['threshold'])):
+            # NaN (dato que falta, p. ej. sin presupuesto) nunca dispara la regla
+            return compare(frame[metric].to_numpy(dtype='float64'), threshold)
+        compiled.append((rule, predicate))
+    return compiled
+
+def user_frame(income: pd.Series, expenses: pd.Series, emergency_fund: pd.Series = None) -> pd.DataFrame:
+    """Tabla por usuario (índice user_id) con las métricas de las reglas de nivel 'user'"""
+    users = pd.DataFrame({'income': income, 'expenses': expenses}).fillna(0.0).astype('float64')
+    users.index.name = 'user_id'
+    users['net_savings'] = users['income'] - users['expenses']
+    # Igual que las métricas del mes: sin ingresos la tasa de ahorro es 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        users['savings_rate'] = np.where(users['income'] > 0, users['net_savings'] / users['income'] * 100, 0.0)
+        users['deficit'] = users['expenses'] - users['income']
+        fund = emergency_fund.reindex(users.index).astype('float64') if emergency_fund is not None else np.nan
+        users['emergency_fund'] = fund
+        users['emergency_months'] = np.where(users['expenses'] > 0, users['emergency_fund'] / users['expenses'], np.nan)
+    return users
+
+def category_frame(expenses_by_category: pd.Series, budgets: pd.Series = None) -> pd.DataFrame:
+    """Tabla por usuario × categoría (índice user_id, category) para las reglas de nivel 'category'"""
+    categories = pd.DataFrame({'amount': expenses_by_category.astype('float64')})
+    categories.index.names = ['user_id', 'category']
+    total = categories['amount'].groupby(level='user_id', sort=False).transform('sum')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        categories['share'] = np.where(total > 0, categories['amount'] / total * 100, np.nan)
+        budget = budgets.reindex(categories.index).astype('float64') if budgets is not None else np.nan
+        categories['budget'] = budget
+        categories['budget_usage'] = np.where(categories['budget'] > 0, categories['amount'] / categories['budget'] * 100, np.nan)
+    return categories
+
+def evaluate_rules(users: pd.DataFrame, categories: pd.DataFrame, rules: List[Dict[str, Any]] = None,
+                   today: datetime = None) -> pd.DataFrame:
+    """Evaluar todas las reglas sobre todos los usuarios a la vez; devuelve la tabla de alertas.
+
+    Cada regla es una comparación vectorizada sobre su tabla; solo las filas que disparan
+    se formatean. Orden: por usuario y, dentro de cada usuario, el de las reglas.
+    """
+    fecha = (today or datetime.now()).date().isoformat()
+    parts = []
+    for order, (rule, predicate) in enumerate(compile_rules(rules)):
+        frame = users if rule['level'] == 'user' else categories
+        if frame is None or frame.empty:
+            continue
+        fired = frame[predicate(frame)]
+        if fired.empty:
+            continue
+        fired = fired.reset_index()
+        values = fired[rule['metric']].to_numpy(dtype='float64')
+        extra = {key: value for key, value in rule.items() if key not in ('id', 'message', 'threshold')}
+        messages = [
+            rule['message'].format(**{**row, **extra, 'value': value, 'threshold': rule['threshold'],
+                                      'category': row.get('category', '')})
+            for row, value in zip(fired.to_dict('records'), values)
+        ]
+        parts.append(pd.DataFrame({
+            'usuario_id': fired['user_id'].to_numpy(), 'fecha': fecha, 'tipo': rule['id'],
+            'severidad': SEVERITY_LABELS.get(rule['severity'], rule['severity']),
+            'categoria': fired['category'].to_numpy() if 'category' in fired.columns else '',
+            'valor': np.round(values, 2), 'umbral': float(rule['threshold']), 'mensaje': messages,
+            '_orden': order
+        }))
+    if not parts:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+    table = pd.concat(parts, ignore_index=True)
+    # Orden estable: las alertas de cada usuario quedan en el orden de las reglas
+    table = table.sort_values(['usuario_id', '_orden'], kind='stable', ignore_index=True)
+    return table[ALERT_COLUMNS]
+
+def alerts_by_user(table: pd.DataFrame) -> Dict[Any, List[Dict[str, str]]]:
+    """Tabla de alertas -> {usuario: [{'type', 'severity', 'message'}]} (formato de las métricas de la app)"""
+    severities = {label: severity for severity, label in SEVERITY_LABELS.items()}
+    grouped = {}
+    for user_id, rule_id, severity, message in zip(table['usuario_id'], table['tipo'], table['severidad'], table['mensaje']):
+        grouped.setdefault(user_id, []).append({
+            'type': rule_id, 'severity': severities.get(severity, severity), 'message': message
+        })
+    return grouped
+
+def evaluate_user_alerts(income: float, expenses: float, expenses_by_category: Dict[str, float],
+                         emergency_fund: Optional[float] = None) -> List[Dict[str, str]]:
+    """Las mismas reglas para un solo usuario (la página de análisis)"""
+    users = user_frame(pd.Series({0: income}), pd.Series({0: expenses}),
+                       pd.Series({0: emergency_fund}) if emergency_fund is not None else None)
+    index = pd.MultiIndex.from_arrays([[0] * len(expenses_by_category), list(expenses_by_category)])
+    categories = category_frame(pd.Series(list(expenses_by_category.values()), index=index, dtype='float64'))
+    return alerts_by_user(evaluate_rules(users, categories)).get(0, [])
+
+def rule_frames_from_metrics(results: Dict[Any, Dict[str, Any]], budgets: pd.Series = None,
+                             emergency_funds: pd.Series = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Tablas de las reglas a partir de las métricas por usuario del cálculo en lote"""
+    users = list(results)
+    income = pd.Series([results[u]['monthly_income'] for u in users], index=users, dtype='float64')
+    expenses = pd.Series([results[u]['monthly_expenses'] for u in users], index=users, dtype='float64')
+    pairs = [(u, category, amount) for u in users for category, amount in results[u]['expenses_by_category'].items()]
+    index = pd.MultiIndex.from_arrays([[u for u, _, _ in pairs], [c for _, c, _ in pairs]], names=['user_id', 'category'])
+    by_category = pd.Series([amount for _, _, amount in pairs], index=index, dtype='float64')
+    return user_frame(income, expenses, emergency_funds), category_frame(by_category, budgets)
\ No newline at end of file
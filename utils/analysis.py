@@ -1,45 +1,134 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from datetime import datetime
+from typing import Dict, List, Any, Union
 
-def calculate_financial_metrics(transactions: List[Dict]) -> Dict[str, Any]:
-    if not transactions:
-        return {
-            'monthly_income': 0, 'monthly_expenses': 0, 'net_savings': 0, 
-            'savings_rate': 0, 'financial_health': 'Sin datos', 
-            'expenses_by_category': {}, 'spending_patterns': [], 'alerts': []
-        }
-    
-    df = pd.DataFrame(transactions)
+from utils.instrumentation import instrumented
+from utils.alert_rules import evaluate_user_alerts
+
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+# Códigos de tipo usados en el cubo de métricas
+INCOME, EXPENSE, OTHER = 1, 0, -1
+
+def _codes(values) -> tuple:
+    """Códigos enteros y etiquetas de una columna (-1 para vacíos), reutilizando los de un categórico"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), np.asarray(values.cat.categories, dtype=object)
+    codes, uniques = pd.factorize(values)
+    return codes, np.asarray(uniques, dtype=object)
+
+def _prepare_columns(transactions: Union[List[Dict], pd.DataFrame]) -> tuple:
+    """Reducir la entrada a columnas enteras (mes, día, tipo, categoría) sin modificarla"""
+    df = transactions if isinstance(transactions, pd.DataFrame) else pd.DataFrame(transactions)
     
     # CORREGIDO: Manejar diferentes nombres de columna para fecha
     date_column = 'date' if 'date' in df.columns else 'fecha'
-    if date_column not in df.columns:
-        # Si no hay columna de fecha, crear una por defecto
-        df[date_column] = datetime.now().strftime('%Y-%m-%d')
+    if date_column in df.columns:
+        dates = df[date_column]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates)
+    else:
+        # Si no hay columna de fecha, usar la fecha de hoy
+        dates = pd.Series(pd.Timestamp(datetime.now().date()), index=df.index)
     
-    df[date_column] = pd.to_datetime(df[date_column])
-    df['amount'] = pd.to_numeric(df['amount'])
+    amount = df['amount'] if df['amount'].dtype == 'float64' else pd.to_numeric(df['amount'])
     
-    current_date = datetime.now()
-    first_day_current_month = current_date.replace(day=1)
-    last_day_previous_month = first_day_current_month - timedelta(days=1)
-    first_day_previous_month = last_day_previous_month.replace(day=1)
+    def column(name):
+        return df[name] if name in df.columns else pd.Series(np.full(len(df), None, dtype=object), index=df.index)
     
-    monthly_data = df[
-        (df[date_column] >= first_day_previous_month) & 
-        (df[date_column] <= last_day_previous_month)
-    ]
+    transaction_type = column('transaction_type').to_numpy()
+    kind = np.where(transaction_type == 'income', INCOME, np.where(transaction_type == 'expense', EXPENSE, OTHER))
+    category_codes, categories = _codes(column('category'))
+    
+    # Mes (año*12 + mes-1) y día de la semana como enteros, directo del datetime64:
+    # agrupar por enteros es mucho más rápido que por Period o por nombres de día
+    values = dates.to_numpy(dtype='datetime64[ns]')
+    missing = np.isnat(values)
+    month = values.astype('datetime64[M]').astype('int64').astype('float64') + 1970 * 12
+    weekday = (values.astype('datetime64[D]').astype('int64') + 3) % 7  # 1970-01-01 fue jueves
+    month[missing] = np.nan
+    weekday = np.where(missing, np.nan, weekday)
+    
+    columns = pd.DataFrame({
+        'month': month,
+        'weekday': weekday,
+        'kind': kind.astype('int8'),
+        'category': category_codes,
+        'amount': amount.to_numpy(dtype='float64')
+    })
+    return columns, categories, column('description')
+
+def _month_label(code) -> str:
+    year, month = divmod(int(code), 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+def build_metrics_cube(transactions: Union[List[Dict], pd.DataFrame]) -> Dict[str, Any]:
+    """Agregar todo el historial en una sola pasada: mes × día × tipo × categoría.
+
+    Cada métrica del tablero se deriva de este cubo (y de la dispersión por descripción
+    de los gastos), sin volver a filtrar las filas originales.
+    """
+    columns, categories, descriptions = _prepare_columns(transactions)
+    # dropna=False: las filas sin fecha no entran en ningún mes pero siguen contando en el gasto por categoría
+    cube = columns.groupby(['month', 'weekday', 'kind', 'category'], sort=True, dropna=False)['amount'].sum()
     
-    monthly_income = monthly_data[monthly_data['transaction_type'] == 'income']['amount'].sum()
-    monthly_expenses = monthly_data[monthly_data['transaction_type'] == 'expense']['amount'].sum()
+    is_expense = columns['kind'].to_numpy() == EXPENSE
+    expense_std = columns['amount'][is_expense].groupby(descriptions.to_numpy()[is_expense]).std()
+    return {
+        'cube': cube,
+        'categories': categories,
+        'month_kind': cube.groupby(level=['month', 'kind']).sum().unstack('kind', fill_value=0.0),
+        'expense_std_by_description': expense_std
+    }
+
+def _kind_total(month_kind: pd.DataFrame, kind: int) -> pd.Series:
+    return month_kind[kind] if kind in month_kind.columns else pd.Series(0.0, index=month_kind.index)
+
+def _expense_totals(cube: pd.Series, level: str) -> pd.Series:
+    """Gasto total agrupado por un nivel del cubo (todo el historial)"""
+    expenses = cube[cube.index.get_level_values('kind') == EXPENSE]
+    totals = expenses.groupby(level=level).sum()
+    # Código -1 = categoría vacía; igual que groupby('category') en pandas, no se cuenta
+    return totals[totals.index >= 0] if level == 'category' else totals
+
+def _monthly_trends_from(month_kind: pd.DataFrame) -> Dict[str, float]:
+    savings = (_kind_total(month_kind, INCOME) - _kind_total(month_kind, EXPENSE)).tail(6)
+    return {_month_label(code): float(value) for code, value in savings.items()}
+
+def _spending_patterns(recurring_stds: pd.Series, weekday_spending: pd.Series,
+                       category_spending: pd.Series) -> List[str]:
+    """Patrones a partir de la dispersión por descripción y el gasto por día y por categoría"""
+    patterns = []
+    if len(recurring_stds) > 0 and recurring_stds.mean() < 50:
+        patterns.append("Gastos recurrentes estables")
+    
+    if len(weekday_spending) > 0:
+        max_day = WEEKDAY_NAMES[int(weekday_spending.idxmax())]
+        patterns.append(f"Mayor gasto los {max_day}")
+    
+    if len(category_spending) > 0:
+        patterns.append(f"Gasto principal en {category_spending.idxmax()}")
+    return patterns
+
+def _spending_patterns_from(engine: Dict[str, Any]) -> List[str]:
+    category_spending = _expense_totals(engine['cube'], 'category')
+    category_spending.index = engine['categories'][category_spending.index.to_numpy(dtype='int64')]
+    return _spending_patterns(engine['expense_std_by_description'], _expense_totals(engine['cube'], 'weekday'),
+                              category_spending)
+
+def _empty_metrics() -> Dict[str, Any]:
+    return {
+        'monthly_income': 0, 'monthly_expenses': 0, 'net_savings': 0, 
+        'savings_rate': 0, 'financial_health': 'Sin datos', 
+        'expenses_by_category': {}, 'spending_patterns': [], 'alerts': []
+    }
+
+def _assemble_metrics(monthly_income: float, monthly_expenses: float, expenses_by_category: Dict,
+                      spending_patterns: List[str], monthly_trends: Dict[str, float],
+                      alerts: List[Dict] = None) -> Dict[str, Any]:
     net_savings = monthly_income - monthly_expenses
     savings_rate = (net_savings / monthly_income * 100) if monthly_income > 0 else 0
     
-    expenses_by_category = monthly_data[monthly_data['transaction_type'] == 'expense']\
-        .groupby('category')['amount'].sum().to_dict()
-    
     if savings_rate >= 20:
         financial_health = "Excelente"
         health_trend = "+5%"
@@ -53,9 +142,9 @@ def calculate_financial_metrics(transactions: List[Dict]) -> Dict[str, Any]:
         financial_health = "Necesita Mejora"
         health_trend = "-5%"
     
-    spending_patterns = identify_spending_patterns(df, date_column)
-    alerts = generate_financial_alerts(monthly_income, monthly_expenses, expenses_by_category)
-    monthly_trends = calculate_monthly_trends(df, date_column)
+    # En lote las alertas llegan ya evaluadas para todos los usuarios a la vez
+    if alerts is None:
+        alerts = generate_financial_alerts(monthly_income, monthly_expenses, expenses_by_category)
     
     return {
         'monthly_income': monthly_income, 'monthly_expenses': monthly_expenses,
@@ -65,75 +154,75 @@ def calculate_financial_metrics(transactions: List[Dict]) -> Dict[str, Any]:
         'alerts': alerts, 'monthly_trends': monthly_trends
     }
 
+def _previous_month() -> int:
+    today = datetime.now()
+    return today.year * 12 + today.month - 2
+
+def _metrics_from_aggregates(aggregates) -> Dict[str, Any]:
+    """Métricas leídas de los agregados incrementales (utils.aggregates), sin recorrer filas"""
+    if not aggregates.cells:
+        return _empty_metrics()
+    previous_month = _month_label(_previous_month())
+    monthly_income = float(aggregates.month_total(previous_month, 'income'))
+    monthly_expenses = float(aggregates.month_total(previous_month, 'expense'))
+    expenses_by_category = aggregates.expenses_by_category(previous_month)
+    spending_patterns = _spending_patterns(
+        pd.Series(aggregates.description_stds(), dtype='float64'),
+        pd.Series(aggregates.weekday_expenses(), dtype='float64'),
+        pd.Series(aggregates.expenses_by_category(), dtype='float64')
+    )
+    monthly_trends = {month: float(aggregates.month_net(month)) for month in aggregates.months()[-6:]}
+    return _assemble_metrics(monthly_income, monthly_expenses, expenses_by_category, spending_patterns,
+                             monthly_trends)
+
+@instrumented()
+def calculate_financial_metrics(transactions: Union[List[Dict], pd.DataFrame] = None,
+                                aggregates=None) -> Dict[str, Any]:
+    """Métricas del tablero desde las transacciones o, si se pasan, desde los agregados incrementales"""
+    if aggregates is not None:
+        return _metrics_from_aggregates(aggregates)
+    if transactions is None or len(transactions) == 0:
+        return _empty_metrics()
+    
+    engine = build_metrics_cube(transactions)
+    month_kind = engine['month_kind']
+    cube = engine['cube']
+    
+    # Métricas del mes anterior completo
+    previous_month = _previous_month()
+    if previous_month in month_kind.index:
+        monthly_income = float(_kind_total(month_kind, INCOME)[previous_month])
+        monthly_expenses = float(_kind_total(month_kind, EXPENSE)[previous_month])
+    else:
+        monthly_income = monthly_expenses = 0.0
+    
+    month_expenses = cube[
+        (cube.index.get_level_values('month') == previous_month) &
+        (cube.index.get_level_values('kind') == EXPENSE)
+    ]
+    by_category = month_expenses.groupby(level='category').sum()
+    categories = engine['categories']
+    expenses_by_category = {categories[code]: amount for code, amount in by_category.items() if code >= 0}
+    
+    return _assemble_metrics(monthly_income, monthly_expenses, expenses_by_category,
+                             _spending_patterns_from(engine), _monthly_trends_from(month_kind))
+
 def identify_spending_patterns(df: pd.DataFrame, date_column: str = 'date') -> List[str]:
-    patterns = []
     try:
-        recurring_expenses = df[df['transaction_type'] == 'expense']\
-            .groupby('description')['amount'].std()
-        if len(recurring_expenses) > 0 and recurring_expenses.mean() < 50:
-            patterns.append("Gastos recurrentes estables")
-        
-        df['day_of_week'] = df[date_column].dt.day_name()
-        weekday_spending = df[df['transaction_type'] == 'expense']\
-            .groupby('day_of_week')['amount'].sum()
-        if len(weekday_spending) > 0:
-            max_day = weekday_spending.idxmax()
-            patterns.append(f"Mayor gasto los {max_day}")
-        
-        category_spending = df[df['transaction_type'] == 'expense']\
-            .groupby('category')['amount'].sum()
-        if len(category_spending) > 0:
-            top_category = category_spending.idxmax()
-            patterns.append(f"Gasto principal en {top_category}")
+        return _spending_patterns_from(build_metrics_cube(df))
     except Exception:
-        patterns.append("Análisis de patrones en desarrollo")
-    return patterns
+        return ["Análisis de patrones en desarrollo"]
 
 def generate_financial_alerts(income: float, expenses: float, expenses_by_category: Dict) -> List[Dict]:
-    alerts = []
-    savings_rate = ((income - expenses) / income * 100) if income > 0 else 0
-    if savings_rate < 10:
-        alerts.append({
-            'type': 'savings_rate', 'severity': 'high',
-            'message': f'Tasa de ahorro baja ({savings_rate:.1f}%). Objetivo: 20%'
-        })
-    
-    total_expenses = sum(expenses_by_category.values())
-    if total_expenses > 0:
-        for category, amount in expenses_by_category.items():
-            percentage = (amount / total_expenses) * 100
-            if percentage > 40:
-                alerts.append({
-                    'type': 'category_spending', 'severity': 'medium',
-                    'message': f'Alto gasto en {category} ({percentage:.1f}% del total)'
-                })
-    
-    if expenses > income:
-        alerts.append({
-            'type': 'deficit', 'severity': 'high',
-            'message': 'Gastos superan ingresos este mes'
-        })
-    return alerts
+    """Alertas del mes según las reglas declarativas (umbrales en Config)"""
+    return evaluate_user_alerts(income, expenses, expenses_by_category)
 
 def calculate_monthly_trends(df: pd.DataFrame, date_column: str = 'date') -> Dict[str, float]:
-    trends = {}
-    try:
-        df['year_month'] = df[date_column].dt.to_period('M')
-        monthly_totals = df.groupby('year_month').apply(
-            lambda x: x[x['transaction_type'] == 'income']['amount'].sum() - 
-                     x[x['transaction_type'] == 'expense']['amount'].sum()
-        ).tail(6)
-        for period, savings in monthly_totals.items():
-            trends[str(period)] = float(savings)
-    except Exception:
-        # Generar datos de ejemplo si hay error
-        base_date = datetime.now()
-        for i in range(6):
-            month_date = base_date - timedelta(days=30*i)
-            period = month_date.strftime('%Y-%m')
-            trends[period] = float(np.random.normal(500, 200))
-    return trends
+    if df is None or len(df) == 0:
+        return {}
+    return _monthly_trends_from(build_metrics_cube(df)['month_kind'])
 
+@instrumented()
 def generate_ai_recommendations(metrics: Dict, goals: List[Dict]) -> List[Dict]:
     recommendations = []
     savings_rate = metrics.get('savings_rate', 0)
@@ -0,0 +1,362 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from config import Config
+from utils.aggregates import _normalize
+from utils.instrumentation import instrumented, annotate
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS estado_anomalias (
+    usuario_id TEXT,
+    categoria TEXT,
+    comercio TEXT,
+    n INTEGER,
+    media REAL,
+    varianza REAL,
+    PRIMARY KEY (usuario_id, categoria, comercio)
+);
+CREATE TABLE IF NOT EXISTS alertas_anomalias (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    usuario_id TEXT,
+    transaccion_id TEXT,
+    creada_en TEXT,
+    severidad TEXT,
+    puntaje REAL,
+    mensaje TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alertas_anomalias_usuario ON alertas_anomalias (usuario_id, id DESC);
+CREATE TABLE IF NOT EXISTS historial_aprendido (
+    usuario_id TEXT PRIMARY KEY,
+    aprendido_en TEXT
+);
+"""
+
+# Desviación mínima en escala logarítmica (~10%): montos siempre iguales (suscripciones) no dan varianza 0
+MIN_STD = 0.1
+# Clave de las estadísticas de toda la categoría (respaldo cuando el comercio es nuevo)
+ANY_MERCHANT = '*'
+# Usuarios por lectura al aprender historiales en bloque (acota la URL de 'usuario_id=in.(...)')
+BOOTSTRAP_USERS_PER_READ = 100
+
+def merchant_key(description: Optional[str]) -> str:
+    """'UBER *TRIP 8841' y 'Uber trip 1203' son el mismo comercio: minúsculas, sin dígitos ni símbolos"""
+    if not description:
+        return ''
+    return ' '.join(re.sub(r'[\d\W_]+', ' ', str(description).lower()).split())
+
+class AnomalyDetector:
+    """Detector en línea de gastos inusuales por usuario × categoría × comercio.
+
+    Cada clave guarda [n, media, varianza] EWMA de log(1 + monto): puntuar y actualizar una
+    transacción es O(1) y no requiere releer el historial. Se puntúa contra las estadísticas del
+    comercio y, si aún tiene pocas observaciones, contra las de la categoría. Antes de actualizar,
+    el monto se acota a media ± umbral·desviación para que una anomalía no ensanche la varianza.
+    El estado y las alertas se guardan en SQLite (una fila por clave tocada). Que el historial
+    de un usuario ya se aprendió se marca aparte: observar una inserción crea estado, pero no
+    equivale a haber aprendido el historial.
+    """
+
+    def __init__(self, db_path: str, alpha: float, threshold: float, min_observations: int):
+        self.db_path = db_path
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_observations = min_observations
+        self._users = {}
+        self._lock = threading.Lock()
+        self._bootstrap_lock = threading.Lock()
+        self._bootstrapped = set()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.db_path != ':memory:' and os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._schema_ready or self.db_path == ':memory:':
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _state(self, conn: sqlite3.Connection, user_id: str) -> Dict[tuple, list]:
+        """Estado del usuario en memoria (se lee de SQLite la primera vez)"""
+        state = self._users.get(user_id)
+        if state is None:
+            rows = conn.execute('SELECT categoria, comercio, n, media, varianza FROM estado_anomalias '
+                                'WHERE usuario_id = ?', (user_id,)).fetchall()
+            state = self._users[user_id] = {(c, m): [n, mean, var] for c, m, n, mean, var in rows}
+        return state
+
+    def _score(self, stats: list, value: float) -> Optional[float]:
+        if stats is None or stats[0] < self.min_observations:
+            return None
+        return (value - stats[1]) / max(math.sqrt(stats[2]), MIN_STD)
+
+    def _update(self, state: dict, key: tuple, value: float) -> None:
+        stats = state.get(key)
+        if stats is None:
+            state[key] = [1, value, 0.0]
+            return
+        n, mean, variance = stats
+        if n >= self.min_observations:
+            limit = self.threshold * max(math.sqrt(variance), MIN_STD)
+            value = min(max(value, mean - limit), mean + limit)
+        # Con pocas observaciones el peso es 1/n (media exacta); después, el de la EWMA
+        weight = max(self.alpha, 1.0 / (n + 1))
+        delta = value - mean
+        mean += weight * delta
+        variance = (1 - weight) * (variance + weight * delta * delta)
+        stats[:] = [n + 1, mean, variance]
+
+    def observe(self, user_id: str, transactions: List[dict], learn_only: bool = False) -> List[Dict]:
+        """Puntuar y aprender una o varias transacciones nuevas; devuelve las alertas generadas"""
+        return self.observe_many({user_id: transactions}, learn_only)
+
+    def observe_many(self, transactions_by_user: Dict[str, List[dict]], learn_only: bool = False) -> List[Dict]:
+        """Como observe() para varios usuarios: una sola conexión y una sola transacción de SQLite"""
+        from utils.database import to_db_user_id
+
+        alerts, touched = [], {}
+        with self._lock:
+            conn = self._connect()
+            try:
+                for user_id, transactions in transactions_by_user.items():
+                    user_id = to_db_user_id(user_id)
+                    state = self._state(conn, user_id)
+                    user_touched = touched.setdefault(user_id, set())
+                    for transaction in transactions:
+                        amount, transaction_type, category, _, description = _normalize(transaction)
+                        if transaction_type != 'expense' or amount <= 0:
+                            continue
+                        value = math.log1p(amount)
+                        merchant = merchant_key(description)
+                        keys = [(category, ANY_MERCHANT)] + ([(category, merchant)] if merchant else [])
+                        if not learn_only:
+                            # El comercio manda cuando ya tiene historial; si no, la categoría
+                            scored = [(self._score(state.get(key), value), key) for key in reversed(keys)]
+                            score, key = next(((s, k) for s, k in scored if s is not None), (None, None))
+                            if score is not None and score >= self.threshold:
+                                alerts.append(self._alert(user_id, transaction, amount, category, merchant,
+                                                          description, key, state[key], score))
+                        for key in keys:
+                            self._update(state, key, value)
+                            user_touched.add(key)
+                self._save(conn, touched, alerts)
+            finally:
+                conn.close()
+        annotate(rows=sum(len(transactions) for transactions in transactions_by_user.values()))
+        return alerts
+
+    def _alert(self, user_id, transaction, amount, category, merchant, description, key, stats, score) -> Dict:
+        typical = math.expm1(stats[1])
+        where = f'{description or merchant} ({category})' if key[1] != ANY_MERCHANT else category
+        return {
+            'type': 'anomaly',
+            'severity': 'high' if score >= 1.5 * self.threshold else 'medium',
+            'message': f'Gasto inusual en {where}: ${amount:,.2f}, '
+                       f'{amount / typical if typical > 0 else float("inf"):.1f}× lo habitual (${typical:,.2f})',
+            'score': score,
+            'transaction_id': transaction.get('id'),
+            'user_id': user_id
+        }
+
+    def _save(self, conn, touched: Dict[str, set], alerts: List[Dict]) -> None:
+        """Guardar las claves tocadas de cada usuario y las alertas en una transacción"""
+        now = datetime.now().isoformat()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO estado_anomalias (usuario_id, categoria, comercio, n, media, varianza) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(user_id, category, merchant, *self._users[user_id][(category, merchant)])
+                 for user_id, keys in touched.items() for category, merchant in keys]
+            )
+            conn.executemany(
+                'INSERT INTO alertas_anomalias (usuario_id, transaccion_id, creada_en, severidad, puntaje, mensaje) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(alert['user_id'], alert['transaction_id'], now, alert['severity'], alert['score'], alert['message'])
+                 for alert in alerts]
+            )
+
+    def is_bootstrapped(self, user_id: str) -> bool:
+        from utils.database import to_db_user_id
+
+        user_id = to_db_user_id(user_id)
+        if user_id in self._bootstrapped:
+            return True
+        with self._lock:
+            conn = self._connect()
+            try:
+                found = conn.execute('SELECT 1 FROM historial_aprendido WHERE usuario_id = ?', (user_id,)).fetchone()
+            finally:
+                conn.close()
+        if found:
+            self._bootstrapped.add(user_id)
+        return bool(found)
+
+    def not_bootstrapped(self, user_ids) -> set:
+        """Usuarios (UUID de la BD) cuyo historial aún no se aprendió, con una sola consulta"""
+        from utils.database import to_db_user_id
+
+        pending = {to_db_user_id(user_id) for user_id in user_ids} - self._bootstrapped
+        if not pending:
+            return set()
+        with self._lock:
+            conn = self._connect()
+            try:
+                found = {row[0] for row in conn.execute(
+                    f'SELECT usuario_id FROM historial_aprendido WHERE usuario_id IN ({",".join("?" * len(pending))})',
+                    list(pending))}
+            finally:
+                conn.close()
+        self._bootstrapped.update(found)
+        return pending - found
+
+    def bootstrap(self, user_id: str, frame: pd.DataFrame) -> int:
+        """Aprender (sin alertar) el historial completo de un usuario, en orden de fecha, y marcarlo aprendido.
+
+        El estado que hubiera (de inserciones observadas antes) se descarta: esas transacciones
+        ya vienen en el historial y contarlas dos veces sesgaría la media.
+        """
+        return self.bootstrap_many({user_id: frame})
+
+    def bootstrap_many(self, frames: Dict[str, pd.DataFrame]) -> int:
+        """Como bootstrap() para varios usuarios, con una transacción de SQLite por paso"""
+        from utils.database import to_db_user_id
+
+        frames = {to_db_user_id(user_id): frame for user_id, frame in frames.items()}
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany('DELETE FROM estado_anomalias WHERE usuario_id = ?',
+                                     [(user_id,) for user_id in frames])
+            finally:
+                conn.close()
+            for user_id in frames:
+                self._users.pop(user_id, None)
+
+        histories = {}
+        for user_id, frame in frames.items():
+            if frame is not None and len(frame) > 0:
+                expenses = frame[frame['transaction_type'] == 'expense'].sort_values('date', kind='stable')
+                histories[user_id] = expenses[['amount', 'transaction_type', 'category', 'date',
+                                               'description']].to_dict('records')
+        if histories:
+            self.observe_many(histories, learn_only=True)
+
+        now = datetime.now().isoformat()
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO historial_aprendido (usuario_id, aprendido_en) VALUES (?, ?)',
+                                     [(user_id, now) for user_id in frames])
+            finally:
+                conn.close()
+        self._bootstrapped.update(frames)
+        return sum(len(records) for records in histories.values())
+
+    def recent_alerts(self, user_id: str, limit: int = 5) -> List[Dict]:
+        from utils.database import to_db_user_id
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute('SELECT severidad, mensaje, creada_en FROM alertas_anomalias '
+                                    'WHERE usuario_id = ? ORDER BY id DESC LIMIT ?',
+                                    (to_db_user_id(user_id), limit)).fetchall()
+            finally:
+                conn.close()
+        return [{'type': 'anomaly', 'severity': severity, 'message': message, 'created_at': created_at}
+                for severity, message, created_at in rows]
+
+    def reset(self, user_id: str = None) -> None:
+        """Olvidar el estado (y las alertas) de un usuario o de todos"""
+        from utils.database import to_db_user_id
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    if user_id is None:
+                        conn.execute('DELETE FROM estado_anomalias')
+                        conn.execute('DELETE FROM alertas_anomalias')
+                        conn.execute('DELETE FROM historial_aprendido')
+                        self._users.clear()
+                        self._bootstrapped.clear()
+                    else:
+                        db_user_id = to_db_user_id(user_id)
+                        conn.execute('DELETE FROM estado_anomalias WHERE usuario_id = ?', (db_user_id,))
+                        conn.execute('DELETE FROM alertas_anomalias WHERE usuario_id = ?', (db_user_id,))
+                        conn.execute('DELETE FROM historial_aprendido WHERE usuario_id = ?', (db_user_id,))
+                        self._users.pop(db_user_id, None)
+                        self._bootstrapped.discard(db_user_id)
+            finally:
+                conn.close()
+
+# Instancia única del proceso: las sesiones comparten el estado en memoria y el archivo
+anomaly_detector = AnomalyDetector(Config.ANOMALY_STATE_PATH, Config.ANOMALY_EWMA_ALPHA,
+                                   Config.ANOMALY_Z_THRESHOLD, Config.ANOMALY_MIN_OBSERVATIONS)
+
+def ensure_bootstrapped(supabase_client, user_id: str, exclude_ids=()) -> bool:
+    """Aprender el historial del usuario si aún no se hizo (una sola lectura, una vez por usuario).
+
+    exclude_ids deja fuera las transacciones que se van a puntuar a continuación (ya insertadas,
+    pero no forman parte del historial contra el que se comparan). Si la lectura falla se lanza
+    ConnectionError y no se marca nada: se vuelve a intentar en la próxima llamada.
+    """
+    if supabase_client is None:
+        # Sin base de datos (modo ejemplo) no hay historial real que aprender
+        return False
+    if anomaly_detector.is_bootstrapped(user_id):
+        return True
+    from utils.database import to_db_user_id
+
+    return to_db_user_id(user_id) in ensure_bootstrapped_many(supabase_client, [user_id], exclude_ids)
+
+def ensure_bootstrapped_many(supabase_client, user_ids, exclude_ids=()) -> set:
+    """Aprender el historial de varios usuarios a la vez: una lectura keyset por bloque de usuarios.
+
+    Devuelve los usuarios (UUID de la BD) que ya tienen su historial aprendido. Si una lectura
+    falla se lanza ConnectionError; los bloques anteriores quedan aprendidos.
+    """
+    if supabase_client is None:
+        return set()
+    from utils.database import build_transaction_filters, iter_raw_transaction_pages, to_db_user_id, transactions_frame
+
+    db_user_ids = list(dict.fromkeys(to_db_user_id(user_id) for user_id in user_ids if user_id is not None))
+    excluded = {str(i) for i in exclude_ids if i is not None}
+    with anomaly_detector._bootstrap_lock:
+        missing = anomaly_detector.not_bootstrapped(db_user_ids)
+        pending = [user_id for user_id in db_user_ids if user_id in missing]
+        done = set(db_user_ids) - missing
+        for start in range(0, len(pending), BOOTSTRAP_USERS_PER_READ):
+            block = pending[start:start + BOOTSTRAP_USERS_PER_READ]
+            filters = build_transaction_filters(columns=['user_id', 'amount', 'transaction_type', 'category',
+                                                         'description'])
+            filters['usuario_id'] = f'in.({",".join(block)})'
+            # El tope de filas es por usuario, como cuando se leía cada historial por separado
+            pages = [pd.DataFrame.from_records(page) for page in iter_raw_transaction_pages(
+                supabase_client, filters, max_rows=Config.TRANSACTIONS_MAX_ROWS * len(block))]
+            frame = transactions_frame(pd.concat(pages, ignore_index=True) if pages else [])
+            if excluded and len(frame):
+                frame = frame[~frame['id'].astype(str).isin(excluded)]
+            histories = dict(tuple(frame.groupby('user_id', sort=False))) if len(frame) else {}
+            anomaly_detector.bootstrap_many({user_id: histories.get(user_id) for user_id in block})
+            done.update(block)
+    return done
+
+@instrumented()
+def get_anomaly_alerts(supabase_client, user_id: str, limit: int = 5) -> List[Dict]:
+    """Alertas recientes del usuario; la primera vez se aprende su historial (una sola lectura)"""
+    try:
+        ensure_bootstrapped(supabase_client, user_id)
+    except ConnectionError:
+        pass  # Sin conexión: se muestran las alertas guardadas y se aprende en la próxima visita
+    return anomaly_detector.recent_alerts(user_id, limit)
\ No newline at end of file
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from typing import BinaryIO, Optional, Union
+
+from config import Config
+from utils.instrumentation import annotate
+
+# Cambiar al modificar el formato de algún reporte: invalida todos los artefactos anteriores
+ARTIFACT_VERSION = 1
+
+def artifact_key(fingerprint: str, report_type: str) -> str:
+    """Clave de contenido: mismo conjunto de transacciones + mismo tipo de reporte = mismo archivo"""
+    return hashlib.sha256(f'{ARTIFACT_VERSION}|{report_type}|{fingerprint}'.encode('utf-8')).hexdigest()
+
+class ArtifactCache:
+    """Reportes generados guardados en disco por clave de contenido, con expulsión LRU por tamaño.
+
+    El orden LRU es la fecha de modificación: cada acierto la actualiza. Las escrituras son
+    atómicas (archivo temporal + os.replace), así que varios procesos pueden compartir el directorio.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """Abrir el artefacto si existe (y marcarlo como usado recientemente)"""
+        path = self._path(key)
+        try:
+            os.utime(path)
+            artifact = open(path, 'rb')
+        except FileNotFoundError:
+            annotate(cache_misses=1)
+            return None
+        annotate(cache_hits=1)
+        return artifact
+
+    def put(self, key: str, data: Union[bytes, BinaryIO]) -> BinaryIO:
+        """Guardar un artefacto y devolverlo abierto para lectura"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            if isinstance(data, (bytes, bytearray)):
+                f.write(data)
+            else:
+                data.seek(0)
+                shutil.copyfileobj(data, f)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return open(path, 'rb')
+
+    def evict(self, keep: str = None) -> int:
+        """Borrar los artefactos menos usados hasta volver al presupuesto; devuelve cuántos se borraron"""
+        with self._lock:
+            entries = []
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+artifact_cache = ArtifactCache(Config.ARTIFACT_CACHE_DIR, Config.ARTIFACT_CACHE_MAX_BYTES)
\ No newline at end of file
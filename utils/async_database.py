@@ -0,0 +1,318 @@
+import asyncio
+import contextvars
+import threading
+
+import httpx
+import pandas as pd
+import streamlit as st
+
+from config import Config
+from utils.cache import data_cache, invalidate_user
+from utils.aggregates import aggregate_store
+from utils.instrumentation import instrumented, span, annotate
+from utils.database import (
+    RETRY_STATUS_CODES, NON_IDEMPOTENT_RETRY_STATUS_CODES, _retry_delay, _map_transaction,
+    build_transaction_filters, keyset_page_params, to_db_transaction, transactions_cache_key,
+    transactions_frame, get_sample_transactions, get_sample_goals, observe_new_transactions,
+    is_idempotent, upsert_params
+)
+from utils.idempotency import idempotency_index, batch_idempotency_keys
+
+# Un único event loop en segundo plano mantiene vivo el pool de conexiones entre reruns
+_loop = None
+_loop_lock = threading.Lock()
+_async_client = None
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Obtener (o arrancar) el event loop compartido del proceso"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='supabase-async', daemon=True).start()
+    return _loop
+
+async def _in_context(coro, context: contextvars.Context):
+    # La tarea hereda las variables de contexto de quien la lanza (p. ej. la traza del rerun)
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+def run_sync(coro, timeout: float = None):
+    """Ejecutar una corrutina en el loop compartido y esperar su resultado (fachada síncrona)"""
+    return asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), _get_loop()).result(timeout)
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Cliente HTTP asíncrono con pool compartido; se crea dentro del loop compartido"""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=Config.HTTP_POOL_SIZE,
+                                max_keepalive_connections=Config.HTTP_POOL_SIZE),
+            timeout=httpx.Timeout(Config.HTTP_READ_TIMEOUT, connect=Config.HTTP_CONNECT_TIMEOUT)
+        )
+    return _async_client
+
+async def supabase_request_async(supabase_client, method, table, data=None, filters=None, prefer=None):
+    """Versión asíncrona de supabase_request; lanza excepción si la petición falla"""
+    with span('supabase_request_async') as record:
+        result = await _supabase_request_async(supabase_client, method, table, data, filters, prefer)
+        record['rows'] = len(result) if isinstance(result, list) else None
+        return result
+
+async def _supabase_request_async(supabase_client, method, table, data=None, filters=None, prefer=None):
+    method = method.upper()
+    url = f"{supabase_client['url']}/rest/v1/{table}"
+    headers = {
+        'apikey': supabase_client['key'],
+        'Authorization': f"Bearer {supabase_client['key']}",
+        'Content-Type': 'application/json',
+        'Prefer': prefer or 'return=representation'
+    }
+    max_retries = supabase_client.get('max_retries', Config.HTTP_MAX_RETRIES)
+    idempotent = is_idempotent(method, filters)
+    retry_status = RETRY_STATUS_CODES if idempotent else NON_IDEMPOTENT_RETRY_STATUS_CODES
+    client = _get_async_client()
+
+    for attempt in range(max_retries + 1):
+        try:
+            response = await client.request(
+                method, url, headers=headers,
+                params=filters,
+                json=data if method != 'GET' else None
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadTimeout) as e:
+            # Igual que en la versión síncrona: un POST solo se reintenta si no llegó a conectar
+            if attempt < max_retries and (idempotent or not isinstance(e, httpx.ReadTimeout)):
+                await asyncio.sleep(_retry_delay(attempt))
+                continue
+            raise
+
+        annotate(bytes=len(response.content), status=response.status_code, table=table)
+        if response.status_code in [200, 201, 204]:
+            return response.json() if response.content else []
+        if response.status_code in retry_status and attempt < max_retries:
+            annotate(retries=1)
+            await asyncio.sleep(_retry_delay(attempt, response))
+            continue
+        response.raise_for_status()
+        raise httpx.HTTPStatusError(f"Respuesta inesperada {response.status_code}",
+                                    request=response.request, response=response)
+
+async def _iter_raw_pages_async(supabase_client, user_id, days, transaction_type, category, columns,
+                                notices: list = None):
+    """Recorrer las páginas keyset (fecha, id) de un usuario sin mapear las filas"""
+    filters = build_transaction_filters(user_id, days, transaction_type, category, columns)
+    fetched = 0
+    cursor = None
+    while fetched < Config.TRANSACTIONS_MAX_ROWS:
+        limit = min(Config.TRANSACTIONS_PAGE_SIZE, Config.TRANSACTIONS_MAX_ROWS - fetched)
+        params = keyset_page_params(filters, limit, cursor)
+        page = await supabase_request_async(supabase_client, 'GET', 'transacciones', filters=params)
+        if not page:
+            return
+        fetched += len(page)
+        yield page
+        if len(page) < limit:
+            return
+        cursor = (page[-1].get('fecha'), page[-1].get('id'))
+
+    _notify(notices, 'warning',
+            f"⚠️ Se alcanzó el máximo de {Config.TRANSACTIONS_MAX_ROWS} transacciones; el historial puede estar incompleto")
+
+def _notify(notices: list, level: str, message: str) -> None:
+    # El loop en segundo plano no tiene contexto de Streamlit: los avisos los muestra quien llama
+    if notices is not None:
+        notices.append((level, message))
+
+async def get_user_transactions_async(supabase_client, user_id: str, days: int = 90, transaction_type: str = None,
+                                      category=None, columns: list = None, notices: list = None) -> list:
+    """Obtener las transacciones filtradas de un usuario recorriendo todas las páginas"""
+    cache_key = transactions_cache_key(user_id, days, transaction_type, category, columns)
+    cached = data_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+
+    if Config.MIRROR_ENABLED:
+        # La réplica SQLite es síncrona: se consulta en un hilo para no bloquear el loop
+        from utils import mirror
+        transactions, synced = await asyncio.to_thread(
+            mirror.read_through, supabase_client, user_id, days, transaction_type, category
+        )
+        if not synced:
+            _notify(notices, 'warning', "⚠️ Sin conexión con Supabase. Mostrando la copia local de tus transacciones.")
+        if transactions and synced:
+            data_cache.set(cache_key, transactions)
+        return list(transactions)
+
+    transactions = []
+    async for page in _iter_raw_pages_async(supabase_client, user_id, days, transaction_type, category, columns,
+                                            notices):
+        transactions.extend(_map_transaction(row) for row in page)
+
+    if transactions:
+        data_cache.set(cache_key, transactions)
+    return list(transactions)
+
+async def get_transactions_frame_async(supabase_client, user_id: str, days: int = 90, transaction_type: str = None,
+                                       category=None, columns: list = None, notices: list = None) -> pd.DataFrame:
+    """Versión asíncrona de load_transactions_frame: páginas JSON -> DataFrame tipado"""
+    cache_key = ('transacciones_df', *transactions_cache_key(user_id, days, transaction_type, category, columns)[1:])
+    cached = data_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    synced = True
+    if Config.MIRROR_ENABLED:
+        from utils import mirror
+        transactions, synced = await asyncio.to_thread(
+            mirror.read_through, supabase_client, user_id, days, transaction_type, category
+        )
+        if not synced:
+            _notify(notices, 'warning', "⚠️ Sin conexión con Supabase. Mostrando la copia local de tus transacciones.")
+        frame = transactions_frame(transactions)
+    else:
+        pages = [pd.DataFrame.from_records(page) async for page in
+                 _iter_raw_pages_async(supabase_client, user_id, days, transaction_type, category, columns,
+                                       notices)]
+        frame = transactions_frame(pd.concat(pages, ignore_index=True) if pages else [])
+
+    if not frame.empty and synced:
+        data_cache.set(cache_key, frame)
+    return frame
+
+async def get_financial_goals_async(supabase_client, user_id: str, notices: list = None) -> list:
+    """Versión asíncrona de get_financial_goals: réplica local si está activa; si no, metas de ejemplo"""
+    cache_key = ('metas', user_id)
+    cached = data_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+
+    if Config.MIRROR_ENABLED:
+        from utils import mirror
+        try:
+            await asyncio.to_thread(mirror.sync_goals, supabase_client, user_id)
+        except ConnectionError:
+            _notify(notices, 'warning', "⚠️ Sin conexión con Supabase. Mostrando la copia local de tus metas.")
+        goals = await asyncio.to_thread(mirror.query_goals, user_id)
+        if goals:
+            data_cache.set(cache_key, goals)
+            return list(goals)
+
+    # Las metas de ejemplo no se cachean, como en get_financial_goals
+    _notify(notices, 'info', "ℹ️ Usando metas de ejemplo para demostración")
+    return get_sample_goals()
+
+async def add_transaction_async(supabase_client, transaction_data: dict, notices: list = None) -> list:
+    """Agregar una transacción de forma asíncrona (idempotente, como add_transaction)"""
+    row = to_db_transaction(transaction_data)
+    key = row[Config.IDEMPOTENCY_COLUMN]
+    # El índice de idempotencia es SQLite (bloqueante): sus llamadas van en un hilo
+    if await asyncio.to_thread(idempotency_index.claim, key) is not None:
+        return []
+    filters, prefer = upsert_params()
+    try:
+        result = await supabase_request_async(supabase_client, 'POST', 'transacciones', data=row,
+                                              filters=filters, prefer=prefer)
+    except Exception:
+        await asyncio.to_thread(idempotency_index.release, [key])
+        raise
+    await asyncio.to_thread(idempotency_index.complete, [key], [result[0].get('id') if result else None])
+    if not result:
+        return []
+    invalidate_user(transaction_data.get('user_id'))
+    aggregate_store.add(transaction_data.get('user_id'), [transaction_data])
+    # Puede aprender el historial del usuario (lecturas y SQLite): en un hilo, fuera del loop
+    await asyncio.to_thread(observe_new_transactions, supabase_client, transaction_data.get('user_id'),
+                            [{**transaction_data, 'id': result[0].get('id')}], notices)
+    return [_map_transaction(row) for row in result]
+
+async def add_transactions_async(supabase_client, transactions: list, chunk_size: int = None,
+                                 max_concurrency: int = None, notices: list = None) -> dict:
+    """Insertar transacciones en bloque con un semáforo que limita los POSTs simultáneos"""
+    chunk_size = chunk_size or Config.BULK_INSERT_CHUNK_SIZE
+    semaphore = asyncio.Semaphore(max_concurrency or Config.BULK_INSERT_MAX_WORKERS)
+    rows = [to_db_transaction(t) for t in transactions]
+    keys = batch_idempotency_keys(rows, [t.get('source_id') for t in transactions])
+    for row, key, t in zip(rows, keys, transactions):
+        row[Config.IDEMPOTENCY_COLUMN] = t.get('idempotency_key') or key
+    claims = await asyncio.to_thread(idempotency_index.claim_many, [row[Config.IDEMPOTENCY_COLUMN] for row in rows])
+    pending = [(t, row) for t, row, claim in zip(transactions, rows, claims) if claim is None]
+    chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+    filters, prefer = upsert_params()
+    filters = {**filters, 'select': f'id,{Config.IDEMPOTENCY_COLUMN}'}
+
+    async def insert_chunk(index, chunk):
+        chunk_keys = [row[Config.IDEMPOTENCY_COLUMN] for _, row in chunk]
+        async with semaphore:
+            try:
+                result = await supabase_request_async(supabase_client, 'POST', 'transacciones',
+                                                      data=[row for _, row in chunk], filters=filters, prefer=prefer)
+            except Exception as e:
+                await asyncio.to_thread(idempotency_index.release, chunk_keys)
+                return {'chunk': index, 'rows': len(chunk), 'ok': False, 'error': str(e)}
+        await asyncio.to_thread(idempotency_index.complete, chunk_keys)
+        written = {row.get(Config.IDEMPOTENCY_COLUMN): row.get('id') for row in result}
+        return {'chunk': index, 'rows': len(chunk), 'ok': True,
+                'inserted': [{**t, 'id': written[row[Config.IDEMPOTENCY_COLUMN]]} for t, row in chunk
+                             if row[Config.IDEMPOTENCY_COLUMN] in written]}
+
+    reports = await asyncio.gather(*(insert_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+    inserted = [t for r in reports if r['ok'] for t in r.pop('inserted')]
+    for user_id in {t.get('user_id') for t in transactions}:
+        invalidate_user(user_id)
+        aggregate_store.add(user_id, [t for t in inserted if t.get('user_id') == user_id])
+        await asyncio.to_thread(observe_new_transactions, supabase_client, user_id,
+                                [t for t in inserted if t.get('user_id') == user_id], notices)
+    failed = sum(r['rows'] for r in reports if not r['ok'])
+    return {
+        'inserted': len(inserted),
+        'failed': failed,
+        'duplicated': len(transactions) - len(inserted) - failed,
+        'chunks': list(reports)
+    }
+
+async def load_page_data_async(supabase_client, user_id: str, days: int = 90, as_frame: bool = False,
+                               notices: list = None):
+    """Lanzar en paralelo las consultas independientes de una página"""
+    load_transactions = get_transactions_frame_async if as_frame else get_user_transactions_async
+    return await asyncio.gather(
+        load_transactions(supabase_client, user_id, days, notices=notices),
+        get_financial_goals_async(supabase_client, user_id, notices=notices),
+        return_exceptions=True
+    )
+
+@instrumented()
+def load_page_data(supabase_client, user_id: str, days: int = 90, as_frame: bool = False):
+    """Obtener transacciones y metas de forma concurrente desde el script de Streamlit.
+
+    Con ``as_frame=True`` las transacciones llegan como DataFrame tipado (ver transactions_frame).
+    """
+    def sample_transactions():
+        return transactions_frame(get_sample_transactions()) if as_frame else get_sample_transactions()
+
+    if supabase_client is None:
+        return sample_transactions(), get_sample_goals()
+
+    notices = []
+    try:
+        transactions, goals = run_sync(load_page_data_async(supabase_client, user_id, days, as_frame, notices))
+    except Exception as e:
+        transactions = goals = e
+
+    # Los mensajes se muestran aquí: el loop en segundo plano no tiene contexto de Streamlit
+    for level, message in notices:
+        getattr(st, level)(message)
+    if isinstance(transactions, Exception):
+        st.warning(f"⚠️ Error: {transactions}. Usando datos de ejemplo.")
+        transactions = sample_transactions()
+    elif len(transactions) > 0:
+        st.success(f"✅ Obtenidas {len(transactions)} transacciones de la base de datos")
+    else:
+        st.info("📊 Usando datos de ejemplo (no se encontraron transacciones en BD)")
+        transactions = sample_transactions()
+
+    if isinstance(goals, Exception):
+        st.warning(f"⚠️ Error: {goals}. Usando datos de ejemplo.")
+        goals = get_sample_goals()
+    return transactions, goals
\ No newline at end of file
@@ -0,0 +1,315 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from utils.analysis import _assemble_metrics, _month_label, WEEKDAY_NAMES
+from utils.alert_rules import user_frame, category_frame, evaluate_rules, alerts_by_user, rule_frames_from_metrics
+from utils.database import transactions_frame, supabase_request
+
+# Estado parcial de un lote: sumas aditivas que se pueden combinar en cualquier orden
+CELL_LEVELS = ['user_id', 'month', 'kind', 'category']
+WEEKDAY_LEVELS = ['user_id', 'weekday']
+DESCRIPTION_LEVELS = ['user_id', 'description']
+
+def partial_aggregates(chunk) -> Dict[str, pd.DataFrame]:
+    """Agregar un bloque de filas (de cualquier mezcla de usuarios) en sumas parciales.
+
+    Las filas sin fecha quedan en el mes -1: no cuentan para el mes anterior ni para
+    las tendencias, pero sí para el gasto por categoría, igual que en la versión por usuario.
+    """
+    df = transactions_frame(chunk)
+    if df.empty:
+        return empty_aggregates()
+    values = df['date'].to_numpy(dtype='datetime64[ns]')
+    missing = np.isnat(values)
+    month = np.where(missing, -1, values.astype('datetime64[M]').astype('int64') + 1970 * 12)
+    weekday = np.where(missing, -1, (values.astype('datetime64[D]').astype('int64') + 3) % 7)
+    transaction_type = df['transaction_type'].astype(object).to_numpy()
+    kind = np.where(np.isin(transaction_type, ['income', 'expense']), transaction_type, 'other')
+
+    columns = pd.DataFrame({
+        'user_id': df['user_id'].astype(object).to_numpy(),
+        'month': month,
+        'weekday': weekday,
+        'kind': kind,
+        'category': df['category'].astype(object).to_numpy(),
+        'description': df['description'].astype(object).to_numpy() if 'description' in df.columns else None,
+        'amount': df['amount'].to_numpy(dtype='float64')
+    })
+    expenses = columns[columns['kind'] == 'expense']
+    descriptions = expenses.assign(squares=expenses['amount'] ** 2).groupby(DESCRIPTION_LEVELS, sort=False)\
+        .agg(count=('amount', 'size'), total=('amount', 'sum'), squares=('squares', 'sum'))
+    return {
+        'cells': columns.groupby(CELL_LEVELS, sort=False)['amount'].sum().to_frame(),
+        'weekday': expenses[expenses['weekday'] >= 0].groupby(WEEKDAY_LEVELS, sort=False)['amount'].sum().to_frame(),
+        'descriptions': descriptions
+    }
+
+def empty_aggregates() -> Dict[str, pd.DataFrame]:
+    return {
+        'cells': pd.DataFrame({'amount': []}, index=pd.MultiIndex.from_tuples([], names=CELL_LEVELS)),
+        'weekday': pd.DataFrame({'amount': []}, index=pd.MultiIndex.from_tuples([], names=WEEKDAY_LEVELS)),
+        'descriptions': pd.DataFrame({'count': [], 'total': [], 'squares': []},
+                                     index=pd.MultiIndex.from_tuples([], names=DESCRIPTION_LEVELS))
+    }
+
+def combine_aggregates(parts: List[Dict[str, pd.DataFrame]]) -> Dict[str, pd.DataFrame]:
+    """Sumar estados parciales (de bloques o de procesos distintos)"""
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return empty_aggregates()
+    if len(parts) == 1:
+        return parts[0]
+    return {
+        name: pd.concat([part[name] for part in parts]).groupby(level=list(range(parts[0][name].index.nlevels)),
+                                                                 sort=False).sum()
+        for name in ('cells', 'weekday', 'descriptions')
+    }
+
+def _split_by_user(aggregates: Dict[str, pd.DataFrame], shards: int) -> List[Dict[str, pd.DataFrame]]:
+    """Repartir el estado combinado en `shards` grupos de usuarios disjuntos"""
+    users = pd.Index(aggregates['cells'].index.get_level_values('user_id').unique())
+    shard_of = pd.Series(np.arange(len(users)) % shards, index=users)
+    result = []
+    for shard in range(shards):
+        members = shard_of.index[shard_of.to_numpy() == shard]
+        result.append({
+            name: frame[frame.index.get_level_values('user_id').isin(members)]
+            for name, frame in aggregates.items()
+        })
+    return result
+
+def _idxmax_by_user(series: pd.Series, level: str) -> Dict[str, Any]:
+    """Etiqueta de `level` con el mayor valor para cada usuario (la primera en caso de empate)"""
+    if series.empty:
+        return {}
+    # Orden estable por (usuario, valor desc): la primera fila de cada usuario es su máximo
+    frame = pd.DataFrame({
+        'user_id': series.index.get_level_values('user_id'),
+        'key': series.index.get_level_values(level),
+        'value': series.to_numpy()
+    }).sort_values(['user_id', 'value'], ascending=[True, False], kind='stable')
+    top = frame.drop_duplicates('user_id')
+    return dict(zip(top['user_id'], top['key']))
+
+def _nested_by_user(series: pd.Series, label=None) -> Dict[str, Dict[Any, float]]:
+    """{usuario: {clave: valor}} de una serie con índice (usuario, clave), sin iterar grupos de pandas"""
+    nested = {}
+    for user, key, value in zip(series.index.get_level_values(0), series.index.get_level_values(1),
+                                series.to_numpy().tolist()):
+        nested.setdefault(user, {})[label(key) if label else key] = value
+    return nested
+
+def finalize_metrics(aggregates: Dict[str, pd.DataFrame], today: datetime = None) -> Dict[str, Dict[str, Any]]:
+    """Métricas por usuario (mismas claves que calculate_financial_metrics) desde el estado combinado"""
+    today = today or datetime.now()
+    previous_month = today.year * 12 + today.month - 2
+    cells = aggregates['cells']['amount']
+    if cells.empty:
+        return {}
+    # Orden determinista por mes/día/categoría para que los empates se resuelvan igual que en el cubo
+    cells = cells.sort_index()
+    months = cells.index.get_level_values('month')
+    kinds = cells.index.get_level_values('kind')
+
+    month_kind = cells[months >= 0].groupby(level=['user_id', 'month', 'kind']).sum().unstack('kind', fill_value=0.0)
+    income = month_kind['income'] if 'income' in month_kind.columns else pd.Series(0.0, index=month_kind.index)
+    expense = month_kind['expense'] if 'expense' in month_kind.columns else pd.Series(0.0, index=month_kind.index)
+    net = (income - expense).groupby(level='user_id', sort=False).tail(6)
+
+    previous = cells[(months == previous_month)]
+    previous_kinds = previous.index.get_level_values('kind')
+    previous_income = previous[previous_kinds == 'income'].groupby(level='user_id').sum()
+    previous_expenses = previous[previous_kinds == 'expense'].groupby(level='user_id').sum()
+    previous_by_category = previous[previous_kinds == 'expense'].groupby(level=['user_id', 'category']).sum()
+
+    category_spending = cells[kinds == 'expense'].groupby(level=['user_id', 'category']).sum()
+    weekday_spending = aggregates['weekday']['amount'].sort_index()
+    descriptions = aggregates['descriptions']
+    recurring = descriptions[descriptions['count'] >= 2]
+    variance = ((recurring['squares'] - recurring['total'] ** 2 / recurring['count']) /
+                (recurring['count'] - 1)).clip(lower=0)
+    stable = (np.sqrt(variance).groupby(level='user_id').mean() < 50)
+
+    top_day = _idxmax_by_user(weekday_spending, 'weekday')
+    top_category = _idxmax_by_user(category_spending, 'category')
+    by_category = _nested_by_user(previous_by_category)
+    trends = _nested_by_user(net, _month_label)
+
+    # Reglas de alerta evaluadas para todos los usuarios en una pasada (no una vez por usuario)
+    users = cells.index.get_level_values('user_id').unique()
+    alert_table = evaluate_rules(user_frame(previous_income.reindex(users), previous_expenses.reindex(users)),
+                                 category_frame(previous_by_category), today=today)
+    alerts = alerts_by_user(alert_table)
+
+    # Diccionarios en lugar de Series: la consulta por usuario dentro del bucle es O(1) y sin overhead de pandas
+    stable, previous_income, previous_expenses = stable.to_dict(), previous_income.to_dict(), previous_expenses.to_dict()
+    results = {}
+    for user in users:
+        patterns = []
+        if stable.get(user, False):
+            patterns.append("Gastos recurrentes estables")
+        if user in top_day:
+            patterns.append(f"Mayor gasto los {WEEKDAY_NAMES[int(top_day[user])]}")
+        if user in top_category:
+            patterns.append(f"Gasto principal en {top_category[user]}")
+        results[user] = _assemble_metrics(
+            float(previous_income.get(user, 0.0)), float(previous_expenses.get(user, 0.0)),
+            by_category.get(user, {}), patterns, trends.get(user, {}), alerts.get(user, [])
+        )
+    return results
+
+def _finalize_shard(args) -> Dict[str, Dict[str, Any]]:
+    aggregates, today = args
+    return finalize_metrics(aggregates, today)
+
+def compute_all_user_metrics(chunks: Iterable, workers: int = None, today: datetime = None) -> Dict[str, Dict[str, Any]]:
+    """Métricas de todos los usuarios en una pasada sobre la tabla completa (o un flujo de bloques).
+
+    Cada bloque se agrega en un proceso del pool (map), los parciales se combinan al llegar
+    y el cálculo final se reparte por usuario entre los mismos procesos.
+    """
+    workers = workers or Config.BATCH_WORKERS
+    # Un DataFrame o una lista de filas es un único bloque
+    if isinstance(chunks, pd.DataFrame) or (isinstance(chunks, list) and chunks and isinstance(chunks[0], dict)):
+        chunks = [chunks]
+    today = today or datetime.now()
+
+    if workers <= 1:
+        combined = combine_aggregates([partial_aggregates(chunk) for chunk in chunks])
+        return finalize_metrics(combined, today)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending, parts = [], []
+        for chunk in chunks:
+            pending.append(executor.submit(partial_aggregates, chunk))
+            # Como mucho dos bloques en vuelo por proceso: la memoria no depende del tamaño de la tabla
+            if len(pending) >= workers * 2:
+                parts.append(pending.pop(0).result())
+            if len(parts) >= workers * 4:
+                parts = [combine_aggregates(parts)]
+        parts.extend(future.result() for future in pending)
+        combined = combine_aggregates(parts)
+
+        results = {}
+        for shard in executor.map(_finalize_shard, [(shard, today) for shard in _split_by_user(combined, workers)]):
+            results.update(shard)
+    return results
+
+def metrics_records(results: Dict[str, Dict[str, Any]], computed_at: datetime = None) -> List[Dict[str, Any]]:
+    """Filas para la tabla de métricas (columnas en español, como el resto del esquema)"""
+    computed_at = (computed_at or datetime.now()).isoformat()
+    return [{
+        'usuario_id': user_id,
+        'fecha_calculo': computed_at,
+        'ingresos_mensuales': round(metrics['monthly_income'], 2),
+        'gastos_mensuales': round(metrics['monthly_expenses'], 2),
+        'ahorro_neto': round(metrics['net_savings'], 2),
+        'tasa_ahorro': round(metrics['savings_rate'], 2),
+        'salud_financiera': metrics['financial_health'],
+        'gastos_por_categoria': {category: round(amount, 2) for category, amount in metrics['expenses_by_category'].items()},
+        'patrones': metrics['spending_patterns'],
+        'alertas': metrics['alerts'],
+        'tendencias': metrics.get('monthly_trends', {})
+    } for user_id, metrics in results.items()]
+
+def write_metrics_file(records: List[Dict[str, Any]], path: str) -> None:
+    """Guardar las métricas en JSON (lista de filas) o CSV según la extensión"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if path.endswith('.csv'):
+        df = pd.DataFrame(records)
+        for column in ('gastos_por_categoria', 'patrones', 'alertas', 'tendencias'):
+            df[column] = df[column].map(lambda value: json.dumps(value, ensure_ascii=False))
+        df.to_csv(path, index=False)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, default=str)
+
+def _fetch_table(supabase_client, table: str, select: str, page_size: int = None) -> List[Dict[str, Any]]:
+    """Leer una tabla pequeña completa (presupuestos, metas) por páginas limit/offset"""
+    page_size = page_size or Config.TRANSACTIONS_PAGE_SIZE
+    rows, offset = [], 0
+    while True:
+        page = supabase_request(supabase_client, 'GET', table, filters={
+            'select': select, 'order': 'usuario_id,id', 'limit': str(page_size), 'offset': str(offset)
+        })
+        if not page:
+            return rows
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+def load_budgets(supabase_client, table: str = None) -> pd.Series:
+    """Presupuesto mensual por (usuario_id, categoría) de la tabla de presupuestos (columna monto)"""
+    rows = _fetch_table(supabase_client, table or Config.BUDGETS_TABLE, 'id,usuario_id,categoria,monto')
+    if not rows:
+        return None
+    df = pd.DataFrame.from_records(rows)
+    return pd.to_numeric(df['monto'], errors='coerce').groupby([df['usuario_id'], df['categoria']]).sum()
+
+def load_emergency_funds(supabase_client, table: str = None) -> pd.Series:
+    """Ahorro acumulado en metas 'Ahorro Emergencia' por usuario_id"""
+    rows = _fetch_table(supabase_client, table or Config.GOALS_TABLE, 'id,usuario_id,categoria,monto_actual')
+    if not rows:
+        return None
+    df = pd.DataFrame.from_records(rows)
+    df = df[df['categoria'] == Config.GOAL_CATEGORIES[0]]
+    return pd.to_numeric(df['monto_actual'], errors='coerce').groupby(df['usuario_id']).sum()
+
+def evaluate_all_alerts(results: Dict[str, Dict[str, Any]], budgets: pd.Series = None,
+                        emergency_funds: pd.Series = None, today: datetime = None) -> pd.DataFrame:
+    """Tabla de alertas de todos los usuarios, con presupuestos y fondo de emergencia si los hay.
+
+    También deja las alertas completas en las métricas de cada usuario.
+    """
+    users, categories = rule_frames_from_metrics(results, budgets, emergency_funds)
+    table = evaluate_rules(users, categories, today=today)
+    grouped = alerts_by_user(table)
+    for user_id, metrics in results.items():
+        metrics['alerts'] = grouped.get(user_id, [])
+    return table
+
+def write_alerts_file(table: pd.DataFrame, path: str) -> None:
+    """Guardar la tabla de alertas en JSON (lista de filas, lo que consume n8n) o CSV"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if path.endswith('.csv'):
+        table.to_csv(path, index=False)
+    else:
+        table.to_json(path, orient='records', force_ascii=False)
+
+def upsert_alerts(supabase_client, table: pd.DataFrame, table_name: str = None, chunk_size: int = None) -> int:
+    """Guardar las alertas del día; repetir la ejecución reemplaza en lugar de duplicar"""
+    table_name = table_name or Config.ALERTS_TABLE
+    chunk_size = chunk_size or Config.BULK_INSERT_CHUNK_SIZE
+    records = table.to_dict('records')
+    saved = 0
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        result = supabase_request(supabase_client, 'POST', table_name, data=chunk,
+                                  filters={'on_conflict': 'usuario_id,fecha,tipo,categoria'},
+                                  prefer='resolution=merge-duplicates,return=minimal')
+        if result is not None:
+            saved += len(chunk)
+    return saved
+
+def upsert_metrics(supabase_client, records: List[Dict[str, Any]], table: str = None, chunk_size: int = None) -> int:
+    """Guardar las métricas en Supabase, una fila por usuario (se reemplaza la del día anterior)"""
+    table = table or Config.USER_METRICS_TABLE
+    chunk_size = chunk_size or Config.BULK_INSERT_CHUNK_SIZE
+    saved = 0
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        result = supabase_request(supabase_client, 'POST', table, data=chunk, filters={'on_conflict': 'usuario_id'},
+                                  prefer='resolution=merge-duplicates,return=minimal')
+        if result is not None:
+            saved += len(chunk)
+    return saved
\ No newline at end of file
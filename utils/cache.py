@@ -0,0 +1,92 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+from config import Config
+from utils.instrumentation import annotate
+
+def estimate_size(value: Any) -> int:
+    """Estimar en bytes lo que ocupa una lista de transacciones/metas en memoria"""
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value.values())
+    return sys.getsizeof(value)
+
+class TTLCache:
+    """Caché LRU con expiración y presupuesto de memoria, compartida por todas las sesiones del proceso"""
+
+    def __init__(self, ttl_seconds: float, max_bytes: int, sizer: Callable[[Any], int] = estimate_size):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sizer = sizer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expira_en, tamaño, valor)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                annotate(cache_misses=1)
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            annotate(cache_hits=1)
+            return entry[2]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = self.sizer(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self._bytes += size
+            # Expulsar las entradas menos usadas hasta volver al presupuesto
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Eliminar las entradas cuya clave cumpla el predicado"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries), 'bytes': self._bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': (self.hits / total * 100) if total else 0.0
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+# Instancia única del proceso: las sesiones de Streamlit comparten el módulo importado
+data_cache = TTLCache(Config.CACHE_TTL_SECONDS, Config.CACHE_MAX_BYTES)
+
+def invalidate_user(user_id: str) -> int:
+    """Invalidar todo lo cacheado de un usuario (claves con forma (tabla, user_id, ...))"""
+    return data_cache.invalidate(lambda key: len(key) > 1 and key[1] == user_id)
\ No newline at end of file
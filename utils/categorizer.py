@@ -0,0 +1,336 @@
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+# Palabras clave por categoría (sin acentos; se normalizan igual que las descripciones).
+# Las de varias palabras ganan a las de una: 'uber eats' es comida aunque 'uber' sea transporte.
+KEYWORD_CATEGORIES = {
+    'Alimentación': ['supermercado', 'super', 'mercado', 'restaurante', 'restaurant', 'cafe', 'cafeteria',
+                     'panaderia', 'pizza', 'burger', 'hamburguesa', 'tacos', 'comida', 'food', 'grocery',
+                     'walmart', 'costco', 'soriana', 'chedraui', 'oxxo', 'seven eleven', 'starbucks',
+                     'mcdonalds', 'mcdonald', 'kfc', 'subway', 'dominos', 'rappi', 'uber eats', 'didi food',
+                     'doordash', 'whole foods', 'trader joe'],
+    'Transporte': ['uber', 'lyft', 'didi', 'cabify', 'taxi', 'gasolina', 'gasolinera', 'pemex', 'shell',
+                   'chevron', 'exxon', 'metro', 'autobus', 'bus', 'peaje', 'caseta', 'estacionamiento',
+                   'parking', 'vuelo', 'aerolinea', 'airline', 'aeromexico', 'volaris', 'viva aerobus',
+                   'gas station', 'transporte'],
+    'Vivienda': ['renta', 'alquiler', 'hipoteca', 'rent', 'mortgage', 'condominio', 'home depot', 'ikea',
+                 'mantenimiento', 'vivienda', 'inmobiliaria'],
+    'Entretenimiento': ['netflix', 'spotify', 'disney', 'hbo', 'prime video', 'cine', 'cinepolis', 'cinemex',
+                        'cinema', 'steam', 'playstation', 'xbox', 'nintendo', 'concierto', 'teatro',
+                        'ticketmaster', 'bar', 'antro', 'entretenimiento'],
+    'Salud': ['farmacia', 'pharmacy', 'hospital', 'clinica', 'medico', 'doctor', 'dentista', 'laboratorio',
+              'consultorio', 'cvs', 'walgreens', 'farmacias guadalajara', 'gimnasio', 'gym', 'salud'],
+    'Educación': ['colegiatura', 'universidad', 'escuela', 'colegio', 'curso', 'udemy', 'coursera',
+                  'platzi', 'libreria', 'libro', 'educacion', 'tuition'],
+    'Ropa': ['zara', 'ropa', 'zapateria', 'zapato', 'nike', 'adidas', 'shein', 'uniqlo', 'liverpool',
+             'h m', 'pull and bear', 'bershka'],
+    'Tecnología': ['apple', 'best buy', 'microsoft', 'google storage', 'google one', 'software', 'computadora',
+                   'celular', 'electronica', 'tecnologia', 'github', 'openai', 'amazon web service', 'aws'],
+    'Servicios': ['luz', 'electricidad', 'cfe', 'agua', 'internet', 'telefono', 'telcel', 'movistar', 'att',
+                  'at t', 'verizon', 'comcast', 'izzi', 'totalplay', 'megacable', 'gas natural', 'servicio'],
+    'Impuestos': ['impuesto', 'sat', 'irs', 'tax', 'predial', 'tenencia', 'hacienda'],
+    'Seguros': ['seguro', 'insurance', 'aseguradora', 'gnp', 'axa', 'qualitas', 'metlife', 'poliza'],
+    'Deudas': ['prestamo', 'credito', 'pago tarjeta', 'tarjeta de credito', 'loan', 'mensualidad', 'abono',
+               'deuda'],
+    'Salario': ['nomina', 'salario', 'sueldo', 'payroll', 'salary', 'quincena'],
+    'Freelance': ['honorario', 'freelance', 'upwork', 'fiverr', 'proyecto', 'consultoria'],
+    'Inversiones': ['dividendo', 'dividend', 'rendimiento', 'intereses ganado', 'interest', 'gbm', 'cetes',
+                    'broker', 'inversion'],
+    'Bonos': ['bono', 'bonus', 'aguinaldo', 'prima vacacional', 'utilidades'],
+    'Regalos': ['regalo', 'gift'],
+    'Reembolsos': ['reembolso', 'devolucion', 'refund', 'cashback', 'bonificacion'],
+}
+
+# Primer nivel de la categoría de Plaid -> categoría de la app (None: no dice nada útil)
+PLAID_CATEGORY_MAP = {
+    'food and drink': 'Alimentación', 'travel': 'Transporte', 'transportation': 'Transporte',
+    'recreation': 'Entretenimiento', 'entertainment': 'Entretenimiento', 'healthcare': 'Salud',
+    'medical': 'Salud', 'service': 'Servicios', 'rent and utilities': 'Servicios', 'tax': 'Impuestos',
+    'loan payments': 'Deudas', 'payment': 'Deudas', 'community': 'Otros Gastos',
+    'general merchandise': 'Otros Gastos', 'shops': None, 'transfer': None, 'transfer in': None,
+    'transfer out': None, 'income': 'Salario', 'bank fees': 'Servicios',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reglas_categoria (
+    usuario_id TEXT,
+    comercio TEXT,
+    categoria TEXT,
+    PRIMARY KEY (usuario_id, comercio)
+);
+CREATE TABLE IF NOT EXISTS comercios_aprendidos (
+    comercio TEXT,
+    tipo TEXT,
+    categoria TEXT,
+    n INTEGER,
+    PRIMARY KEY (comercio, tipo, categoria)
+);
+"""
+
+def normalize_text(text) -> str:
+    """Minúsculas, sin acentos, dígitos ni símbolos; plurales simples recortados ('seguros' -> 'seguro')"""
+    if not isinstance(text, str) or not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode('ascii')
+    tokens = re.sub(r'[\d\W_]+', ' ', text).split()
+    return ' '.join(token[:-1] if len(token) > 3 and token.endswith('s') else token for token in tokens)
+
+class KeywordAutomaton:
+    """Autómata de Aho-Corasick sobre palabras: encuentra todas las palabras clave de un texto en una pasada.
+
+    El alfabeto son las palabras (no los caracteres), así que una palabra clave nunca coincide
+    dentro de otra ('bar' no está en 'barberia') y las de varias palabras salen naturalmente.
+    Gana la coincidencia más larga (en palabras); a igualdad, la que aparece primero.
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]]):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]
+        for category, words in keywords.items():
+            for word in words:
+                self._add(normalize_text(word).split(), category)
+        self._build()
+
+    def _add(self, tokens: List[str], category: str) -> None:
+        if not tokens:
+            return
+        state = 0
+        for token in tokens:
+            nxt = self.goto[state].get(token)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][token] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+            state = nxt
+        # La primera categoría declarada para una palabra clave se respeta
+        if self.output[state] is None:
+            self.output[state] = (len(tokens), category)
+
+    def _build(self) -> None:
+        """Enlaces de fallo en anchura; cada estado hereda la mejor salida de su sufijo"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(token, 0)
+                if self.output[nxt] is None:
+                    self.output[nxt] = self.output[self.fail[nxt]]
+
+    def match(self, text: str, allowed: frozenset = None) -> Optional[str]:
+        """Categoría de la coincidencia más larga en un texto ya normalizado (solo entre `allowed`, si se indica)"""
+        goto, fail, output = self.goto, self.fail, self.output
+        best, best_length = None, 0
+        state = 0
+        for token in text.split():
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            # Recorrer la cadena de sufijos solo si hace falta filtrar por tipo
+            probe = state
+            while probe:
+                found = output[probe]
+                if found is None:
+                    break
+                length, category = found
+                if allowed is None or category in allowed:
+                    if length > best_length:
+                        best, best_length = category, length
+                    break
+                probe = fail[probe]
+        return best
+
+class Categorizer:
+    """Categorización automática de transacciones por descripción.
+
+    Orden de decisión: regla del usuario para ese comercio > categoría aprendida del comercio
+    (historial de todos los usuarios) > palabras clave > categoría de Plaid > 'Otros Gastos' /
+    'Otros Ingresos'. El lote trabaja sobre las descripciones distintas, no sobre las filas.
+    """
+
+    def __init__(self, db_path: str, min_evidence: int, min_share: float):
+        self.db_path = db_path
+        self.min_evidence = min_evidence
+        self.min_share = min_share
+        self.automaton = KeywordAutomaton(KEYWORD_CATEGORIES)
+        self.allowed = {
+            'income': frozenset(Config.INCOME_CATEGORIES),
+            'expense': frozenset(Config.EXPENSE_CATEGORIES),
+            None: None
+        }
+        self._learned = None
+        self._overrides = None
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.db_path != ':memory:' and os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._schema_ready or self.db_path == ':memory:':
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _load(self) -> None:
+        """Reglas y comercios aprendidos en memoria (se leen una vez; las escrituras los mantienen al día)"""
+        if self._learned is not None:
+            return
+        conn = self._connect()
+        try:
+            self._overrides = {(user, merchant): category for user, merchant, category in
+                               conn.execute('SELECT usuario_id, comercio, categoria FROM reglas_categoria')}
+            counts = conn.execute('SELECT comercio, tipo, categoria, n FROM comercios_aprendidos').fetchall()
+        finally:
+            conn.close()
+        self._learned = {}
+        self._counts = {}
+        for merchant, transaction_type, category, n in counts:
+            self._counts.setdefault((merchant, transaction_type), {})[category] = n
+        for key in self._counts:
+            self._refresh(key)
+
+    def _refresh(self, key: Tuple[str, str]) -> None:
+        """Un comercio queda aprendido si una categoría tiene evidencia suficiente y clara mayoría"""
+        counts = self._counts.get(key, {})
+        total = sum(counts.values())
+        category, n = max(counts.items(), key=lambda item: item[1]) if counts else (None, 0)
+        if n >= self.min_evidence and n >= self.min_share * total:
+            self._learned[key] = category
+        else:
+            self._learned.pop(key, None)
+
+    def _classify_text(self, text: str, transaction_type: Optional[str]) -> Optional[str]:
+        learned = self._learned.get((text, transaction_type))
+        if learned is not None:
+            return learned
+        return self.automaton.match(text, self.allowed.get(transaction_type))
+
+    def categorize(self, descriptions, transaction_types=None, user_ids=None, plaid_categories=None) -> np.ndarray:
+        """Categorías para un lote de descripciones (tipos 'income'/'expense' o 'ingreso'/'gasto')"""
+        descriptions = pd.Series(descriptions, dtype=object).reset_index(drop=True)
+        n = len(descriptions)
+        if n == 0:
+            return np.array([], dtype=object)
+        types = (pd.Series(transaction_types, dtype=object).reset_index(drop=True)
+                 .replace({'ingreso': 'income', 'gasto': 'expense'}) if transaction_types is not None
+                 else pd.Series([None] * n, dtype=object))
+
+        with self._lock:
+            self._load()
+            # Normalizar una vez por descripción distinta y clasificar una vez por (texto, tipo) distinto
+            raw_codes, raw_uniques = pd.factorize(descriptions, use_na_sentinel=False)
+            texts = np.array([normalize_text(d) for d in raw_uniques], dtype=object)[raw_codes]
+            pairs = pd.MultiIndex.from_arrays([texts, types.to_numpy(dtype=object)])
+            pair_codes, pair_uniques = pd.factorize(pairs)
+            categories = np.array([self._classify_text(text, transaction_type)
+                                   for text, transaction_type in pair_uniques], dtype=object)[pair_codes]
+
+            if user_ids is not None and self._overrides:
+                users = pd.Series(user_ids, dtype=object).reset_index(drop=True)
+                override_users = {user for user, _ in self._overrides}
+                for i in np.flatnonzero(users.isin(override_users).to_numpy()):
+                    override = self._overrides.get((users[i], texts[i]))
+                    if override is not None:
+                        categories[i] = override
+
+        missing = pd.isna(categories)
+        if missing.any() and plaid_categories is not None:
+            plaid = pd.Series(plaid_categories, dtype=object).reset_index(drop=True)
+            # Plaid manda la jerarquía como lista ('Food and Drink', 'Restaurants'); cuenta el primer nivel
+            first = plaid.map(lambda c: c[0] if isinstance(c, (list, tuple)) and c else c)
+            mapped = first.map(lambda c: PLAID_CATEGORY_MAP.get(normalize_text(c)) if isinstance(c, str) else None)
+            # Una categoría de Plaid de gasto no se asigna a un ingreso (ni al revés)
+            valid = [category is not None and (allowed is None or category in allowed)
+                     for category, allowed in zip(mapped, types.map(self.allowed.get))]
+            fill = missing & np.array(valid, dtype=bool)
+            categories[fill] = mapped.to_numpy(dtype=object)[fill]
+            missing = pd.isna(categories)
+        if missing.any():
+            categories[missing] = np.where(types.to_numpy(dtype=object)[missing] == 'income',
+                                           'Otros Ingresos', 'Otros Gastos')
+        return categories
+
+    def suggest(self, description: str, transaction_type: str = None, user_id: str = None) -> str:
+        return self.categorize([description], [transaction_type], [user_id] if user_id else None)[0]
+
+    def set_override(self, user_id: str, description: str, category: str) -> None:
+        """Regla del usuario: este comercio siempre va a esta categoría"""
+        merchant = normalize_text(description)
+        if not merchant:
+            return
+        with self._lock:
+            self._load()
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('INSERT OR REPLACE INTO reglas_categoria (usuario_id, comercio, categoria) '
+                                 'VALUES (?, ?, ?)', (user_id, merchant, category))
+            finally:
+                conn.close()
+            self._overrides[(user_id, merchant)] = category
+
+    def learn(self, descriptions, categories, transaction_types) -> int:
+        """Sumar evidencia comercio -> categoría (categorías elegidas a mano o del historial)"""
+        codes, uniques = pd.factorize(pd.Series(descriptions, dtype=object), use_na_sentinel=False)
+        frame = pd.DataFrame({
+            'comercio': np.array([normalize_text(d) for d in uniques], dtype=object)[codes],
+            'tipo': pd.Series(transaction_types, dtype=object).replace({'ingreso': 'income', 'gasto': 'expense'}).to_numpy(),
+            'categoria': pd.Series(categories, dtype=object).to_numpy()
+        })
+        # Las categorías genéricas no enseñan nada sobre el comercio
+        valid = (frame['categoria'].isin(Config.INCOME_CATEGORIES + Config.EXPENSE_CATEGORIES)
+                 & ~frame['categoria'].isin(['Otros Ingresos', 'Otros Gastos']))
+        frame = frame[valid & (frame['comercio'] != '')]
+        if frame.empty:
+            return 0
+        counts = frame.groupby(['comercio', 'tipo', 'categoria'], sort=False).size()
+        with self._lock:
+            self._load()
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        'INSERT INTO comercios_aprendidos (comercio, tipo, categoria, n) VALUES (?, ?, ?, ?) '
+                        'ON CONFLICT (comercio, tipo, categoria) DO UPDATE SET n = n + excluded.n',
+                        [(merchant, transaction_type, category, int(n))
+                         for (merchant, transaction_type, category), n in counts.items()]
+                    )
+            finally:
+                conn.close()
+            for (merchant, transaction_type, category), n in counts.items():
+                bucket = self._counts.setdefault((merchant, transaction_type), {})
+                bucket[category] = bucket.get(category, 0) + int(n)
+            for key in {(merchant, transaction_type) for merchant, transaction_type, _ in counts.index}:
+                self._refresh(key)
+        return int(counts.sum())
+
+    def reset(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('DELETE FROM reglas_categoria')
+                    conn.execute('DELETE FROM comercios_aprendidos')
+            finally:
+                conn.close()
+            self._learned = self._overrides = None
+
+# Instancia única del proceso: la app, el servicio de ingesta y los backfills comparten reglas y aprendizaje
+categorizer = Categorizer(Config.CATEGORIZER_DB_PATH, Config.CATEGORIZER_MIN_EVIDENCE, Config.CATEGORIZER_MIN_SHARE)
\ No newline at end of file
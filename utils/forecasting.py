@@ -0,0 +1,213 @@
+import hashlib
+from datetime import date
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.aggregates import get_user_aggregates
+from utils.cache import data_cache
+from utils.instrumentation import instrumented, annotate
+
+SEASON_LENGTH = 12
+# Rejilla de parámetros del suavizado exponencial (forma de corrección de errores):
+# β se expresa como fracción de α y γ solo se prueba con dos temporadas completas de historial
+ALPHAS = (0.1, 0.3, 0.5, 0.8)
+BETA_RATIOS = (0.0, 0.1, 0.3)
+GAMMAS = (0.0, 0.1, 0.3)
+# Con muy pocos meses no se puede estimar la dispersión: se usa este % del nivel
+FALLBACK_RELATIVE_SIGMA = 0.2
+
+def _parameter_grid(seasonal: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    gammas = GAMMAS if seasonal else (0.0,)
+    grid = np.array([(a, a * r, g) for a in ALPHAS for r in BETA_RATIOS for g in gammas if g <= 1 - a])
+    return grid[:, 0], grid[:, 1], grid[:, 2]
+
+def fit_models(values: np.ndarray, season_length: int = SEASON_LENGTH) -> Dict[str, np.ndarray]:
+    """Ajustar un Holt-Winters aditivo por fila de `values` (series × meses), todas a la vez.
+
+    Cada combinación de la rejilla se evalúa para todas las series en el mismo bucle sobre
+    los meses (arrays combinaciones × series); cada serie se queda con la de menor error
+    cuadrático de un paso. Sin dos temporadas completas el modelo es Holt (nivel + tendencia).
+    """
+    values = np.asarray(values, dtype='float64')
+    n_series, n_months = values.shape
+    seasonal = n_months >= 2 * season_length
+    m = season_length if seasonal else 1
+    alpha, beta, gamma = _parameter_grid(seasonal)
+    n_grid = len(alpha)
+
+    # Estados iniciales en t = -1, de modo que la primera predicción sea nivel + tendencia (+ estación)
+    if seasonal:
+        first, second = values[:, :m].mean(axis=1), values[:, m:2 * m].mean(axis=1)
+        trend0 = (second - first) / m
+        offsets = np.arange(m) - (m - 1) / 2
+        season0 = values[:, :m] - first[:, None] - trend0[:, None] * offsets
+        level0 = first - trend0 * (m + 1) / 2
+        warmup = m
+    else:
+        # Recta de mínimos cuadrados sobre los primeros meses
+        k = min(n_months, 4)
+        offsets = np.arange(k) - (k - 1) / 2
+        head = values[:, :k]
+        trend0 = (head * offsets).sum(axis=1) / max((offsets * offsets).sum(), 1.0)
+        level0 = head.mean(axis=1) - trend0 * (k + 1) / 2
+        season0 = np.zeros((n_series, 1))
+        warmup = 1
+
+    level = np.repeat(level0[None, :], n_grid, axis=0)
+    trend = np.repeat(trend0[None, :], n_grid, axis=0)
+    season = np.repeat(season0[None, :, :], n_grid, axis=0)
+    sse = np.zeros((n_grid, n_series))
+    a, b, g = alpha[:, None], beta[:, None], gamma[:, None]
+    for t in range(n_months):
+        slot = t % m
+        error = values[:, t] - (level + trend + season[:, :, slot])
+        if t >= warmup:
+            sse += error * error
+        level = level + trend + a * error
+        trend = trend + b * error
+        season[:, :, slot] += g * error
+
+    best = sse.argmin(axis=0)
+    series = np.arange(n_series)
+    # Grados de libertad: se descuentan los parámetros de suavizado elegidos en la rejilla
+    dof = n_months - warmup - (3 if seasonal else 2)
+    best_level = level[best, series]
+    sigma = np.sqrt(sse[best, series] / dof) if dof >= 2 else FALLBACK_RELATIVE_SIGMA * np.abs(best_level)
+    return {
+        'level': best_level, 'trend': trend[best, series], 'season': season[best, series],
+        'alpha': alpha[best], 'beta': beta[best], 'gamma': gamma[best], 'sigma': sigma,
+        'season_length': m, 'observations': n_months
+    }
+
+def project(models: Dict[str, np.ndarray], horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Media y desviación estándar de los próximos `horizon` meses (series × horizonte)"""
+    m, n_months = models['season_length'], models['observations']
+    steps = np.arange(1, horizon + 1)
+    mean = (models['level'][:, None] + models['trend'][:, None] * steps
+            + models['season'][:, (n_months + steps - 1) % m])
+    # Varianza exacta del modelo aditivo: σ²(1 + Σ_{j<h} c_j²), c_j = α + jβ + γ·[j múltiplo de m]
+    j = steps[:-1]
+    c = models['alpha'][:, None] + models['beta'][:, None] * j
+    if m > 1:
+        c = c + models['gamma'][:, None] * (j % m == 0)
+    variance = np.concatenate([np.ones((len(mean), 1)), 1 + np.cumsum(c * c, axis=1)], axis=1)
+    return mean, models['sigma'][:, None] * np.sqrt(variance)
+
+def forecast_series(values: np.ndarray, horizon: int = 6, season_length: int = SEASON_LENGTH) -> Tuple[np.ndarray, np.ndarray]:
+    """Ajustar y proyectar en un paso (para lotes de miles de series)"""
+    return project(fit_models(values, season_length), horizon)
+
+def _month_range(first: str, last: str) -> List[str]:
+    return [period.strftime('%Y-%m') for period in pd.period_range(first, last, freq='M')]
+
+def monthly_matrix(aggregates, today: date = None) -> Tuple[List[tuple], List[str], np.ndarray]:
+    """Series (tipo, categoría) × meses completos a partir de los agregados del usuario.
+
+    El mes en curso está incompleto y se deja fuera (salvo que sea el único con datos);
+    los meses sin movimientos de una categoría cuentan como 0.
+    """
+    current = (today or date.today()).strftime('%Y-%m')
+    months = aggregates.months()
+    if not months:
+        return [], [], np.zeros((0, 0))
+    complete = [month for month in months if month < current]
+    last = complete[-1] if complete else months[-1]
+    # Meses vacíos hasta el último mes cerrado: no haber gastado también es un dato
+    if complete and last < current:
+        last = (pd.Period(current, freq='M') - 1).strftime('%Y-%m')
+    month_list = _month_range(months[0], last)
+    position = {month: i for i, month in enumerate(month_list)}
+
+    keys = sorted({(transaction_type, category) for month, category, transaction_type in aggregates.cells
+                   if month in position})
+    row = {key: i for i, key in enumerate(keys)}
+    values = np.zeros((len(keys), len(month_list)))
+    for (month, category, transaction_type), (total, _) in aggregates.cells.items():
+        if month in position:
+            values[row[(transaction_type, category)], position[month]] += total
+    return keys, month_list, values
+
+def rollup_matrix(df: pd.DataFrame) -> Tuple[pd.MultiIndex, List[str], np.ndarray]:
+    """Series (usuario, tipo, categoría) × mes desde un DataFrame tipado de transacciones (vectorizado)"""
+    months = pd.to_datetime(df['date']).dt.to_period('M')
+    totals = df['amount'].astype('float64').groupby(
+        [df['user_id'], df['transaction_type'], df['category'], months], observed=True
+    ).sum()
+    wide = totals.unstack(fill_value=0.0)
+    full = pd.period_range(wide.columns.min(), wide.columns.max(), freq='M')
+    wide = wide.reindex(columns=full, fill_value=0.0)
+    return wide.index, [str(period) for period in full], wide.to_numpy()
+
+def _next_months(last: str, horizon: int) -> List[str]:
+    start = pd.Period(last, freq='M') + 1
+    return [str(start + i) for i in range(horizon)]
+
+def forecast_from_aggregates(aggregates, horizon: int = 6, interval: float = 0.8,
+                             today: date = None) -> Optional[Dict[str, pd.DataFrame]]:
+    """Proyección de ingresos, gastos y ahorro con bandas, a partir de una serie por categoría.
+
+    Los totales suman las medias de sus categorías y sus varianzas (se asumen independientes).
+    Devuelve None si no hay ningún mes con datos.
+    """
+    keys, months, values = monthly_matrix(aggregates, today)
+    if not keys:
+        return None
+    mean, std = forecast_series(values, horizon)
+    # Una categoría no puede tener montos negativos
+    mean = np.clip(mean, 0, None)
+    z = NormalDist().inv_cdf((1 + interval) / 2)
+    is_income = np.array([transaction_type == 'income' for transaction_type, _ in keys])
+
+    def total(mask, matrix):
+        return matrix[mask].sum(axis=0) if mask.any() else np.zeros(matrix.shape[1])
+
+    income, expenses = total(is_income, mean), total(~is_income, mean)
+    income_var, expenses_var = total(is_income, std ** 2), total(~is_income, std ** 2)
+    savings, savings_std = income - expenses, np.sqrt(income_var + expenses_var)
+    income_std, expenses_std = np.sqrt(income_var), np.sqrt(expenses_var)
+
+    forecast = pd.DataFrame({
+        'mes': _next_months(months[-1], horizon),
+        'ingresos': income, 'ingresos_min': np.clip(income - z * income_std, 0, None), 'ingresos_max': income + z * income_std,
+        'gastos': expenses, 'gastos_min': np.clip(expenses - z * expenses_std, 0, None), 'gastos_max': expenses + z * expenses_std,
+        'ahorro': savings, 'ahorro_min': savings - z * savings_std, 'ahorro_max': savings + z * savings_std
+    })
+    history = pd.DataFrame({
+        'mes': months, 'ingresos': total(is_income, values), 'gastos': total(~is_income, values)
+    })
+    history['ahorro'] = history['ingresos'] - history['gastos']
+    categories = pd.DataFrame({
+        'categoría': [category or 'Sin categoría' for _, category in keys],
+        'tipo': ['Ingreso' if income_row else 'Gasto' for income_row in is_income],
+        'próximo mes': mean[:, 0],
+        'mínimo': np.clip(mean[:, 0] - z * std[:, 0], 0, None),
+        'máximo': mean[:, 0] + z * std[:, 0]
+    }).sort_values(['tipo', 'próximo mes'], ascending=[True, False], ignore_index=True)
+    return {'history': history, 'forecast': forecast, 'categories': categories,
+            'seasonal': len(months) >= 2 * SEASON_LENGTH, 'interval': interval}
+
+def _rollup_digest(aggregates, horizon: int, interval: float, today: date) -> str:
+    """Huella de los totales mensuales: cambia con cada transacción nueva (o al cambiar de mes)"""
+    digest = hashlib.sha256(f'{horizon}|{interval}|{(today or date.today()).strftime("%Y-%m")}'.encode('utf-8'))
+    for key, (total, count) in sorted(aggregates.cells.items()):
+        digest.update(f'{key}|{total:.2f}|{count}'.encode('utf-8'))
+    return digest.hexdigest()
+
+@instrumented()
+def get_user_forecast(supabase_client, user_id: str, horizon: int = 6, interval: float = 0.8,
+                      today: date = None) -> Optional[Dict[str, pd.DataFrame]]:
+    """Proyección del usuario, cacheada mientras sus totales mensuales no cambien"""
+    aggregates = get_user_aggregates(supabase_client, user_id)
+    # Clave con forma (tabla, user_id, ...): invalidate_user la borra al insertar transacciones
+    cache_key = ('pronostico', user_id, _rollup_digest(aggregates, horizon, interval, today))
+    cached = data_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    result = forecast_from_aggregates(aggregates, horizon, interval, today)
+    if result is not None:
+        annotate(rows=len(result['categories']))
+        data_cache.set(cache_key, result)
+    return result
\ No newline at end of file
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS claves_idempotencia (
+    clave TEXT PRIMARY KEY,
+    estado TEXT,
+    transaccion_id TEXT,
+    creada_en REAL
+);
+CREATE INDEX IF NOT EXISTS idx_claves_idempotencia_creada ON claves_idempotencia (creada_en);
+"""
+
+PENDING = 'pendiente'
+WRITTEN = 'escrita'
+
+def idempotency_key(row: Dict, source_id: str = None, occurrence: int = 0) -> str:
+    """Clave de una fila de 'transacciones' a partir de su contenido: usuario, monto, fecha, descripción, tipo y origen.
+
+    source_id distingue dos transacciones idénticas legítimas (p. ej. el envío del formulario o
+    el id del banco); occurrence, la n-ésima fila idéntica dentro de un mismo lote.
+    """
+    description = ' '.join(str(row.get('descripcion') or '').casefold().split())
+    content = '|'.join([
+        str(row.get('usuario_id')), f"{float(row.get('monto') or 0):.2f}", str(row.get('fecha')),
+        description, str(row.get('tipo')), str(source_id or ''), str(occurrence)
+    ])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def batch_idempotency_keys(rows: List[Dict], source_ids: List[Optional[str]] = None) -> List[str]:
+    """Claves de un lote: las filas idénticas sin origen se numeran para no colapsar compras repetidas"""
+    seen = {}
+    keys = []
+    for i, row in enumerate(rows):
+        source_id = source_ids[i] if source_ids else None
+        base = idempotency_key(row, source_id)
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        keys.append(base if occurrence == 0 else idempotency_key(row, source_id, occurrence))
+    return keys
+
+class IdempotencyIndex:
+    """Claves de idempotencia recientes en SQLite: cortan un reenvío sin ir a la red.
+
+    claim() reserva la clave de forma atómica (entre hilos y procesos): el primero que la reserva
+    escribe y los demás ven 'pendiente' o el id ya escrito. Las claves caducan a los ttl_seconds;
+    una reserva 'pendiente' más vieja que pending_seconds (proceso caído) se puede volver a tomar.
+    Más allá del TTL, el upsert por la columna única de la tabla sigue evitando el duplicado.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float, pending_seconds: float):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.pending_seconds = pending_seconds
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self._last_purge = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.db_path != ':memory:' and os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # isolation_level=None: las transacciones se abren a mano con BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        if not self._schema_ready or self.db_path == ':memory:':
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def claim_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Reservar claves; por cada una, None si se reservó ahora o el estado previo ('pendiente' o el id escrito)"""
+        now = time.time()
+        results = []
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                if now - self._last_purge > 60:
+                    conn.execute('DELETE FROM claves_idempotencia WHERE creada_en < ?', (now - self.ttl_seconds,))
+                    self._last_purge = now
+                for key in keys:
+                    row = conn.execute('SELECT estado, transaccion_id, creada_en FROM claves_idempotencia WHERE clave = ?',
+                                       (key,)).fetchone()
+                    if row is not None:
+                        state, transaction_id, created_at = row
+                        expired = created_at < now - self.ttl_seconds
+                        abandoned = state == PENDING and created_at < now - self.pending_seconds
+                        if not (expired or abandoned):
+                            results.append(transaction_id or state)
+                            continue
+                    conn.execute('INSERT OR REPLACE INTO claves_idempotencia (clave, estado, transaccion_id, creada_en) '
+                                 'VALUES (?, ?, NULL, ?)', (key, PENDING, now))
+                    results.append(None)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            finally:
+                conn.close()
+        return results
+
+    def claim(self, key: str) -> Optional[str]:
+        return self.claim_many([key])[0]
+
+    def complete(self, keys: List[str], transaction_ids: List[Optional[str]] = None) -> None:
+        """Marcar claves reservadas como escritas (con el id de la fila, si se conoce)"""
+        transaction_ids = transaction_ids or [None] * len(keys)
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.executemany('UPDATE claves_idempotencia SET estado = ?, transaccion_id = ? WHERE clave = ?',
+                                 [(WRITTEN, str(tid) if tid is not None else None, key)
+                                  for key, tid in zip(keys, transaction_ids)])
+            finally:
+                conn.close()
+
+    def release(self, keys: List[str]) -> None:
+        """Liberar reservas de escrituras que fallaron, para que un reintento pueda hacerse"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.executemany('DELETE FROM claves_idempotencia WHERE clave = ? AND estado = ?',
+                                 [(key, PENDING) for key in keys])
+            finally:
+                conn.close()
+
+# Instancia única del proceso: comparte el archivo con otros procesos (p. ej. varias réplicas de la app)
+idempotency_index = IdempotencyIndex(Config.IDEMPOTENCY_DB_PATH, Config.IDEMPOTENCY_TTL_SECONDS,
+                                     Config.IDEMPOTENCY_PENDING_SECONDS)
\ No newline at end of file
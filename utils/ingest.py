@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from utils.anomalies import anomaly_detector, ensure_bootstrapped_many
+from utils.database import supabase_request
+from utils.instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+class IngestQueueFull(RuntimeError):
+    """La cola de ingesta no tiene sitio: el cliente debe reintentar más tarde (HTTP 429)"""
+
+class IngestQueue:
+    """Cola acotada de filas a insertar, vaciada en lotes multi-fila por hilos escritores.
+
+    Un lote sale cuando junta batch_size filas o cuando su fila más antigua lleva flush_seconds
+    esperando. Si la cola llegaría a más de max_rows, offer() rechaza el payload completo
+    (el servicio responde 429) en lugar de crecer sin límite. Los lotes que fallan tras los
+    reintentos de supabase_request se guardan en dead_letter_path (JSON por línea).
+    Con id_index, los lotes se escriben como upsert sobre su columna única y los ids
+    escritos se marcan en el índice; un id que ya está en cola o escribiéndose no se vuelve
+    a encolar. Con detect_anomalies, las filas que la BD realmente insertó pasan por el
+    detector de anomalías agrupadas por usuario. El historial de los usuarios nuevos se
+    aprende en un hilo aparte (lecturas en bloque), sin frenar la escritura: mientras tanto
+    se puntúa con el estado que haya.
+    """
+
+    def __init__(self, supabase_client, max_rows: int = None, batch_size: int = None, flush_seconds: float = None,
+                 writers: int = None, table: str = 'transacciones', dead_letter_path: str = None,
+                 id_index=None, id_column: str = None, detect_anomalies: bool = True):
+        self.supabase_client = supabase_client
+        self.max_rows = max_rows or Config.INGEST_MAX_QUEUED_ROWS
+        self.batch_size = batch_size or Config.INGEST_BATCH_SIZE
+        self.flush_seconds = Config.INGEST_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.writers = writers or Config.INGEST_WRITERS
+        self.table = table
+        self.dead_letter_path = dead_letter_path or Config.INGEST_DEAD_LETTER_PATH
+        self.id_index = id_index
+        self.id_column = id_column or Config.PLAID_ID_COLUMN
+        self.detect_anomalies = detect_anomalies
+        self.stats = {'aceptadas': 0, 'rechazadas': 0, 'repetidas_en_cola': 0, 'insertadas': 0,
+                      'duplicadas_en_bd': 0, 'fallidas': 0, 'lotes': 0, 'sin_guardar': 0, 'alertas': 0,
+                      'historiales_aprendidos': 0}
+        self._pending = deque()
+        self._in_flight = 0
+        self._queued_ids = set()     # ids (id_column) en cola o escribiéndose
+        self._cond = threading.Condition()
+        self._dead_letter_lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+        self._to_learn = set()       # usuarios cuyo historial falta aprender
+        self._learn_cond = threading.Condition()
+        self._learner = None
+        self._learner_stop = False
+
+    def start(self) -> 'IngestQueue':
+        for i in range(self.writers):
+            thread = threading.Thread(target=self._writer, name=f'ingesta-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.detect_anomalies:
+            self._learner = threading.Thread(target=self._learn_histories, name='ingesta-historial', daemon=True)
+            self._learner.start()
+        return self
+
+    def offer(self, rows: List[Dict[str, Any]]) -> tuple:
+        """Encolar las filas de un payload (todas o ninguna); devuelve (aceptadas, filas en cola).
+
+        Las filas cuyo id ya está en cola o escribiéndose (un reenvío que llega antes de que se
+        escriba el original) se descartan: el índice de ids solo las ve una vez escritas.
+        """
+        if len(rows) > self.max_rows:
+            raise ValueError(f'El payload tiene {len(rows)} transacciones; el máximo es {self.max_rows}')
+        with self._cond:
+            if self._closed:
+                raise IngestQueueFull('El servicio se está deteniendo')
+            fresh = [row for row in rows if row.get(self.id_column) is None
+                     or row.get(self.id_column) not in self._queued_ids]
+            if len(self._pending) + len(fresh) > self.max_rows:
+                self.stats['rechazadas'] += len(rows)
+                raise IngestQueueFull(f'Cola llena ({len(self._pending)} transacciones pendientes)')
+            was_empty = not self._pending
+            now = time.monotonic()
+            self._pending.extend((now, row) for row in fresh)
+            self._queued_ids.update(row.get(self.id_column) for row in fresh if row.get(self.id_column) is not None)
+            self.stats['aceptadas'] += len(fresh)
+            self.stats['repetidas_en_cola'] += len(rows) - len(fresh)
+            # Un escritor ocioso debe despertar para programar el vencimiento del lote
+            if fresh and (was_empty or len(self._pending) >= self.batch_size):
+                self._cond.notify_all()
+            return len(fresh), len(self._pending)
+
+    def retry_after(self) -> int:
+        """Segundos sugeridos al cliente rechazado: lo que tardaría en vaciarse la cola al ritmo de un lote por intervalo"""
+        with self._cond:
+            batches = len(self._pending) / max(self.batch_size * self.writers, 1)
+        return max(1, int(batches * max(self.flush_seconds, 0.1) + 0.999))
+
+    def depth(self) -> int:
+        """Filas en cola más las que se están escribiendo"""
+        with self._cond:
+            return len(self._pending) + self._in_flight
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {**self.stats, 'en_cola': len(self._pending), 'escribiendo': self._in_flight}
+
+    def _take(self) -> Optional[List[Dict[str, Any]]]:
+        """Esperar a que haya un lote listo (lleno o vencido); None cuando la cola se cerró y quedó vacía"""
+        with self._cond:
+            while True:
+                if len(self._pending) >= self.batch_size or (self._closed and self._pending):
+                    break
+                if self._pending:
+                    wait = self._pending[0][0] + self.flush_seconds - time.monotonic()
+                    if wait <= 0:
+                        break
+                elif self._closed:
+                    return None
+                else:
+                    wait = None
+                self._cond.wait(wait)
+            batch = [self._pending.popleft()[1] for _ in range(min(self.batch_size, len(self._pending)))]
+            self._in_flight += len(batch)
+            return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """Escribir un lote; devuelve las filas que la BD realmente insertó (None si falló)"""
+        with span('ingest_flush', rows=len(batch), table=self.table):
+            if self.id_index is None:
+                result = supabase_request(self.supabase_client, 'POST', self.table, data=batch,
+                                          prefer='return=minimal')
+                return None if result is None else batch
+            # Dos payloads con el mismo id pueden pasar el índice a la vez: la BD descarta el segundo
+            # y, con 'select', solo devuelve el id de las filas que sí insertó
+            result = supabase_request(self.supabase_client, 'POST', self.table, data=batch,
+                                      filters={'on_conflict': self.id_column, 'select': self.id_column},
+                                      prefer='resolution=ignore-duplicates,return=representation')
+            if result is None:
+                return None
+            self.id_index.add(row.get(self.id_column) for row in batch)
+            written = {row.get(self.id_column) for row in result}
+            return [row for row in batch if row.get(self.id_column) in written]
+
+    def _by_user(self, batch: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        groups = defaultdict(list)
+        for row in batch:
+            groups[row.get('usuario_id')].append(row)
+        return groups
+
+    def _observe(self, rows: List[Dict[str, Any]]) -> int:
+        """Pasar las filas insertadas por el detector de anomalías; devuelve las alertas generadas.
+
+        Los usuarios cuyo historial aún no se aprendió se encargan al hilo de historiales; sus
+        filas se puntúan ya con el estado que haya (al aprender, el historial las incluye una vez).
+        """
+        groups = self._by_user(rows)
+        try:
+            unknown = anomaly_detector.not_bootstrapped(groups)
+            # Todos los usuarios del lote en una sola transacción de SQLite
+            alerts = len(anomaly_detector.observe_many(groups))
+        except Exception as e:
+            # El lote ya está en la BD: un fallo del detector no lo convierte en fallido
+            logger.warning('No se pudieron analizar %d transacciones de %d usuarios: %s', len(rows), len(groups), e)
+            return 0
+        if unknown:
+            with self._learn_cond:
+                self._to_learn.update(unknown)
+                self._learn_cond.notify()
+        return alerts
+
+    def _learn_histories(self) -> None:
+        """Hilo de historiales: junta los usuarios pendientes y los aprende con lecturas en bloque"""
+        while True:
+            with self._learn_cond:
+                while not self._to_learn and not self._learner_stop:
+                    self._learn_cond.wait()
+                if not self._to_learn:
+                    return
+                users, self._to_learn = self._to_learn, set()
+            try:
+                learned = ensure_bootstrapped_many(self.supabase_client, users)
+            except Exception as e:
+                # Se reintenta cuando llegue otro lote de estos usuarios
+                logger.warning('No se pudo aprender el historial de %d usuarios: %s', len(users), e)
+                continue
+            with self._cond:
+                self.stats['historiales_aprendidos'] += len(learned & users)
+
+    def _writer(self) -> None:
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            try:
+                written = self._write(batch)
+            except Exception:
+                written = None
+            ok = written is not None
+            alerts = self._observe(written) if ok and self.detect_anomalies else 0
+            lost = 0 if ok or self._dead_letter(batch) else len(batch)
+            with self._cond:
+                self._in_flight -= len(batch)
+                self._queued_ids.difference_update(row.get(self.id_column) for row in batch)
+                self.stats['lotes'] += 1
+                if ok:
+                    self.stats['insertadas'] += len(written)
+                    self.stats['duplicadas_en_bd'] += len(batch) - len(written)
+                else:
+                    self.stats['fallidas'] += len(batch)
+                self.stats['sin_guardar'] += lost
+                self.stats['alertas'] += alerts
+                self._cond.notify_all()
+
+    def _dead_letter(self, batch: List[Dict[str, Any]]) -> bool:
+        """Guardar un lote que no se pudo insertar para reprocesarlo después (False si tampoco se pudo guardar)"""
+        try:
+            if os.path.dirname(self.dead_letter_path):
+                os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+            with self._dead_letter_lock, open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                for row in batch:
+                    f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            return True
+        except OSError as e:
+            # Estas filas se pierden: que quede en las métricas ('sin_guardar') y en el log
+            logger.error('No se pudo guardar el lote fallido (%d filas) en %s: %s', len(batch), self.dead_letter_path, e)
+            return False
+
+    def drain(self, timeout: float = None) -> bool:
+        """Esperar a que se escriba todo lo encolado hasta ahora (False si vence el timeout)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else self.flush_seconds or 0.1)
+        return True
+
+    def close(self, timeout: float = None) -> None:
+        """Dejar de aceptar filas, escribir las pendientes y detener los escritores"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self._learner is not None:
+            with self._learn_cond:
+                self._learner_stop = True
+                self._learn_cond.notify()
+            self._learner.join(timeout)
+            self._learner = None
\ No newline at end of file
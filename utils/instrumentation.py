@@ -0,0 +1,213 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Traza del rerun actual (cada rerun de Streamlit corre en su propio hilo/contexto)
+_trace = contextvars.ContextVar('trace', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+class SpanStats:
+    """Ventana deslizante de duraciones y totales acumulados de un tramo instrumentado"""
+
+    def __init__(self, window: int):
+        self.durations = deque(maxlen=window)
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.errors = 0
+
+    def quantiles(self) -> Dict[float, float]:
+        if not self.durations:
+            return {q: 0.0 for q in QUANTILES}
+        values = np.quantile(np.fromiter(self.durations, dtype='float64'), QUANTILES)
+        return dict(zip(QUANTILES, values.tolist()))
+
+class Registry:
+    """Estadísticas por nombre de tramo, compartidas por todas las sesiones del proceso"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._spans = {}
+        self._lock = threading.Lock()
+        self._last_export = 0.0
+
+    def record(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            stats = self._spans.get(span['name'])
+            if stats is None:
+                stats = self._spans[span['name']] = SpanStats(self.window)
+            stats.durations.append(span['seconds'])
+            stats.count += 1
+            stats.seconds += span['seconds']
+            stats.rows += span.get('rows') or 0
+            stats.bytes += span.get('bytes') or 0
+            stats.cache_hits += span.get('cache_hits', 0)
+            stats.cache_misses += span.get('cache_misses', 0)
+            stats.errors += 1 if span.get('error') else 0
+
+    def summary(self) -> pd.DataFrame:
+        """Tabla con p50/p95/p99 y totales por tramo"""
+        with self._lock:
+            rows = [{
+                'tramo': name, 'llamadas': stats.count,
+                **{f'p{int(q * 100)} (ms)': value * 1000 for q, value in stats.quantiles().items()},
+                'total (s)': stats.seconds, 'filas': stats.rows, 'bytes': stats.bytes,
+                'cache hits': stats.cache_hits, 'cache misses': stats.cache_misses, 'errores': stats.errors
+            } for name, stats in sorted(self._spans.items())]
+        return pd.DataFrame(rows)
+
+    def prometheus(self) -> str:
+        """Exposición en formato de texto de Prometheus (un summary por tramo más contadores)"""
+        lines = [
+            '# HELP finanzas_span_seconds Duración de los tramos instrumentados',
+            '# TYPE finanzas_span_seconds summary'
+        ]
+        counters = {
+            'finanzas_span_rows_total': ('Filas procesadas', 'rows'),
+            'finanzas_span_bytes_total': ('Bytes recibidos', 'bytes'),
+            'finanzas_span_cache_hits_total': ('Aciertos de caché', 'cache_hits'),
+            'finanzas_span_cache_misses_total': ('Fallos de caché', 'cache_misses'),
+            'finanzas_span_errors_total': ('Errores', 'errors'),
+        }
+        with self._lock:
+            spans = sorted(self._spans.items())
+            for name, stats in spans:
+                for q, value in stats.quantiles().items():
+                    lines.append(f'finanzas_span_seconds{{span="{name}",quantile="{q}"}} {value:.6f}')
+                lines.append(f'finanzas_span_seconds_sum{{span="{name}"}} {stats.seconds:.6f}')
+                lines.append(f'finanzas_span_seconds_count{{span="{name}"}} {stats.count}')
+            for metric, (help_text, attribute) in counters.items():
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} counter')
+                for name, stats in spans:
+                    lines.append(f'{metric}{{span="{name}"}} {getattr(stats, attribute)}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str = None, min_interval: float = None) -> bool:
+        """Escribir el archivo .prom de forma atómica (como mucho una vez cada min_interval segundos)"""
+        path = path or Config.METRICS_PROM_PATH
+        min_interval = Config.METRICS_EXPORT_INTERVAL if min_interval is None else min_interval
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_export < min_interval:
+                return False
+            self._last_export = now
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
+        return True
+
+    def reset(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+registry = Registry(Config.METRICS_WINDOW)
+
+def _count_rows(value) -> int:
+    if isinstance(value, (list, pd.DataFrame)):
+        return len(value)
+    return None
+
+@contextmanager
+def span(name: str, **fields):
+    """Medir un tramo; dentro se puede anotar con annotate(rows=..., bytes=...)"""
+    record = {'name': name, 'depth': 0, **fields}
+    parent = _current_span.get()
+    if parent is not None:
+        record['depth'] = parent['depth'] + 1
+    token = _current_span.set(record)
+    start = record['started'] = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        _current_span.reset(token)
+        registry.record(record)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append(record)
+
+def annotate(**fields) -> None:
+    """Añadir datos al tramo en curso; los contadores (bytes, cache_hits...) se suman"""
+    record = _current_span.get()
+    if record is None:
+        return
+    for key, value in fields.items():
+        if isinstance(value, (int, float)) and key != 'rows' and isinstance(record.get(key), (int, float)):
+            record[key] += value
+        else:
+            record[key] = value
+
+def instrumented(name: str = None):
+    """Decorador: mide la función y cuenta las filas del resultado (o, si no devuelve filas, las de la entrada)"""
+    def decorator(func: Callable):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name) as record:
+                result = func(*args, **kwargs)
+                if record.get('rows') is None:
+                    rows = _count_rows(result)
+                    if rows is None:
+                        rows = next((n for n in map(_count_rows, list(args) + list(kwargs.values())) if n is not None), None)
+                    record['rows'] = rows
+                return result
+        return wrapper
+    return decorator
+
+def start_trace() -> List[Dict[str, Any]]:
+    """Empezar la traza del rerun actual"""
+    trace = []
+    _trace.set(trace)
+    return trace
+
+def current_trace() -> List[Dict[str, Any]]:
+    return _trace.get() or []
+
+def trace_frame(trace: List[Dict[str, Any]] = None) -> pd.DataFrame:
+    """La traza como tabla, en orden de inicio y con sangría por anidamiento"""
+    trace = current_trace() if trace is None else trace
+    rows = [{
+        'tramo': '  ' * record['depth'] + record['name'],
+        'ms': record['seconds'] * 1000,
+        'filas': record.get('rows'),
+        'bytes': record.get('bytes'),
+        'caché': 'hit' if record.get('cache_hits') else ('miss' if record.get('cache_misses') else ''),
+        'error': record.get('error', '')
+    } for record in sorted(trace, key=lambda r: r.get('started', 0))]
+    return pd.DataFrame(rows)
+
+def render_debug_panel(trace: List[Dict[str, Any]] = None) -> None:
+    """Panel de tiempos al final de la página (solo con Config.DEBUG)"""
+    import streamlit as st
+
+    trace = current_trace() if trace is None else trace
+    with st.expander("🛠️ Instrumentación (debug)", expanded=False):
+        total = sum(record['seconds'] for record in trace if record['depth'] == 0)
+        st.caption(f"Rerun actual: {len(trace)} tramos, {total * 1000:.1f} ms")
+        if trace:
+            st.dataframe(trace_frame(trace), use_container_width=True, hide_index=True)
+        st.markdown("**Histórico del proceso (ventana deslizante)**")
+        st.dataframe(registry.summary(), use_container_width=True, hide_index=True)
\ No newline at end of file
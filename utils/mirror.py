@@ -0,0 +1,196 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from config import Config
+from utils.database import supabase_request, to_db_user_id, _map_transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transacciones (
+    id TEXT PRIMARY KEY,
+    usuario_id TEXT,
+    monto REAL,
+    descripcion TEXT,
+    categoria TEXT,
+    tipo TEXT,
+    fecha TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transacciones_usuario_fecha ON transacciones (usuario_id, fecha DESC, id DESC);
+CREATE TABLE IF NOT EXISTS metas (
+    id TEXT PRIMARY KEY,
+    usuario_id TEXT,
+    created_at TEXT,
+    datos TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_metas_usuario ON metas (usuario_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    clave TEXT PRIMARY KEY,
+    created_at TEXT,
+    ultimo_id TEXT,
+    sincronizado_en TEXT
+);
+"""
+
+TRANSACTION_FIELDS = ['id', 'usuario_id', 'monto', 'descripcion', 'categoria', 'tipo', 'fecha', 'created_at']
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+def connect(db_path: str = None) -> sqlite3.Connection:
+    """Abrir la réplica local (una conexión por llamada; WAL permite lecturas concurrentes)"""
+    db_path = db_path or Config.MIRROR_DB_PATH
+    if db_path != ':memory:' and os.path.dirname(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    with _schema_lock:
+        if db_path not in _schema_ready or db_path == ':memory:':
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            _schema_ready.add(db_path)
+    return conn
+
+def get_watermark(conn: sqlite3.Connection, key: str):
+    """Último (created_at, id) sincronizado para una clave"""
+    row = conn.execute('SELECT created_at, ultimo_id FROM sync_state WHERE clave = ?', (key,)).fetchone()
+    return (row['created_at'], row['ultimo_id']) if row else None
+
+def _sync_table(supabase_client, conn, table: str, key: str, filters: dict, store_page) -> int:
+    """Traer solo las filas posteriores a la marca de agua, por páginas ordenadas por (created_at, id)"""
+    watermark = get_watermark(conn, key)
+    synced = 0
+    while True:
+        params = {'select': '*', **filters, 'order': 'created_at.asc,id.asc',
+                  'limit': str(Config.TRANSACTIONS_PAGE_SIZE)}
+        if watermark is not None:
+            last_created, last_id = watermark
+            params['or'] = f'(created_at.gt."{last_created}",and(created_at.eq."{last_created}",id.gt."{last_id}"))'
+
+        page = supabase_request(supabase_client, 'GET', table, filters=params)
+        if page is None:
+            # Falla de red o del servidor: quien llama decide servir desde la réplica
+            raise ConnectionError(f"No se pudo sincronizar '{table}' con Supabase")
+        if not page:
+            break
+
+        watermark = (page[-1].get('created_at'), str(page[-1].get('id')))
+        # Filas y marca de agua se guardan en la misma transacción
+        with conn:
+            store_page(conn, page)
+            conn.execute(
+                'INSERT OR REPLACE INTO sync_state (clave, created_at, ultimo_id, sincronizado_en) VALUES (?, ?, ?, ?)',
+                (key, watermark[0], watermark[1], datetime.now().isoformat())
+            )
+        synced += len(page)
+        if len(page) < Config.TRANSACTIONS_PAGE_SIZE:
+            break
+    return synced
+
+def _store_transactions(conn, rows):
+    conn.executemany(
+        f"INSERT OR REPLACE INTO transacciones ({', '.join(TRANSACTION_FIELDS)}) VALUES ({', '.join('?' * len(TRANSACTION_FIELDS))})",
+        [tuple(str(row.get(f)) if f == 'id' else row.get(f) for f in TRANSACTION_FIELDS) for row in rows]
+    )
+
+def _store_goals(conn, rows):
+    conn.executemany(
+        'INSERT OR REPLACE INTO metas (id, usuario_id, created_at, datos) VALUES (?, ?, ?, ?)',
+        [(str(row.get('id')), row.get('usuario_id'), row.get('created_at'), json.dumps(row)) for row in rows]
+    )
+
+def sync_transactions(supabase_client, user_id: str = None, db_path: str = None) -> int:
+    """Sincronizar de forma incremental las transacciones (de un usuario o de toda la tabla)"""
+    db_user_id = to_db_user_id(user_id) if user_id else None
+    filters = {'usuario_id': f'eq.{db_user_id}'} if db_user_id else {}
+    conn = connect(db_path)
+    try:
+        return _sync_table(supabase_client, conn, 'transacciones', f"transacciones:{db_user_id or '*'}",
+                           filters, _store_transactions)
+    finally:
+        conn.close()
+
+def update_transactions(ids: list, values: dict, db_path: str = None) -> int:
+    """Aplicar a filas ya replicadas una edición hecha en Supabase (p. ej. un PATCH de categoría).
+
+    La marca de agua solo avanza con created_at, así que la sincronización incremental no
+    vería el cambio. Sin réplica en disco no hay nada que corregir. Devuelve las filas tocadas.
+    """
+    db_path = db_path or Config.MIRROR_DB_PATH
+    columns = [column for column in values if column in TRANSACTION_FIELDS and column != 'id']
+    if not ids or not columns or (db_path != ':memory:' and not os.path.exists(db_path)):
+        return 0
+    conn = connect(db_path)
+    try:
+        with conn:
+            cursor = conn.executemany(
+                f"UPDATE transacciones SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                [tuple(values[column] for column in columns) + (str(i),) for i in ids]
+            )
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+def sync_goals(supabase_client, user_id: str = None, db_path: str = None) -> int:
+    """Sincronizar de forma incremental las metas financieras"""
+    db_user_id = to_db_user_id(user_id) if user_id else None
+    filters = {'usuario_id': f'eq.{db_user_id}'} if db_user_id else {}
+    conn = connect(db_path)
+    try:
+        return _sync_table(supabase_client, conn, Config.GOALS_TABLE, f"metas:{db_user_id or '*'}",
+                           filters, _store_goals)
+    finally:
+        conn.close()
+
+def query_transactions(user_id: str, days: int = 90, transaction_type: str = None, category=None,
+                       db_path: str = None) -> list:
+    """Leer transacciones de la réplica local usando el índice (usuario_id, fecha)"""
+    clauses = ['usuario_id = ?']
+    params = [to_db_user_id(user_id)]
+    if days:
+        # La misma ventana que build_transaction_filters: sin transacciones con fecha futura
+        today = datetime.now().date()
+        clauses.append('fecha >= ? AND fecha <= ?')
+        params.extend([(today - timedelta(days=days)).isoformat(), today.isoformat()])
+    if transaction_type:
+        clauses.append('tipo = ?')
+        params.append({'income': 'ingreso', 'expense': 'gasto'}.get(transaction_type, transaction_type))
+    if category:
+        categories = list(category) if isinstance(category, (list, tuple, set)) else [category]
+        clauses.append(f"categoria IN ({', '.join('?' * len(categories))})")
+        params.extend(categories)
+
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT * FROM transacciones WHERE {' AND '.join(clauses)} ORDER BY fecha DESC, id DESC",
+            params
+        ).fetchall()
+    finally:
+        conn.close()
+    return [_map_transaction(dict(row)) for row in rows]
+
+def query_goals(user_id: str, db_path: str = None) -> list:
+    """Leer las metas de un usuario desde la réplica local"""
+    conn = connect(db_path)
+    try:
+        rows = conn.execute('SELECT datos FROM metas WHERE usuario_id = ? ORDER BY created_at',
+                            (to_db_user_id(user_id),)).fetchall()
+    finally:
+        conn.close()
+    return [json.loads(row['datos']) for row in rows]
+
+def read_through(supabase_client, user_id: str, days: int = 90, transaction_type: str = None, category=None,
+                 db_path: str = None):
+    """Sincronizar lo nuevo y leer de la réplica; si la red falla, se sirve lo último sincronizado.
+
+    Devuelve (transacciones, sincronizado) para que quien llama pueda avisar del modo sin conexión.
+    """
+    try:
+        sync_transactions(supabase_client, user_id, db_path)
+        synced = True
+    except ConnectionError:
+        synced = False
+    return query_transactions(user_id, days, transaction_type, category, db_path), synced
\ No newline at end of file
@@ -0,0 +1,221 @@
+import math
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from utils.categorizer import categorizer
+from utils.database import supabase_request, to_db_user_id
+from utils.instrumentation import instrumented, annotate
+
+PLAID_FIELDS = ['transaction_id', 'account_id', 'amount', 'date', 'name', 'merchant_name', 'category']
+# Orden de las columnas de 'transacciones' que produce la normalización
+PLAID_ROW_COLUMNS = ['usuario_id', 'monto', 'descripcion', 'categoria', 'tipo', 'fecha', Config.PLAID_ID_COLUMN]
+# Segunda función de hash del filtro de Bloom (SipHash con otra clave de 16 caracteres)
+SECOND_HASH_KEY = 'plaid-dedup-0002'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ids_plaid (
+    transaction_id TEXT PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+def plaid_items(payload: Any) -> List[Dict[str, Any]]:
+    """Transacciones de un payload: respuesta de /transactions/get, de /transactions/sync, lista o una suelta.
+
+    Un payload vacío (null) no trae transacciones; cualquier otra forma (un número, un texto,
+    'transactions' que no es lista) lanza ValueError en lugar de fallar más adelante.
+    """
+    if payload is None:
+        return []
+    if isinstance(payload, dict):
+        items = payload.get('transactions', payload.get('added', [payload]))
+    else:
+        items = payload
+    if not isinstance(items, list):
+        raise ValueError(f"Payload de Plaid inválido: se esperaba una lista de transacciones, no {type(items).__name__}")
+    return [item for item in items if isinstance(item, dict)]
+
+def normalize_plaid_transactions(payload: Any, user_id: str = None) -> pd.DataFrame:
+    """Filas de 'transacciones' a partir de una página de Plaid, columna a columna.
+
+    En Plaid un monto positivo es dinero que sale de la cuenta (gasto); la tabla guarda el
+    monto en positivo con su tipo. Sin user_id, el usuario es la cuenta (como en n8n).
+    La categoría la decide el categorizador (la de Plaid es solo el último recurso).
+    Un transaction_id repetido dentro de la página se queda con su primera aparición.
+    """
+    raw = pd.DataFrame(plaid_items(payload), columns=PLAID_FIELDS)
+    amount = pd.to_numeric(raw['amount'], errors='coerce')
+    raw, amount = raw[amount.notna()], amount[amount.notna()]
+    if raw.empty:
+        return pd.DataFrame(columns=PLAID_ROW_COLUMNS)
+
+    # UUID de usuario: una conversión por cuenta distinta, no por transacción
+    accounts = pd.Series(user_id, index=raw.index) if user_id else raw['account_id']
+    codes, uniques = pd.factorize(accounts, use_na_sentinel=False)
+    user_ids = np.array([to_db_user_id(account) for account in uniques], dtype=object)[codes]
+
+    transaction_ids = raw['transaction_id'].astype(object)
+    descriptions = raw['name'].fillna(raw['merchant_name']).fillna('').to_numpy(dtype=object)
+    types = np.where(amount.to_numpy() > 0, 'gasto', 'ingreso')
+    rows = pd.DataFrame({
+        'usuario_id': user_ids,
+        'monto': amount.abs().to_numpy(dtype='float64'),
+        'descripcion': descriptions,
+        'categoria': categorizer.categorize(descriptions, types, user_ids, raw['category'].to_numpy(dtype=object)),
+        'tipo': types,
+        'fecha': raw['date'].fillna(datetime.now().date().isoformat()).to_numpy(dtype=object),
+        Config.PLAID_ID_COLUMN: transaction_ids.where(transaction_ids.notna(), None).to_numpy(dtype=object)
+    })
+    has_id = rows[Config.PLAID_ID_COLUMN].notna()
+    repeated = has_id & rows[Config.PLAID_ID_COLUMN].duplicated()
+    return rows[~repeated].reset_index(drop=True)
+
+class TransactionIdIndex:
+    """Índice de los transaction_id de Plaid ya escritos: filtro de Bloom en memoria delante de un conjunto en SQLite.
+
+    La mayoría de los ids nuevos se descartan en el filtro (sin tocar disco); solo los que
+    el filtro da por vistos se confirman contra SQLite, así que un falso positivo nunca
+    descarta una transacción nueva. El filtro se reconstruye desde SQLite al primer uso.
+    """
+
+    def __init__(self, db_path: str, capacity: int, error_rate: float):
+        self.db_path = db_path
+        self.bits_count = max(64, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.bits_count / capacity * math.log(2)))
+        self.stats = {'consultados': 0, 'descartados_por_filtro': 0, 'confirmados_en_disco': 0, 'falsos_positivos': 0}
+        self._bits = None
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.db_path != ':memory:' and os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._schema_ready or self.db_path == ':memory:':
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _positions(self, ids: pd.Series) -> np.ndarray:
+        """Posiciones de cada id en el filtro (ids × hashes), por doble hash vectorizado"""
+        first = pd.util.hash_pandas_object(ids, index=False).to_numpy()
+        second = pd.util.hash_pandas_object(ids, index=False, hash_key=SECOND_HASH_KEY).to_numpy() | np.uint64(1)
+        steps = np.arange(self.hash_count, dtype=np.uint64)
+        return (first[:, None] + steps[None, :] * second[:, None]) % np.uint64(self.bits_count)
+
+    def _set_bits(self, ids: pd.Series) -> None:
+        positions = self._positions(ids).ravel()
+        masks = np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+        np.bitwise_or.at(self._bits, (positions >> np.uint64(3)).astype(np.intp), masks)
+
+    def _ensure_loaded(self, conn: sqlite3.Connection) -> None:
+        if self._bits is not None:
+            return
+        self._bits = np.zeros((self.bits_count + 7) // 8, dtype=np.uint8)
+        cursor = conn.execute('SELECT transaction_id FROM ids_plaid')
+        while True:
+            chunk = cursor.fetchmany(100000)
+            if not chunk:
+                return
+            self._set_bits(pd.Series([row[0] for row in chunk], dtype=object))
+
+    def seen(self, ids: pd.Series) -> np.ndarray:
+        """Máscara de los ids que ya se escribieron"""
+        ids = pd.Series(ids, dtype=object).reset_index(drop=True)
+        seen = np.zeros(len(ids), dtype=bool)
+        if ids.empty:
+            return seen
+        with self._lock:
+            conn = self._connect()
+            try:
+                self._ensure_loaded(conn)
+                positions = self._positions(ids)
+                bits = (self._bits[(positions >> np.uint64(3)).astype(np.intp)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+                maybe = bits.all(axis=1)
+                candidates = ids[maybe].tolist()
+                confirmed = set()
+                for start in range(0, len(candidates), 500):
+                    chunk = candidates[start:start + 500]
+                    confirmed.update(row[0] for row in conn.execute(
+                        f'SELECT transaction_id FROM ids_plaid WHERE transaction_id IN ({",".join("?" * len(chunk))})', chunk
+                    ))
+            finally:
+                conn.close()
+            seen[maybe] = ids[maybe].isin(confirmed).to_numpy()
+            self.stats['consultados'] += len(ids)
+            self.stats['descartados_por_filtro'] += int((~maybe).sum())
+            self.stats['confirmados_en_disco'] += int(seen.sum())
+            self.stats['falsos_positivos'] += int(maybe.sum() - seen.sum())
+        return seen
+
+    def add(self, ids) -> None:
+        """Marcar ids como escritos (solo después de que la inserción se confirmó)"""
+        ids = pd.Series([i for i in ids if i is not None], dtype=object)
+        if ids.empty:
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                self._ensure_loaded(conn)
+                with conn:
+                    conn.executemany('INSERT OR IGNORE INTO ids_plaid (transaction_id) VALUES (?)',
+                                     ((i,) for i in ids))
+                self._set_bits(ids)
+            finally:
+                conn.close()
+
+    def filter_new(self, rows: pd.DataFrame, column: str = None) -> pd.DataFrame:
+        """Quitar las filas cuyo transaction_id ya se escribió (las filas sin id se conservan)"""
+        column = column or Config.PLAID_ID_COLUMN
+        if rows.empty:
+            return rows
+        has_id = rows[column].notna().to_numpy()
+        seen = np.zeros(len(rows), dtype=bool)
+        seen[has_id] = self.seen(rows.loc[has_id, column])
+        return rows[~seen].reset_index(drop=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('DELETE FROM ids_plaid')
+            finally:
+                conn.close()
+            self._bits = None
+
+# Instancia única del proceso (el servicio de ingesta y las sincronizaciones comparten el índice)
+plaid_id_index = TransactionIdIndex(Config.PLAID_IDS_PATH, Config.PLAID_BLOOM_CAPACITY, Config.PLAID_BLOOM_ERROR_RATE)
+
+@instrumented()
+def sync_plaid_transactions(supabase_client, payload: Any, user_id: str = None, index: TransactionIdIndex = None,
+                            chunk_size: int = None) -> Dict[str, int]:
+    """Escribir una página de Plaid: normalizar, descartar lo ya escrito y hacer upsert solo de lo nuevo.
+
+    Re-sincronizar un periodo ya cargado no genera escrituras; el upsert con on_conflict
+    cubre la carrera entre dos sincronizaciones simultáneas de la misma página.
+    """
+    index = index or plaid_id_index
+    chunk_size = chunk_size or Config.BULK_INSERT_CHUNK_SIZE
+    rows = normalize_plaid_transactions(payload, user_id)
+    new_rows = index.filter_new(rows)
+    summary = {'recibidas': len(rows), 'duplicadas': len(rows) - len(new_rows), 'insertadas': 0, 'fallidas': 0}
+    records = new_rows.to_dict('records')
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        result = supabase_request(supabase_client, 'POST', 'transacciones', data=chunk,
+                                  filters={'on_conflict': Config.PLAID_ID_COLUMN},
+                                  prefer='resolution=ignore-duplicates,return=minimal')
+        if result is None:
+            summary['fallidas'] += len(chunk)
+            continue
+        summary['insertadas'] += len(chunk)
+        index.add(row[Config.PLAID_ID_COLUMN] for row in chunk)
+    annotate(rows=len(rows))
+    return summary
\ No newline at end of file
@@ -0,0 +1,258 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from io import BytesIO
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from config import Config
+from utils.artifacts import artifact_cache, artifact_key
+from utils.database import connect_supabase, iter_transaction_frames, transactions_fingerprint
+
+REPORT_FORMATS = ('PDF', 'CSV', 'Excel')
+MONTH_NAMES = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio',
+               'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+ACTIVE_STATUSES = ('en cola', 'en curso')
+
+class ReportQueueFull(RuntimeError):
+    """No se aceptan más trabajos (límite total o por usuario)"""
+
+def period_label(period: str = None) -> str:
+    """'2024-03' -> 'Marzo 2024'; sin periodo, la ventana por defecto de 90 días"""
+    if not period:
+        return 'Ultimos 90 dias'
+    year, month = period.split('-')
+    return f'{MONTH_NAMES[int(month) - 1]} {year}'
+
+def recent_periods(months: int = 12, today: date = None) -> List[str]:
+    """Los últimos meses como 'YYYY-MM', del más reciente al más antiguo"""
+    today = today or date.today()
+    year, month = today.year, today.month
+    periods = []
+    for _ in range(months):
+        periods.append(f'{year:04d}-{month:02d}')
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return periods
+
+def build_report_file(supabase_client, user_id: str, report_format: str, period: str = None) -> Optional[BinaryIO]:
+    """Generar el archivo del reporte; devuelve un archivo rebobinado o None si no hay datos"""
+    # fpdf y compañía solo se cargan al generar: la app y los procesos del pool arrancan sin ellos
+    from utils.reports import generate_financial_report, iter_csv_chunks, spool_export, stream_excel_export
+    
+    frames = iter_transaction_frames(supabase_client, user_id, period=period)
+    if report_format == 'CSV':
+        # Página a página hacia un archivo temporal: sin DataFrame completo ni string intermedio
+        csv_file, csv_size = spool_export(iter_csv_chunks(frames))
+        return csv_file if csv_size else None
+
+    if report_format == 'Excel':
+        # Filas escritas a medida que llegan las páginas (modo de memoria constante de xlsxwriter)
+        excel_file, excel_rows = stream_excel_export(frames)
+        return excel_file if excel_rows else None
+
+    frames = list(frames)
+    if not frames:
+        return None
+    transactions = pd.concat(frames, ignore_index=True)
+    if transactions.empty:
+        return None
+    pdf = generate_financial_report(user_id, transactions, period_label(period))
+    pdf_output = BytesIO()
+    pdf.output(pdf_output)
+    pdf_output.seek(0)
+    return pdf_output
+
+def render_report(user_id: str, period: str, report_format: str) -> Tuple[Optional[str], Optional[bytes]]:
+    """Trabajo de un proceso del pool: generar el reporte y dejarlo en la caché de artefactos.
+
+    Devuelve (clave, None) si el archivo quedó en disco, (None, bytes) si no hay huella
+    (sin conexión: no se cachea) y (None, None) si no hay datos.
+    """
+    supabase_client = connect_supabase()
+    fingerprint = transactions_fingerprint(supabase_client, user_id, period=period)
+    key = artifact_key(fingerprint, f'{report_format}|{period or "90d"}') if fingerprint else None
+    if key:
+        cached = artifact_cache.open(key)
+        if cached is not None:
+            cached.close()
+            return key, None
+
+    report = build_report_file(supabase_client, user_id, report_format, period)
+    if report is None:
+        return None, None
+    with report:
+        if key:
+            artifact_cache.put(key, report).close()
+            return key, None
+        return None, report.read()
+
+class ReportJob:
+    """Un reporte pedido por un usuario y su estado en el pool"""
+
+    def __init__(self, user_id: str, period: str, report_format: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.period = period
+        self.format = report_format
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.future = None
+        self.cancelled = False
+        self.key = None
+        self.data = None
+        self.empty = False
+        self.error = None
+
+    @property
+    def label(self) -> str:
+        return f'{self.format} · {period_label(self.period)}'
+
+    @property
+    def status(self) -> str:
+        if self.cancelled:
+            return 'cancelado'
+        if self.future is None or not self.future.done():
+            return 'en curso' if self.future is not None and self.future.running() else 'en cola'
+        if self.error:
+            return 'error'
+        return 'sin datos' if self.empty else 'listo'
+
+    def _finish(self, future) -> None:
+        self.finished_at = time.time()
+        if future.cancelled():
+            self.cancelled = True
+            return
+        error = future.exception()
+        if error is not None:
+            self.error = f'{type(error).__name__}: {error}'
+            return
+        self.key, self.data = future.result()
+        self.empty = self.key is None and self.data is None
+
+class ReportJobQueue:
+    """Cola de reportes compartida por todas las sesiones: genera en un pool de procesos fuera del hilo de Streamlit.
+
+    Los resultados quedan en la caché de artefactos (disco), así que los procesos solo devuelven la clave.
+    Los trabajos terminados se olvidan pasados ttl_seconds.
+    """
+
+    def __init__(self, workers: int, max_pending: int, max_per_user: int, ttl_seconds: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_per_user = max_per_user
+        self.ttl_seconds = ttl_seconds
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 'spawn': el servidor de Streamlit tiene hilos y no es seguro hacer fork de él
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def submit(self, user_id: str, period: str, report_format: str) -> ReportJob:
+        """Encolar un reporte; si ya hay uno igual activo se devuelve ese"""
+        if report_format not in REPORT_FORMATS:
+            raise ValueError(f'Formato no soportado: {report_format}')
+        with self._lock:
+            self._prune()
+            active = [job for job in self._jobs.values() if job.status in ACTIVE_STATUSES]
+            for job in active:
+                if (job.user_id, job.period, job.format) == (user_id, period, report_format):
+                    return job
+            if len(active) >= self.max_pending:
+                raise ReportQueueFull(f'Hay {len(active)} reportes en preparación; inténtalo en unos minutos')
+            if sum(job.user_id == user_id for job in active) >= self.max_per_user:
+                raise ReportQueueFull(f'Ya tienes {self.max_per_user} reportes en preparación')
+
+            job = ReportJob(user_id, period, report_format)
+            try:
+                job.future = self._pool().submit(render_report, user_id, period, report_format)
+            except BrokenProcessPool:
+                # Un proceso murió (p. ej. sin memoria): se descarta el pool y se crea otro
+                self._executor = None
+                job.future = self._pool().submit(render_report, user_id, period, report_format)
+            job.future.add_done_callback(job._finish)
+            self._jobs[job.id] = job
+            return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, user_id: str) -> List[ReportJob]:
+        """Trabajos de un usuario, del más reciente al más antiguo"""
+        with self._lock:
+            self._prune()
+            jobs = [job for job in self._jobs.values() if job.user_id == user_id]
+        return sorted(jobs, key=lambda job: job.submitted_at, reverse=True)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancelar un trabajo activo; si ya se está generando, el resultado se descarta al terminar"""
+        job = self.get(job_id)
+        if job is None or job.status not in ACTIVE_STATUSES:
+            return False
+        if not job.future.cancel():
+            job.cancelled = True
+            job.finished_at = time.time()
+        return True
+
+    def open_result(self, job: ReportJob) -> Optional[BinaryIO]:
+        """Abrir el archivo de un trabajo listo (None si no terminó o si la caché ya lo expulsó)"""
+        if job.status != 'listo':
+            return None
+        if job.key:
+            return artifact_cache.open(job.key)
+        return BytesIO(job.data)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+# Instancia única del proceso: las sesiones de Streamlit comparten el pool
+report_jobs = ReportJobQueue(Config.REPORT_WORKERS, Config.REPORT_MAX_PENDING,
+                             Config.REPORT_MAX_JOBS_PER_USER, Config.REPORT_JOB_TTL_SECONDS)
+
+def pregenerate_monthly_reports(user_ids: Iterable[str], period: str, formats: Iterable[str] = ('PDF',),
+                                workers: int = None) -> Iterator[Tuple[str, str, str]]:
+    """Generar por adelantado los reportes de un mes para muchos usuarios.
+
+    Entrega (usuario, formato, estado) a medida que terminan; como mucho 2 trabajos por proceso
+    en vuelo, así que la lista de usuarios puede ser un generador de cualquier tamaño.
+    """
+    workers = workers or Config.REPORT_WORKERS
+    formats = tuple(formats)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def drain(limit):
+            while len(pending) > limit:
+                done = next(as_completed(pending))
+                user_id, report_format = pending.pop(done)
+                try:
+                    key, data = done.result()
+                    status = 'listo' if key or data else 'sin datos'
+                except Exception as e:
+                    status = f'error: {e}'
+                yield user_id, report_format, status
+
+        for user_id in user_ids:
+            for report_format in formats:
+                pending[executor.submit(render_report, user_id, period, report_format)] = (user_id, report_format)
+                yield from drain(workers * 2)
+        yield from drain(0)
\ No newline at end of file
@@ -3,6 +3,12 @@ import pandas as pd
 from datetime import datetime
 from io import BytesIO
 import base64
+import tempfile
+from typing import Iterable, Iterator
+
+from config import Config
+
+from utils.instrumentation import instrumented, annotate
 
 class PDFReport(FPDF):
     def header(self):
@@ -39,23 +45,27 @@ class PDFReport(FPDF):
                 self.cell(col_width, 10, item_str, 1, 0, 'C')
             self.ln()
 
-def generate_financial_report(user_id: str, transactions: list) -> PDFReport:
+@instrumented()
+def generate_financial_report(user_id: str, transactions: list, period_label: str = 'Ultimos 90 dias') -> PDFReport:
     pdf = PDFReport()
     pdf.add_page()
     pdf.chapter_title('Resumen Ejecutivo')
     
-    if transactions:
-        df = pd.DataFrame(transactions)
+    has_data = transactions is not None and len(transactions) > 0
+    if has_data:
+        # Acepta la lista de dicts o el DataFrame tipado del cargador columnar
+        df = transactions.copy(deep=False) if isinstance(transactions, pd.DataFrame) else pd.DataFrame(transactions)
         
         # Asegurar que tenemos la columna de monto y tipo
         amount_column = 'amount' if 'amount' in df.columns else 'monto'
         type_column = 'transaction_type' if 'transaction_type' in df.columns else 'tipo'
         
         # Convertir tipos de datos
-        try:
-            df[amount_column] = pd.to_numeric(df[amount_column])
-        except:
-            df[amount_column] = 0
+        if df[amount_column].dtype != 'float64':
+            try:
+                df[amount_column] = pd.to_numeric(df[amount_column])
+            except:
+                df[amount_column] = 0
             
         # Calcular métricas básicas
         if type_column in df.columns:
@@ -70,7 +80,7 @@ def generate_financial_report(user_id: str, transactions: list) -> PDFReport:
         savings_rate = (net_savings / monthly_income * 100) if monthly_income > 0 else 0
         
         pdf.chapter_body(f"""
-        Periodo analizado: Ultimos 90 dias
+        Periodo analizado: {period_label}
         Total de transacciones: {len(transactions)}
         Ingresos totales: ${monthly_income:,.2f}
         Gastos totales: ${monthly_expenses:,.2f}
@@ -80,9 +90,12 @@ def generate_financial_report(user_id: str, transactions: list) -> PDFReport:
     else:
         pdf.chapter_body("No hay datos de transacciones para generar el reporte.")
     
-    if transactions:
+    if has_data:
         pdf.chapter_title('Analisis de Gastos por Categoria')
-        df_expenses = pd.DataFrame([t for t in transactions if t.get('transaction_type') == 'expense' or t.get('tipo') == 'gasto'])
+        if isinstance(transactions, pd.DataFrame):
+            df_expenses = transactions[transactions['transaction_type'] == 'expense'] if 'transaction_type' in transactions.columns else transactions.iloc[0:0]
+        else:
+            df_expenses = pd.DataFrame([t for t in transactions if t.get('transaction_type') == 'expense' or t.get('tipo') == 'gasto'])
         if not df_expenses.empty:
             # Usar la columna correcta para categoría
             category_column = 'category' if 'category' in df_expenses.columns else 'categoria'
@@ -90,8 +103,8 @@ def generate_financial_report(user_id: str, transactions: list) -> PDFReport:
             
             if category_column in df_expenses.columns and amount_column in df_expenses.columns:
                 try:
-                    df_expenses[amount_column] = pd.to_numeric(df_expenses[amount_column])
-                    expenses_by_category = df_expenses.groupby(category_column)[amount_column].sum().sort_values(ascending=False)
+                    amounts = pd.to_numeric(df_expenses[amount_column])
+                    expenses_by_category = amounts.groupby(df_expenses[category_column], observed=True).sum().sort_values(ascending=False)
                     table_data = []
                     for category, amount in expenses_by_category.items():
                         table_data.append([str(category), f"${amount:,.2f}"])
@@ -122,22 +135,135 @@ def generate_financial_report(user_id: str, transactions: list) -> PDFReport:
     """)
     return pdf
 
-def create_csv_export(transactions: list) -> str:
-    if not transactions:
+@instrumented()
+def create_csv_export(transactions) -> str:
+    if transactions is None or len(transactions) == 0:
         return ""
-    df = pd.DataFrame(transactions)
+    df = transactions if isinstance(transactions, pd.DataFrame) else pd.DataFrame(transactions)
     return df.to_csv(index=False)
 
-def create_excel_export(transactions: list) -> BytesIO:
-    if not transactions:
+def iter_frame_slices(df: pd.DataFrame, rows: int = None) -> Iterator[pd.DataFrame]:
+    """Partir un DataFrame ya cargado en bloques de `rows` filas (vistas, sin copiar)"""
+    rows = rows or Config.TRANSACTIONS_PAGE_SIZE
+    for start in range(0, len(df), rows):
+        yield df.iloc[start:start + rows]
+
+def iter_csv_chunks(frames: Iterable[pd.DataFrame], encoding: str = 'utf-8') -> Iterator[bytes]:
+    """Convertir un flujo de DataFrames (p. ej. una página cada uno) en bloques de bytes CSV.
+
+    La cabecera sale solo con el primer bloque y todas las páginas usan sus columnas,
+    así que la memoria depende del tamaño de página y no del total de filas.
+    """
+    columns = None
+    for frame in frames:
+        if frame is None or len(frame) == 0:
+            continue
+        header = columns is None
+        if header:
+            columns = list(frame.columns)
+        yield frame.reindex(columns=columns).to_csv(index=False, header=header, date_format='%Y-%m-%d').encode(encoding)
+
+@instrumented()
+def spool_export(chunks: Iterable[bytes], max_memory: int = None) -> tuple:
+    """Escribir los bloques en un archivo temporal (en memoria hasta max_memory, luego en disco).
+
+    Devuelve (archivo rebobinado, bytes escritos).
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory or Config.EXPORT_SPOOL_BYTES)
+    written = 0
+    for chunk in chunks:
+        spool.write(chunk)
+        written += len(chunk)
+    spool.seek(0)
+    annotate(bytes=written)
+    return spool, written
+
+# Columnas que se exportan con formato de moneda
+MONEY_COLUMNS = {'amount', 'monto'}
+
+def _excel_column(series: pd.Series, name: str) -> tuple:
+    """(tipo de celda, valores como objetos de Python con None para vacíos) de una columna"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'date', [None if pd.isna(v) else v for v in series.dt.to_pydatetime()]
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.astype('float64')
+        return ('money' if name in MONEY_COLUMNS else 'number'), values.astype(object).where(values.notna(), None).tolist()
+    values = series.astype(object)
+    return 'text', values.where(values.notna(), None).tolist()
+
+def write_excel_export(frames: Iterable[pd.DataFrame], output, rows_per_sheet: int = None) -> int:
+    """Escribir un flujo de DataFrames en un .xlsx fila a fila con el modo de memoria constante de xlsxwriter.
+
+    Montos con formato de moneda y fechas con formato de fecha; al llegar al límite de filas
+    de Excel se continúa en otra hoja. Devuelve las filas escritas.
+    """
+    import xlsxwriter
+    
+    rows_per_sheet = rows_per_sheet or Config.EXCEL_ROWS_PER_SHEET
+    # Las descripciones vienen de fuentes externas: nunca interpretarlas como fórmulas ni URLs
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True, 'strings_to_formulas': False, 'strings_to_urls': False, 'strings_to_numbers': False,
+        'nan_inf_to_errors': True
+    })
+    formats = {
+        'header': workbook.add_format({'bold': True, 'bg_color': '#C8DCFF'}),
+        'money': workbook.add_format({'num_format': '$#,##0.00'}),
+        'date': workbook.add_format({'num_format': 'yyyy-mm-dd'}),
+    }
+    widths = {'money': 14, 'date': 12, 'number': 12, 'text': 24}
+    
+    columns, kinds, worksheet, row, total = None, None, None, 0, 0
+    for frame in frames:
+        if frame is None or len(frame) == 0:
+            continue
+        if columns is None:
+            columns = list(frame.columns)
+        if list(frame.columns) != columns:
+            frame = frame.reindex(columns=columns)
+        data = [_excel_column(frame[column], column) for column in columns]
+        kinds = [kind for kind, _ in data]
+        
+        for i in range(len(frame)):
+            if worksheet is None or row > rows_per_sheet:
+                sheet_number = len(workbook.worksheets()) + 1
+                worksheet = workbook.add_worksheet('Transacciones' if sheet_number == 1 else f'Transacciones {sheet_number}')
+                for col, kind in enumerate(kinds):
+                    worksheet.set_column(col, col, widths[kind])
+                worksheet.write_row(0, 0, columns, formats['header'])
+                row = 1
+            for col, (kind, values) in enumerate(data):
+                value = values[i]
+                if value is None:
+                    continue
+                if kind == 'text':
+                    worksheet.write_string(row, col, str(value))
+                elif kind == 'date':
+                    worksheet.write_datetime(row, col, value, formats['date'])
+                else:
+                    worksheet.write_number(row, col, value, formats.get(kind))
+            row += 1
+        total += len(frame)
+    
+    if worksheet is None:
+        workbook.add_worksheet('Transacciones')
+    workbook.close()
+    return total
+
+@instrumented()
+def stream_excel_export(frames: Iterable[pd.DataFrame], max_memory: int = None) -> tuple:
+    """Generar el .xlsx en un archivo temporal; devuelve (archivo rebobinado, filas escritas)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory or Config.EXPORT_SPOOL_BYTES)
+    rows = write_excel_export(frames, spool)
+    annotate(bytes=spool.tell(), rows=rows)
+    spool.seek(0)
+    return spool, rows
+
+@instrumented()
+def create_excel_export(transactions) -> BytesIO:
+    if transactions is None or len(transactions) == 0:
         return BytesIO()
-    df = pd.DataFrame(transactions)
+    df = transactions if isinstance(transactions, pd.DataFrame) else pd.DataFrame(transactions)
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name='Transacciones', index=False)
-        workbook = writer.book
-        worksheet = writer.sheets['Transacciones']
-        money_format = workbook.add_format({'num_format': '$#,##0.00'})
-        worksheet.set_column('D:D', 12, money_format)
+    write_excel_export(iter_frame_slices(df), output)
     output.seek(0)
     return output
\ No newline at end of file
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from config import Config
+from utils.database import to_db_user_id
+
+MERCHANTS_PER_CATEGORY = 25
+INCOME_SHARE = 0.12
+
+def generate_transactions_frame(n_rows: int, n_users: int = 100, days: int = 365, seed: int = 42,
+                                end_date: datetime = None) -> pd.DataFrame:
+    """Generar transacciones sintéticas reproducibles con el esquema de la tabla 'transacciones'.
+
+    Todo se genera de forma vectorizada, así que escala a millones de filas. Las categorías
+    salen de Config.INCOME_CATEGORIES / Config.EXPENSE_CATEGORIES y cada categoría tiene un
+    conjunto fijo de comercios para que existan gastos recurrentes.
+    """
+    rng = np.random.default_rng(seed)
+    end_date = pd.Timestamp(end_date or datetime.now()).normalize()
+
+    # Pocos usuarios concentran muchas transacciones (distribución sesgada, como en producción)
+    user_weights = rng.pareto(1.5, n_users) + 1
+    user_index = rng.choice(n_users, size=n_rows, p=user_weights / user_weights.sum())
+    user_ids = np.array([to_db_user_id(f'user_{i:06d}') for i in range(n_users)], dtype=object)
+
+    is_income = rng.random(n_rows) < INCOME_SHARE
+    income_categories = np.array(Config.INCOME_CATEGORIES, dtype=object)
+    expense_categories = np.array(Config.EXPENSE_CATEGORIES, dtype=object)
+    category = np.where(
+        is_income,
+        income_categories[rng.integers(0, len(income_categories), n_rows)],
+        expense_categories[rng.integers(0, len(expense_categories), n_rows)]
+    )
+
+    # Descripciones: '<categoría> - Comercio <k>' tomadas de un catálogo fijo
+    all_categories = np.concatenate([income_categories, expense_categories])
+    catalog = np.array([f'{c} - Comercio {k}' for c in all_categories for k in range(MERCHANTS_PER_CATEGORY)],
+                       dtype=object)
+    category_position = pd.Index(all_categories).get_indexer(category)
+    description = catalog[category_position * MERCHANTS_PER_CATEGORY + rng.integers(0, MERCHANTS_PER_CATEGORY, n_rows)]
+
+    amount = np.where(is_income, rng.lognormal(7.2, 0.5, n_rows), rng.lognormal(3.6, 1.0, n_rows)).round(2)
+    date = end_date - pd.to_timedelta(rng.integers(0, days, n_rows), unit='D')
+    created_at = date + pd.to_timedelta(rng.integers(0, 86_400, n_rows), unit='s')
+
+    return pd.DataFrame({
+        'id': pd.RangeIndex(n_rows).astype(str),
+        'usuario_id': user_ids[user_index],
+        'monto': amount,
+        'descripcion': description,
+        'categoria': category,
+        'tipo': np.where(is_income, 'ingreso', 'gasto'),
+        'fecha': date,
+        'created_at': created_at
+    })
+
+def generate_transactions(n_rows: int, n_users: int = 1, days: int = 365, seed: int = 42) -> list:
+    """Generar transacciones sintéticas como lista de dicts crudos (igual que la respuesta de PostgREST)"""
+    df = generate_transactions_frame(n_rows, n_users, days, seed)
+    df['fecha'] = df['fecha'].dt.strftime('%Y-%m-%d')
+    df['created_at'] = df['created_at'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return df.to_dict('records')
\ No newline at end of file
@@ -0,0 +1,98 @@
+import plotly.graph_objects as go
+import streamlit as st
+
+from utils.analysis import calculate_financial_metrics, generate_ai_recommendations
+from utils.anomalies import get_anomaly_alerts
+from utils.async_database import load_page_data
+from utils.forecasting import get_user_forecast
+from utils.instrumentation import instrumented
+
+@instrumented()
+def show_ai_analysis(supabase_client, user_id):
+    st.title("📈 Análisis con IA")
+    
+    # Obtener datos para análisis (transacciones como DataFrame tipado y metas, en paralelo)
+    transactions, goals = load_page_data(supabase_client, user_id, as_frame=True)
+    
+    if len(transactions) == 0:
+        st.warning("Necesitas agregar transacciones para generar análisis.")
+        return
+    
+    # Métricas avanzadas
+    metrics = calculate_financial_metrics(transactions)
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # Análisis de patrones de gasto
+        st.subheader("🔍 Patrones de Gastos")
+        
+        if metrics.get('spending_patterns'):
+            for pattern in metrics['spending_patterns']:
+                st.write(f"• {pattern}")
+        else:
+            st.info("No se detectaron patrones específicos")
+        
+        # Alertas inteligentes: gastos inusuales detectados al insertar + umbrales del mes
+        st.subheader("🚨 Alertas Inteligentes")
+        alerts = get_anomaly_alerts(supabase_client, user_id) + metrics.get('alerts', [])
+        if alerts:
+            for alert in alerts:
+                if alert['severity'] == 'high':
+                    st.error(f"⚠️ {alert['message']}")
+                elif alert['severity'] == 'medium':
+                    st.warning(f"🔶 {alert['message']}")
+                else:
+                    st.info(f"ℹ️ {alert['message']}")
+        else:
+            st.success("✅ No hay alertas críticas")
+    
+    with col2:
+        # Recomendaciones personalizadas
+        st.subheader("💡 Recomendaciones Personalizadas")
+        recommendations = generate_ai_recommendations(metrics, goals)
+        
+        if recommendations:
+            for rec in recommendations:
+                emoji = "💰" if rec['type'] == 'savings' else "📊" if rec['type'] == 'investment' else "🎯"
+                st.write(f"{emoji} **{rec['title']}**")
+                st.write(rec['description'])
+                st.divider()
+        else:
+            st.info("No hay recomendaciones disponibles")
+    
+    # Análisis predictivo
+    st.subheader("🔮 Análisis Predictivo")
+    
+    if st.button("Generar Proyección Financiera"):
+        with st.spinner("Ajustando modelos por categoría..."):
+            # Suavizado exponencial por categoría sobre los totales mensuales (cacheado hasta que haya datos nuevos)
+            projection = get_user_forecast(supabase_client, user_id, horizon=6)
+        
+        if projection is None:
+            st.info("Se necesita al menos un mes de transacciones para proyectar.")
+            return
+        
+        history, forecast = projection['history'], projection['forecast']
+        fig = go.Figure()
+        series = [('ahorro', 'Ahorro', '#2ca02c'), ('ingresos', 'Ingresos', '#1f77b4'), ('gastos', 'Gastos', '#d62728')]
+        for column, name, color in series:
+            fig.add_trace(go.Scatter(x=history['mes'], y=history[column], name=f"{name} (histórico)",
+                                     line=dict(color=color)))
+            fig.add_trace(go.Scatter(x=forecast['mes'], y=forecast[f'{column}_max'], line=dict(width=0),
+                                     showlegend=False, hoverinfo='skip'))
+            fig.add_trace(go.Scatter(x=forecast['mes'], y=forecast[f'{column}_min'], line=dict(width=0),
+                                     fill='tonexty', fillcolor=color, opacity=0.2, showlegend=False, hoverinfo='skip'))
+            fig.add_trace(go.Scatter(x=forecast['mes'], y=forecast[column], name=f"{name} proyectado",
+                                     line=dict(color=color, dash='dash')))
+        fig.update_layout(title="Proyección Financiera - Próximos 6 Meses", xaxis_title="Mes", yaxis_title="Monto ($)")
+        st.plotly_chart(fig, use_container_width=True)
+        
+        model = "Holt-Winters estacional" if projection['seasonal'] else "suavizado exponencial con tendencia"
+        st.caption(f"Modelo: {model} por categoría, ajustado con {len(history)} meses de historial. "
+                   f"Bandas al {projection['interval']:.0%}.")
+        
+        st.subheader("Próximo Mes por Categoría")
+        st.dataframe(projection['categories'].style.format({
+            'próximo mes': '${:,.2f}', 'mínimo': '${:,.2f}', 'máximo': '${:,.2f}'
+        }), use_container_width=True, hide_index=True)
\ No newline at end of file
@@ -0,0 +1,97 @@
+import streamlit as st
+import plotly.express as px
+
+from utils.aggregates import get_user_aggregates
+from utils.analysis import calculate_financial_metrics, generate_ai_recommendations
+from utils.database import get_financial_goals
+from utils.instrumentation import instrumented
+
+@instrumented()
+def show_dashboard(supabase_client, user_id):
+    st.markdown('<div class="main-header">💰 Dashboard Financiero</div>', unsafe_allow_html=True)
+    
+    # Métricas desde los agregados incrementales (solo se recorre el historial al reconstruirlos),
+    # recortados a la misma ventana de 90 días que usaba la consulta de transacciones
+    goals = get_financial_goals(supabase_client, user_id)
+    metrics = calculate_financial_metrics(aggregates=get_user_aggregates(supabase_client, user_id).window(90))
+    
+    # Mostrar métricas principales
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric(
+            "Ingresos Mensuales",
+            f"${metrics.get('monthly_income', 0):,.2f}",
+            delta=f"+${metrics.get('income_growth', 0):.2f}" if metrics.get('income_growth', 0) > 0 else f"-${abs(metrics.get('income_growth', 0)):.2f}"
+        )
+    
+    with col2:
+        st.metric(
+            "Gastos Mensuales",
+            f"${metrics.get('monthly_expenses', 0):,.2f}",
+            delta=f"+${metrics.get('expense_growth', 0):.2f}" if metrics.get('expense_growth', 0) > 0 else f"-${abs(metrics.get('expense_growth', 0)):.2f}",
+            delta_color="inverse"
+        )
+    
+    with col3:
+        st.metric(
+            "Ahorro Neto",
+            f"${metrics.get('net_savings', 0):,.2f}",
+            delta=f"{metrics.get('savings_rate', 0):.1f}%"
+        )
+    
+    with col4:
+        health_trend = metrics.get('health_trend', '')
+        delta_value = None
+        if health_trend:
+            try:
+                delta_value = f"{health_trend}"
+            except:
+                delta_value = health_trend
+        st.metric(
+            "Salud Financiera",
+            metrics.get('financial_health', 'N/A'),
+            delta=delta_value
+        )
+    
+    # Gráficos y análisis
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # Gráfico de gastos por categoría
+        if metrics.get('expenses_by_category'):
+            fig_expenses = px.pie(
+                values=list(metrics['expenses_by_category'].values()),
+                names=list(metrics['expenses_by_category'].keys()),
+                title="Distribución de Gastos por Categoría"
+            )
+            st.plotly_chart(fig_expenses, use_container_width=True)
+        else:
+            st.info("No hay datos de gastos para mostrar")
+    
+    with col2:
+        # Tendencias mensuales
+        if metrics.get('monthly_trends'):
+            fig_trend = px.line(
+                x=list(metrics['monthly_trends'].keys()),
+                y=list(metrics['monthly_trends'].values()),
+                title="Tendencia de Ahorro Mensual",
+                labels={'x': 'Mes', 'y': 'Ahorro ($)'}
+            )
+            st.plotly_chart(fig_trend, use_container_width=True)
+        else:
+            st.info("No hay datos de tendencias para mostrar")
+    
+    # Recomendaciones IA
+    st.subheader("🤖 Recomendaciones de IA")
+    recommendations = generate_ai_recommendations(metrics, goals)
+    
+    if recommendations:
+        for i, rec in enumerate(recommendations[:3]):
+            with st.expander(f"💡 Recomendación {i+1}: {rec['title']}"):
+                st.write(rec['description'])
+                if rec.get('action'):
+                    if st.button(f"Implementar: {rec['action']}", key=f"action_{i}"):
+                        st.success(f"Acción '{rec['action']}' implementada")
+    else:
+        st.info("No hay recomendaciones disponibles en este momento")
\ No newline at end of file
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import streamlit as st
+
+from utils.database import get_financial_goals
+from utils.instrumentation import instrumented
+
+@instrumented()
+def show_financial_goals(supabase_client, user_id):
+    st.title("🎯 Metas Financieras")
+    
+    # Formulario para crear meta
+    with st.form("goal_form"):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            title = st.text_input("Título de la Meta")
+            target_amount = st.number_input("Monto Objetivo", min_value=0.01, step=0.01, format="%.2f")
+            category = st.selectbox(
+                "Categoría de la Meta",
+                ["Ahorro Emergencia", "Vacaciones", "Automóvil", "Casa", "Educación", 
+                 "Inversiones", "Retiro", "Otros"]
+            )
+        
+        with col2:
+            deadline = st.date_input("Fecha Límite", min_value=datetime.now().date())
+            current_amount = st.number_input("Monto Actual", min_value=0.0, step=0.01, format="%.2f")
+            priority = st.select_slider("Prioridad", options=["Baja", "Media", "Alta"])
+        
+        submitted = st.form_submit_button("Crear Meta")
+        
+        if submitted:
+            try:
+                # Para demostración, mostramos un mensaje ya que no tenemos la tabla en BD
+                st.success("✅ Meta creada exitosamente (modo demostración)")
+                st.info("En una implementación completa, esto se guardaría en la base de datos")
+            except Exception as e:
+                st.error(f"❌ Error: {e}")
+    
+    # Mostrar metas existentes
+    goals = get_financial_goals(supabase_client, user_id)
+    
+    if goals:
+        for goal in goals:
+            # Usar nombres de campos consistentes
+            target = goal.get('target_amount') or goal.get('monto_objetivo', 1)
+            current = goal.get('current_amount') or goal.get('monto_actual', 0)
+            progress = (current / target) * 100 if target > 0 else 0
+            
+            col1, col2 = st.columns([3, 1])
+            
+            with col1:
+                goal_title = goal.get('title') or goal.get('titulo', 'Meta sin título')
+                st.subheader(goal_title)
+                st.progress(progress / 100)
+                st.write(f"**Progreso:** ${current:,.2f} / ${target:,.2f} ({progress:.1f}%)")
+                
+                goal_category = goal.get('category') or goal.get('categoria', 'Sin categoría')
+                goal_priority = goal.get('priority') or goal.get('prioridad', 'Media')
+                goal_deadline = goal.get('deadline') or goal.get('fecha_limite', 'No definida')
+                
+                st.write(f"**Categoría:** {goal_category} | **Prioridad:** {goal_priority}")
+                st.write(f"**Fecha límite:** {goal_deadline}")
+            
+            with col2:
+                # Actualizar progreso (solo demostración)
+                new_amount = st.number_input(
+                    "Actualizar monto",
+                    min_value=0.0,
+                    value=float(current),
+                    key=f"update_{goal.get('id', 'unknown')}"
+                )
+                if st.button("Actualizar", key=f"btn_{goal.get('id', 'unknown')}"):
+                    st.success("Monto actualizado (modo demostración)")
+                    st.experimental_rerun()
+            
+            st.divider()
+    else:
+        st.info("No tienes metas financieras configuradas. ¡Crea tu primera meta!")
\ No newline at end of file
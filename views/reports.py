@@ -0,0 +1,111 @@
+import streamlit as st
+
+from utils.analysis import calculate_financial_metrics, generate_ai_recommendations
+from utils.async_database import load_page_data
+from utils.instrumentation import instrumented
+from utils.report_jobs import report_jobs, ReportQueueFull, period_label, recent_periods
+
+@instrumented()
+def show_reports(supabase_client, user_id):
+    st.title("📊 Reportes y Exportación")
+    
+    # Generar reporte financiero
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.subheader("Reporte Mensual")
+        
+        months = {period_label(period): period for period in recent_periods()}
+        report_month = st.selectbox(
+            "Seleccionar Mes",
+            options=list(months)
+        )
+        
+        if st.button("📄 Generar PDF del Mes"):
+            submit_report_job(user_id, months[report_month], "PDF")
+        
+        if st.button("📈 Generar Reporte Detallado"):
+            transactions, goals = load_page_data(supabase_client, user_id, as_frame=True)
+            metrics = calculate_financial_metrics(transactions)
+            
+            # Mostrar resumen
+            st.subheader("Resumen Ejecutivo")
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                st.metric("Ingresos Totales", f"${metrics.get('monthly_income', 0):,.2f}")
+            with col2:
+                st.metric("Gastos Totales", f"${metrics.get('monthly_expenses', 0):,.2f}")
+            with col3:
+                st.metric("Tasa de Ahorro", f"{metrics.get('savings_rate', 0):.1f}%")
+            
+            # Mostrar recomendaciones
+            st.subheader("Recomendaciones Principales")
+            recommendations = generate_ai_recommendations(metrics, goals)
+            for rec in recommendations[:2]:
+                st.write(f"**{rec['title']}**")
+                st.write(rec['description'])
+                st.divider()
+    
+    with col2:
+        st.subheader("Exportar Datos")
+        
+        export_format = st.radio(
+            "Formato de Exportación",
+            ["PDF", "CSV", "Excel"]
+        )
+        
+        if st.button("📤 Exportar Datos"):
+            # Últimos 90 días, como siempre; la generación corre en el pool de reportes
+            submit_report_job(user_id, None, export_format)
+    
+    show_report_jobs(user_id)
+
+EXPORT_FILES = {
+    "PDF": ("reporte_financiero.pdf", "application/pdf"),
+    "CSV": ("transacciones.csv", "text/csv"),
+    "Excel": ("transacciones.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+def submit_report_job(user_id, period, report_format):
+    """Encolar un reporte sin bloquear la sesión (se descarga desde la lista de reportes)"""
+    try:
+        job = report_jobs.submit(user_id, period, report_format)
+        st.info(f"⏳ {job.label}: en preparación. Puedes seguir usando la aplicación.")
+    except ReportQueueFull as e:
+        st.warning(f"⚠️ {e}")
+    except Exception as e:
+        st.error(f"❌ Error encolando el reporte: {e}")
+
+def show_report_jobs(user_id, limit=5):
+    """Estado de los reportes del usuario: descarga de los listos y cancelación de los pendientes"""
+    jobs = report_jobs.jobs_for(user_id)[:limit]
+    if not jobs:
+        return
+    
+    st.subheader("📋 Reportes Solicitados")
+    st.button("🔄 Actualizar Estado")
+    for job in jobs:
+        col1, col2 = st.columns([3, 1])
+        status = job.status
+        with col1:
+            st.write(f"**{job.label}** — {status}")
+            if status == 'error':
+                st.caption(job.error)
+        with col2:
+            if status in ('en cola', 'en curso'):
+                if st.button("✖️ Cancelar", key=f"cancel_{job.id}"):
+                    report_jobs.cancel(job.id)
+                    st.rerun()
+            elif status == 'listo':
+                artifact = report_jobs.open_result(job)
+                if artifact is None:
+                    st.caption("Archivo expirado, vuelve a generarlo")
+                    continue
+                file_name, mime = EXPORT_FILES[job.format]
+                if job.period:
+                    file_name = file_name.replace('.', f'_{job.period}.', 1)
+                # Streamlit 1.28 solo acepta bytes o archivos en disco: se leen una vez y se sirven por HTTP
+                with artifact:
+                    st.download_button("⬇️ Descargar", data=artifact.read(), file_name=file_name, mime=mime,
+                                       key=f"download_{job.id}")
\ No newline at end of file
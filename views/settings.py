@@ -0,0 +1,40 @@
+import streamlit as st
+
+from utils.instrumentation import instrumented
+
+@instrumented()
+def show_settings(supabase_client, user_id):
+    st.title("⚙️ Configuración")
+    
+    # Configuración de perfil
+    st.subheader("👤 Perfil de Usuario")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.text_input("Nombre", value="Usuario Demo")
+        st.text_input("Email", value="usuario@demo.com")
+        st.selectbox("Moneda Principal", ["USD", "EUR", "MXN", "COP"])
+    
+    with col2:
+        st.selectbox("Idioma", ["Español", "English"])
+        st.selectbox("Formato de Fecha", ["DD/MM/YYYY", "MM/DD/YYYY", "YYYY-MM-DD"])
+        st.number_input("Meta de Ahorro Mensual", min_value=0, value=500)
+    
+    # Configuración de notificaciones
+    st.subheader("🔔 Notificaciones")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.checkbox("Alertas de gastos excesivos", value=True)
+        st.checkbox("Recordatorios de metas", value=True)
+        st.checkbox("Resumen semanal", value=True)
+    
+    with col2:
+        st.checkbox("Noticias financieras", value=False)
+        st.checkbox("Ofertas de inversión", value=False)
+        st.checkbox("Actualizaciones de la app", value=True)
+    
+    if st.button("💾 Guardar Configuración"):
+        st.success("Configuración guardada exitosamente!")
\ No newline at end of file
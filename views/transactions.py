@@ -0,0 +1,102 @@
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from utils.categorizer import categorizer
+from utils.database import add_transaction, get_user_transactions, to_db_user_id
+from utils.instrumentation import instrumented
+
+@instrumented()
+def show_transactions(supabase_client, user_id):
+    st.title("💳 Gestión de Transacciones")
+    
+    # Id del envío del formulario: un doble clic reenvía el mismo y no duplica la transacción
+    if 'transaction_form_id' not in st.session_state:
+        st.session_state.transaction_form_id = uuid.uuid4().hex
+    
+    # Formulario para agregar transacción
+    with st.form("transaction_form"):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            transaction_type = st.selectbox(
+                "Tipo de Transacción",
+                ["income", "expense"],
+                format_func=lambda x: "Ingreso" if x == "income" else "Gasto"
+            )
+            amount = st.number_input("Monto", min_value=0.01, step=0.01, format="%.2f")
+            category = st.selectbox(
+                "Categoría",
+                ["🤖 Automática", "Alimentación", "Transporte", "Vivienda", "Entretenimiento", "Salud", 
+                 "Educación", "Ropa", "Tecnología", "Otros", "Salario", "Inversiones"]
+            )
+        
+        with col2:
+            description = st.text_input("Descripción")
+            date = st.date_input("Fecha", datetime.now())
+            tags = st.text_input("Etiquetas (separadas por coma)")
+        
+        submitted = st.form_submit_button("Agregar Transacción")
+        
+        if submitted:
+            try:
+                db_user_id = to_db_user_id(user_id)
+                automatic = category == "🤖 Automática"
+                if automatic:
+                    category = categorizer.suggest(description, transaction_type, db_user_id)
+                    st.info(f"🤖 Categoría asignada: {category}")
+                transaction_data = {
+                    "user_id": user_id,
+                    "amount": float(amount),
+                    "description": description,
+                    "category": category,
+                    "transaction_type": transaction_type,
+                    "date": date.isoformat(),
+                    "tags": tags,
+                    "source_id": st.session_state.transaction_form_id
+                }
+                result = add_transaction(supabase_client, transaction_data)
+                if result:
+                    if not automatic and description:
+                        # Elegir a mano es una regla para ese comercio y evidencia para el resto de usuarios
+                        # (solo si la transacción se guardó: un envío fallido no enseña nada)
+                        categorizer.set_override(db_user_id, description, category)
+                        categorizer.learn([description], [category], [transaction_type])
+                    # La próxima transacción, aunque sea idéntica, es otro envío
+                    st.session_state.transaction_form_id = uuid.uuid4().hex
+                    st.success("✅ Transacción agregada exitosamente!")
+                else:
+                    st.error("❌ Error al agregar transacción")
+            except Exception as e:
+                st.error(f"❌ Error: {e}")
+    
+    # Mostrar transacciones recientes
+    st.subheader("Historial de Transacciones")
+    transactions = get_user_transactions(supabase_client, user_id)
+    
+    if transactions:
+        df = pd.DataFrame(transactions)
+        # Asegurarse de que las columnas necesarias existan
+        available_columns = ['date', 'description', 'category', 'amount', 'transaction_type']
+        display_columns = [col for col in available_columns if col in df.columns]
+        
+        if display_columns:
+            st.dataframe(df[display_columns], use_container_width=True)
+        else:
+            st.warning("No hay columnas válidas para mostrar")
+            
+        # Mostrar estadísticas básicas
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            total_income = df[df['transaction_type'] == 'income']['amount'].sum() if 'amount' in df.columns else 0
+            st.metric("Total Ingresos", f"${total_income:,.2f}")
+        with col2:
+            total_expenses = df[df['transaction_type'] == 'expense']['amount'].sum() if 'amount' in df.columns else 0
+            st.metric("Total Gastos", f"${total_expenses:,.2f}")
+        with col3:
+            net_savings = total_income - total_expenses
+            st.metric("Ahorro Neto", f"${net_savings:,.2f}")
+    else:
+        st.info("No hay transacciones registradas. Agrega tu primera transacción.")
\ No newline at end of file